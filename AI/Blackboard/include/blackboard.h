@@ -64,6 +64,7 @@ Arquivo de cabeçalho contendo as funções e definições do black board
 #define LOCALIZATION_X 52
 #define LOCALIZATION_Y 53
 #define LOCALIZATION_THETA 54
+#define LOCALIZATION_PARTICLES 55
 #define VISION_LOST 57
 #define DECISION_SEARCH_ON 58
 #define DECISION_ACTION_VISION 59
@@ -224,6 +225,20 @@ Arquivo de cabeçalho contendo as funções e definições do black board
 #define VISION_YELLOW_LANDMARK_DEG 121
 #define VISION_PURPLE_LANDMARK_DEG 122
 
+//---- A partir de Mem+256 ficam os registros versionados (seqlock) ----
+//---- usados pelo SharedMemory.py (record_regions), nao escrever ------
+#define RECORD_OFFSET 256
+//---- Mem+320 e' a palavra de notificacao (futex) do wait_for_change --
+//---- e Mem+321..400 as flags das chaves observadas -------------------
+#define NOTIFY_OFFSET 320
+#define WATCH_OFFSET 321
+//---- O segmento KEY+1 guarda contadores e instantes de escrita -------
+//---- das palavras com flag, mantidos apenas pelos escritores Python --
+#define META_KEY_OFFSET 1
+//---- O segmento KEY+2 guarda as filas circulares (stream_regions) e ---
+//---- Mem+300..304 sao as palavras de notificacao de cada fila ---------
+#define STREAM_KEY_OFFSET 2
+
 //----global variables------------------------------------------------
 extern int *mem ; //Variável que manipula memória compartilhada
 extern float *memf ; //Variável que manipula memória compartilhada
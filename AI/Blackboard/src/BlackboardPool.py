@@ -0,0 +1,82 @@
+#coding: utf-8
+ # ----------------------------------------------------------------------------
+ # ****************************************************************************
+ # * @file BlackboardPool.py
+ # * @project: ROBOFEI-HT - FEI
+ # * @brief Blackboards of many robots in one process
+ # ****************************************************************************
+ # The simulator (and any coordination code) keeps the blackboard of every
+ # robot in one BlackboardPool: the backend and libblackboardpy.so are loaded
+ # once, each key is attached once however many times it is asked for, and
+ # read_all/read_many_all gather one key or group of every robot in one call.
+ # ****************************************************************************
+from SharedMemory import SharedMemory, KeyGroup, FLOAT_OFFSET, np
+
+
+# Conjunto de blackboards, um por robô -----------------------------------------------------
+class BlackboardPool(object):
+    '''Attached blackboards of several robots, in the order they were attached.
+
+    attach returns the (bkb, mem) pair of a key, the same pair on every call, so
+    code written for one SharedMemory per robot keeps working. The cross-robot
+    reads return NumPy arrays (lists without numpy), one row per robot.'''
+
+    def __init__(self, backend=None):
+        self.backend = backend
+        self.keys = []
+        self.members = {}
+        self.segments = [] # Words of each segment, in the order of keys
+
+    def attach(self, KEY):
+        try:
+            return self.members[KEY]
+        except KeyError:
+            pass
+        bkb = SharedMemory(self.backend)
+        member = self.members[KEY] = (bkb, bkb.shd_constructor(KEY))
+        self.keys.append(KEY)
+        self.segments.append(bkb.words)
+        return member
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __iter__(self):
+        return (self.members[KEY] for KEY in self.keys)
+
+    # Uma chave de todos os robôs, na ordem de keys. A palavra é resolvida uma vez e lida
+    # em cada segmento; os floats são os mesmos bits vistos como float32
+    def read_all(self, variable):
+        is_float = variable in SharedMemory.variable_float
+        if is_float:
+            slot = FLOAT_OFFSET + SharedMemory.variable_float[variable]
+        else:
+            slot = SharedMemory.variable_int[variable]
+        if np is None:
+            if is_float:
+                return [bkb.floats[slot - FLOAT_OFFSET] for bkb, mem in self]
+            return [words[slot] for words in self.segments]
+        values = np.array([words[slot] for words in self.segments], np.int32)
+        return values.view(np.float32) if is_float else values
+
+    # Um grupo de chaves de todos os robôs, uma linha por robô
+    def read_many_all(self, group):
+        if not isinstance(group, KeyGroup):
+            group = SharedMemory.groups[group]
+        rows = []
+        for KEY in self.keys:
+            bkb, mem = self.members[KEY]
+            rows.append(bkb.read_many(mem, group))
+        if np is None:
+            return rows
+        return np.array(rows, np.float64)
+
+    # Escreve a mesma chave em todos os robôs (values é um valor ou um por robô)
+    def write_all(self, variable, values):
+        if not hasattr(values, '__len__'):
+            values = [values] * len(self.keys)
+        write = 'write_float' if variable in SharedMemory.variable_float else 'write_int'
+        for KEY, value in zip(self.keys, values):
+            bkb, mem = self.members[KEY]
+            getattr(bkb, write)(mem, variable, value)
+#------------------------------------------------------------------------------------------
@@ -0,0 +1,138 @@
+#coding: utf-8
+ # ----------------------------------------------------------------------------
+ # ****************************************************************************
+ # * @file BlackboardProfiler.py
+ # * @project: ROBOFEI-HT - FEI
+ # * @brief Access profiler of the blackboard
+ # ****************************************************************************
+ # Opt-in instrumentation of SharedMemory. With BKB_PROFILE=<seconds> in the
+ # environment every SharedMemory() of the process counts its reads and writes
+ # per key, keeps a log2 histogram of the call latency and prints the hot keys
+ # every <seconds> (0 prints only at exit). BKB_PROFILE_FILE appends the same
+ # report to a file, so the telemetry can collect it from every process.
+ # ****************************************************************************
+import atexit
+import os
+import sys
+import timeit
+
+PROFILE_ENV = 'BKB_PROFILE' # Seconds between reports, enables the profiler when set
+PROFILE_FILE_ENV = 'BKB_PROFILE_FILE' # File the reports are appended to, besides stderr
+BUCKETS = 40 # Histogram buckets, bucket n counts calls of 2**(n-1) to 2**n ns
+REPORT_KEYS = 20 # Hot keys listed per report
+
+clock = timeit.default_timer
+
+# Métodos instrumentados e se leem ou escrevem -------------------------------------------
+profiled_methods = (
+    ('read_int', 'read'), ('read_float', 'read'), ('read_floatDynamic', 'read'),
+    ('read_many', 'read'), ('read_record', 'read'), ('drain', 'read'),
+    ('write_int', 'write'), ('write_float', 'write'), ('write_floatDynamic', 'write'),
+    ('write_many', 'write'), ('write_record', 'write'), ('push', 'write'),
+)
+
+
+class KeyStats(object):
+    '''Calls and latency histogram of one key, split in reads and writes.'''
+    __slots__ = ('calls', 'histogram')
+
+    def __init__(self):
+        self.calls = {'read': 0, 'write': 0}
+        self.histogram = {'read': [0] * BUCKETS, 'write': [0] * BUCKETS}
+
+    def add(self, kind, seconds):
+        self.calls[kind] += 1
+        self.histogram[kind][min(int(seconds * 1e9).bit_length(), BUCKETS - 1)] += 1
+
+    def percentile(self, kind, fraction):
+        # Upper bound (ns) of the bucket holding the given fraction of the calls
+        target = fraction * self.calls[kind]
+        seen = 0
+        for bucket, count in enumerate(self.histogram[kind]):
+            seen += count
+            if count and seen >= target:
+                return 2 ** bucket
+        return 0
+
+
+def key_name(variable):
+    # Nome usado no relatório: a chave, o registro, a stream ou as chaves do grupo
+    if isinstance(variable, str):
+        return variable
+    return '+'.join(getattr(variable, 'keys', ()))
+
+
+def _instrument(name, kind):
+    def method(self, mem, variable, *args):
+        start = clock()
+        try:
+            return getattr(super(Profiler, self), name)(mem, variable, *args)
+        finally:
+            self.profile_call(variable, kind, clock() - start)
+    method.__name__ = name
+    return method
+
+
+class Profiler(object):
+    '''Mixin counting the accesses of a SharedMemory backend.
+
+    The attribute accessors (bkb.vision.ball_dist) are not counted, they skip the
+    methods on purpose.'''
+
+    def profile_call(self, variable, kind, seconds):
+        try:
+            profile = self.profile
+        except AttributeError:
+            self.profile_start()
+            profile = self.profile
+        try:
+            stats = profile[variable]
+        except (KeyError, TypeError):
+            name = key_name(variable)
+            stats = profile.get(name)
+            if stats is None:
+                stats = profile[name] = KeyStats()
+        stats.add(kind, seconds)
+        if self.report_interval and clock() >= self.next_report:
+            self.report()
+
+    def profile_start(self):
+        self.profile = {}
+        self.report_interval = float(os.environ.get(PROFILE_ENV) or 0)
+        self.started = clock()
+        self.next_report = self.started + self.report_interval
+        atexit.register(self.report)
+
+    def report(self):
+        now = clock()
+        elapsed = max(now - self.started, 1e-9)
+        self.next_report = now + self.report_interval
+        # Groups and records are counted under their names (see key_name)
+        rows = sorted(((stats.calls['read'] + stats.calls['write'], name, stats)
+                       for name, stats in self.profile.items()), key=lambda row: (-row[0], row[1]))
+        lines = ['blackboard profile of %s (pid %d), %.1f s' % (os.path.basename(sys.argv[0]), os.getpid(), elapsed),
+                 '%-32s %10s %10s %9s %9s %9s %9s' % ('key', 'reads/s', 'writes/s', 'r p50 ns', 'r p99 ns', 'w p50 ns', 'w p99 ns')]
+        for total, name, stats in rows[:REPORT_KEYS]:
+            lines.append('%-32s %10.1f %10.1f %9d %9d %9d %9d' % (
+                name[:32], stats.calls['read'] / elapsed, stats.calls['write'] / elapsed,
+                stats.percentile('read', 0.5), stats.percentile('read', 0.99),
+                stats.percentile('write', 0.5), stats.percentile('write', 0.99)))
+        text = '\n'.join(lines) + '\n'
+        sys.stderr.write(text)
+        if os.environ.get(PROFILE_FILE_ENV):
+            with open(os.environ[PROFILE_FILE_ENV], 'a') as output:
+                output.write(text)
+
+for _name, _kind in profiled_methods:
+    setattr(Profiler, _name, _instrument(_name, _kind))
+
+
+_profiled_classes = {}
+
+# Subclasse instrumentada de um backend, criada uma vez ------------------------------------
+def profiled(cls):
+    try:
+        return _profiled_classes[cls]
+    except KeyError:
+        profiled_cls = _profiled_classes[cls] = type('Profiled' + cls.__name__, (Profiler, cls), {})
+        return profiled_cls
@@ -0,0 +1,289 @@
+#coding: utf-8
+ # ----------------------------------------------------------------------------
+ # ****************************************************************************
+ # * @file BlackboardSchema.py
+ # * @project: ROBOFEI-HT - FEI
+ # * @brief Declarative layout of the blackboard segment
+ # ****************************************************************************
+ # Every key of blackboard.h, with its type and index. SharedMemory.py builds the
+ # variable_int/variable_float dicts and the attribute accessors (bkb.vision.ball_dist)
+ # from this table, and check_spans refuses at import a layout whose keys overlap
+ # or leave their region of the segment.
+ # ****************************************************************************
+
+SEGMENT_WORDS = 512 # 2048 bytes of the segment created by using_shared_memory
+FLOAT_OFFSET = 125 # Floats start at Mem+125, as in read_float/write_float (blackboard.cpp)
+KEYS_END = 256 # Keys stay below the records and flags kept after Mem+256
+
+# (key, type, index): 'i' is the int at Mem+index, 'f' the float at Mem+125+index
+layout = (
+    ('PLANNING_COMMAND', 'i', 0),
+    ('PLANNING_PARAMETER_VEL', 'i', 1),
+    ('PLANNING_PARAMETER_ANGLE', 'i', 2),
+    ('IMU_STATE', 'i', 3),
+    ('IMU_RESET', 'i', 4),
+    ('CONTROL_ACTION', 'i', 13),
+    ('CONTROL_HEIGHT_A', 'i', 14),
+    ('CONTROL_HEIGHT_B', 'i', 15),
+    ('CONTROL_HEIGHT_C', 'i', 16),
+    ('DECISION_ACTION_A', 'i', 17),
+    ('DECISION_ACTION_B', 'i', 18),
+    ('DECISION_STATE', 'i', 19),
+    ('DECISION_POSITION_A', 'i', 20),
+    ('DECISION_POSITION_B', 'i', 21),
+    ('DECISION_POSITION_C', 'i', 22),
+    ('DECISION_BALL_POS', 'i', 23),
+    ('DECISION_OPP1_POS', 'i', 24),
+    ('DECISION_OPP2_POS', 'i', 25),
+    ('DECISION_OPP3_POS', 'i', 26),
+    ('COM_ACTION_ROBOT1', 'i', 27),
+    ('COM_ACTION_ROBOT2', 'i', 28),
+    ('COM_ACTION_ROBOT3', 'i', 29),
+    ('COM_STATE_ROBOT1', 'i', 30),
+    ('COM_STATE_ROBOT2', 'i', 31),
+    ('COM_STATE_ROBOT3', 'i', 32),
+    ('COM_POS_ROBOT1', 'i', 33),
+    ('COM_POS_ROBOT2', 'i', 34),
+    ('COM_POS_ROBOT3', 'i', 35),
+    ('COM_POS_BALL_ROBOT1', 'i', 36),
+    ('COM_POS_BALL_ROBOT2', 'i', 37),
+    ('COM_POS_BALL_ROBOT3', 'i', 38),
+    ('COM_POS_OPP_A_ROBOT1', 'i', 39),
+    ('COM_POS_OPP_A_ROBOT2', 'i', 40),
+    ('COM_POS_OPP_A_ROBOT3', 'i', 41),
+    ('COM_POS_OPP_A_ROBOT4', 'i', 42),
+    ('COM_POS_OPP_B_ROBOT1', 'i', 43),
+    ('COM_POS_OPP_B_ROBOT2', 'i', 44),
+    ('COM_POS_OPP_B_ROBOT3', 'i', 45),
+    ('COM_POS_OPP_B_ROBOT4', 'i', 46),
+    ('COM_POS_OPP_C_ROBOT1', 'i', 47),
+    ('COM_POS_OPP_C_ROBOT2', 'i', 48),
+    ('COM_POS_OPP_C_ROBOT3', 'i', 49),
+    ('COM_POS_OPP_C_ROBOT4', 'i', 50),
+    ('COM_REFEREE', 'i', 51),
+    ('LOCALIZATION_X', 'i', 52),
+    ('LOCALIZATION_Y', 'i', 53),
+    ('LOCALIZATION_THETA', 'i', 54),
+    ('LOCALIZATION_PARTICLES', 'i', 55),
+    ('VISION_LOST', 'i', 57),
+    ('DECISION_SEARCH_ON', 'i', 58),
+    ('DECISION_ACTION_VISION', 'i', 59),
+    ('VISION_MOTOR1_GOAL', 'i', 60),
+    ('VISION_MOTOR2_GOAL', 'i', 61),
+    ('VISION_SEARCH_GOAL', 'i', 62),
+    ('VISION_LOST_GOAL', 'i', 63),
+    ('VISION_STATE', 'i', 64),
+    ('ROBOT_NUMBER', 'i', 65),
+    ('VISION_pos_servo1', 'i', 66),
+    ('VISION_pos_servo2', 'i', 67),
+    ('COM_POS_ORIENT_QUALIT_ROBOT_A', 'i', 68),
+    ('COM_POS_DIST_QUALIT_ROBOT_A', 'i', 69),
+    ('COM_POS_ORIENT_QUALIT_ROBOT_B', 'i', 70),
+    ('COM_POS_DIST_QUALIT_ROBOT_B', 'i', 71),
+    ('COM_POS_ORIENT_QUALIT_ROBOT_C', 'i', 72),
+    ('COM_POS_DIST_QUALIT_ROBOT_C', 'i', 73),
+    ('VISION_DELTA_ORIENT', 'i', 74),
+    ('LOCALIZATION_FIND_ROBOT', 'i', 75),
+    ('RECEIVED_ROBOT_SENDING', 'i', 76),
+    ('RECEIVED_QUAL_ORIENT', 'i', 77),
+    ('RECEIVED_QUAL_DIST', 'i', 78),
+    ('RECEIVED_ROBOT_SEEN', 'i', 79),
+    ('CONTROL_MESSAGES', 'i', 80),
+    ('ASKED_QUALIT_DIRECT', 'i', 81),
+    ('ASKED_QUALIT_DISTANCE', 'i', 82),
+    ('ASKED_RELATED_ROBOT', 'i', 83),
+    ('CONTROL_MOVING', 'i', 84),
+    ('ROBOT_VIEW_ROTATE', 'i', 100),
+    ('CONTROL_WORKING', 'i', 101),
+    ('VISION_WORKING', 'i', 102),
+    ('LOCALIZATION_WORKING', 'i', 103),
+    ('DECISION_WORKING', 'i', 104),
+    ('IMU_WORKING', 'i', 105),
+    ('VOLTAGE', 'i', 106),
+    ('DECISION_LOCALIZATION', 'i', 107),
+
+    ('IMU_GYRO_X', 'f', 1),
+    ('IMU_GYRO_Y', 'f', 2),
+    ('IMU_GYRO_Z', 'f', 3),
+    ('IMU_ACCEL_X', 'f', 4),
+    ('IMU_ACCEL_Y', 'f', 5),
+    ('IMU_ACCEL_Z', 'f', 6),
+    ('IMU_COMPASS_X', 'f', 7),
+    ('IMU_COMPASS_Y', 'f', 8),
+    ('IMU_COMPASS_Z', 'f', 9),
+    ('IMU_EULER_X', 'f', 10),
+    ('IMU_EULER_Y', 'f', 11),
+    ('IMU_EULER_Z', 'f', 12),
+    ('IMU_QUAT_X', 'f', 13),
+    ('IMU_QUAT_Y', 'f', 14),
+    ('IMU_QUAT_Z', 'f', 15),
+    ('VISION_AREA_SEGMENT', 'f', 16),
+    ('VISION_BALL_DIST', 'f', 17),
+    ('VISION_BALL_ANGLE', 'f', 18),
+    ('VISION_GOAL_DIST', 'f', 19),
+    ('VISION_GOAL_ANGLE', 'f', 20),
+    ('VISION_OPP01_DIST', 'f', 21),
+    ('VISION_OPP02_DIST', 'f', 22),
+    ('VISION_OPP03_DIST', 'f', 23),
+    ('VISION_OPP04_DIST', 'f', 24),
+    ('VISION_OPP05_DIST', 'f', 25),
+    ('VISION_OPP06_DIST', 'f', 26),
+    ('VISION_OPP07_DIST', 'f', 27),
+    ('VISION_OPP08_DIST', 'f', 28),
+    ('VISION_OPP09_DIST', 'f', 29),
+    ('VISION_OPP10_DIST', 'f', 30),
+    ('VISION_OPP11_DIST', 'f', 31),
+    ('VISION_OPP01_ANGLE', 'f', 32),
+    ('VISION_OPP02_ANGLE', 'f', 33),
+    ('VISION_OPP03_ANGLE', 'f', 34),
+    ('VISION_OPP04_ANGLE', 'f', 35),
+    ('VISION_OPP05_ANGLE', 'f', 36),
+    ('VISION_OPP06_ANGLE', 'f', 37),
+    ('VISION_OPP07_ANGLE', 'f', 38),
+    ('VISION_OPP08_ANGLE', 'f', 39),
+    ('VISION_OPP09_ANGLE', 'f', 40),
+    ('VISION_OPP10_ANGLE', 'f', 41),
+    ('VISION_OPP11_ANGLE', 'f', 42),
+    ('VISION_RBT01_DIST', 'f', 43),
+    ('VISION_RBT02_DIST', 'f', 44),
+    ('VISION_RBT03_DIST', 'f', 45),
+    ('VISION_RBT04_DIST', 'f', 46),
+    ('VISION_RBT05_DIST', 'f', 47),
+    ('VISION_RBT06_DIST', 'f', 48),
+    ('VISION_RBT07_DIST', 'f', 49),
+    ('VISION_RBT08_DIST', 'f', 50),
+    ('VISION_RBT09_DIST', 'f', 51),
+    ('VISION_RBT10_DIST', 'f', 52),
+    ('VISION_RBT11_DIST', 'f', 53),
+    ('VISION_RBT01_ANGLE', 'f', 54),
+    ('VISION_RBT02_ANGLE', 'f', 55),
+    ('VISION_RBT03_ANGLE', 'f', 56),
+    ('VISION_RBT04_ANGLE', 'f', 57),
+    ('VISION_RBT05_ANGLE', 'f', 58),
+    ('VISION_RBT06_ANGLE', 'f', 59),
+    ('VISION_RBT07_ANGLE', 'f', 60),
+    ('VISION_RBT08_ANGLE', 'f', 61),
+    ('VISION_RBT09_ANGLE', 'f', 62),
+    ('VISION_RBT10_ANGLE', 'f', 63),
+    ('VISION_RBT11_ANGLE', 'f', 64),
+    ('VISION_TILT_DEG', 'f', 65),
+    ('VISION_PAN_DEG', 'f', 66),
+    ('CBR_COORDINATOR', 'f', 67),
+    ('CBR_RUN', 'f', 68),
+    ('LOCALIZATION_BALL_X', 'f', 69),
+    ('LOCALIZATION_BALL_Y', 'f', 70),
+    ('LOCALIZATION_RBT01_X', 'f', 71),
+    ('LOCALIZATION_RBT01_Y', 'f', 72),
+    ('LOCALIZATION_RBT02_X', 'f', 73),
+    ('LOCALIZATION_RBT02_Y', 'f', 74),
+    ('LOCALIZATION_RBT03_X', 'f', 75),
+    ('LOCALIZATION_RBT03_Y', 'f', 76),
+    ('LOCALIZATION_RBT04_X', 'f', 77),
+    ('LOCALIZATION_RBT04_Y', 'f', 78),
+    ('LOCALIZATION_RBT05_X', 'f', 79),
+    ('LOCALIZATION_RBT05_Y', 'f', 80),
+    ('LOCALIZATION_RBT06_X', 'f', 81),
+    ('LOCALIZATION_RBT06_Y', 'f', 82),
+    ('LOCALIZATION_RBT07_X', 'f', 83),
+    ('LOCALIZATION_RBT07_Y', 'f', 84),
+    ('LOCALIZATION_RBT08_X', 'f', 85),
+    ('LOCALIZATION_RBT08_Y', 'f', 86),
+    ('LOCALIZATION_RBT09_X', 'f', 87),
+    ('LOCALIZATION_RBT09_Y', 'f', 88),
+    ('LOCALIZATION_RBT10_X', 'f', 89),
+    ('LOCALIZATION_RBT10_Y', 'f', 90),
+    ('LOCALIZATION_RBT11_X', 'f', 91),
+    ('LOCALIZATION_RBT11_Y', 'f', 92),
+    ('LOCALIZATION_OPP01_X', 'f', 93),
+    ('LOCALIZATION_OPP01_Y', 'f', 94),
+    ('LOCALIZATION_OPP02_X', 'f', 95),
+    ('LOCALIZATION_OPP02_Y', 'f', 96),
+    ('LOCALIZATION_OPP03_X', 'f', 97),
+    ('LOCALIZATION_OPP03_Y', 'f', 98),
+    ('LOCALIZATION_OPP04_X', 'f', 99),
+    ('LOCALIZATION_OPP04_Y', 'f', 100),
+    ('LOCALIZATION_OPP05_X', 'f', 101),
+    ('LOCALIZATION_OPP05_Y', 'f', 102),
+    ('LOCALIZATION_OPP06_X', 'f', 103),
+    ('LOCALIZATION_OPP06_Y', 'f', 104),
+    ('LOCALIZATION_OPP07_X', 'f', 105),
+    ('LOCALIZATION_OPP07_Y', 'f', 106),
+    ('LOCALIZATION_OPP08_X', 'f', 107),
+    ('LOCALIZATION_OPP08_Y', 'f', 108),
+    ('LOCALIZATION_OPP09_X', 'f', 109),
+    ('LOCALIZATION_OPP09_Y', 'f', 110),
+    ('LOCALIZATION_OPP10_X', 'f', 111),
+    ('LOCALIZATION_OPP10_Y', 'f', 112),
+    ('LOCALIZATION_OPP11_X', 'f', 113),
+    ('LOCALIZATION_OPP11_Y', 'f', 114),
+    ('DECISION_RBT01_DIST_BALL', 'f', 115),
+    ('DECISION_RBT02_DIST_BALL', 'f', 116),
+    ('DECISION_RBT03_DIST_BALL', 'f', 117),
+    ('DECISION_RBT04_DIST_BALL', 'f', 118),
+    ('VISION_BLUE_LANDMARK_DEG', 'f', 119),
+    ('VISION_RED_LANDMARK_DEG', 'f', 120),
+    ('VISION_YELLOW_LANDMARK_DEG', 'f', 121),
+    ('VISION_PURPLE_LANDMARK_DEG', 'f', 122),
+)
+
+# Namespace and attribute of the keys whose name does not start with it
+accessor_names = {
+    'VOLTAGE': ('control', 'voltage'),
+}
+
+
+# Nome do atributo de cada chave: VISION_BALL_DIST é vision.ball_dist ---------------------
+def accessor_name(key):
+    try:
+        return accessor_names[key]
+    except KeyError:
+        namespace, _, attribute = key.partition('_')
+        return namespace.lower(), attribute.lower()
+
+
+# Verifica que as regiões do segmento não se sobrepõem -----------------------------------
+def check_spans(spans):
+    '''Raises ValueError when two of spans overlap or one leaves the segment.
+
+    spans holds (name, first word, number of words), for keys, records and flags.'''
+    last = None
+    for name, first, size in sorted(spans, key=lambda span: span[1]):
+        if first < 0 or first + size > SEGMENT_WORDS:
+            raise ValueError('%s is out of the %d words of the segment' % (name, SEGMENT_WORDS))
+        if last is not None and first < last[1] + last[2]:
+            raise ValueError('%s overlaps %s at Mem+%d' % (name, last[0], first))
+        last = (name, first, size)
+
+
+# Compila a tabela nos dicionários da API por nome ----------------------------------------
+def compile_layout(layout):
+    '''Returns variable_int, variable_float and the fields of each namespace.
+
+    fields maps a namespace to (attribute, key, type, index) tuples. Duplicated keys or
+    attributes, unknown types and keys outside Mem+0..255 raise ValueError.'''
+    variable_int = {}
+    variable_float = {}
+    fields = {}
+    spans = []
+    for key, kind, index in layout:
+        if key in variable_int or key in variable_float:
+            raise ValueError('key %s declared twice' % key)
+        if kind == 'i':
+            variable_int[key] = index
+            word = index
+            if word >= FLOAT_OFFSET:
+                raise ValueError('int key %s inside the float region' % key)
+        elif kind == 'f':
+            variable_float[key] = index
+            word = FLOAT_OFFSET + index
+        else:
+            raise ValueError('key %s has unknown type %r' % (key, kind))
+        if word >= KEYS_END:
+            raise ValueError('key %s beyond Mem+%d' % (key, KEYS_END))
+        spans.append((key, word, 1))
+        namespace, attribute = accessor_name(key)
+        if not attribute or any(attribute == field[0] for field in fields.get(namespace, ())):
+            raise ValueError('key %s has no unique accessor %s.%s' % (key, namespace, attribute))
+        fields.setdefault(namespace, []).append((attribute, key, kind, index))
+    check_spans(spans)
+    return variable_int, variable_float, fields
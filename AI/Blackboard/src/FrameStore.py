@@ -0,0 +1,129 @@
+#coding: utf-8
+ # ----------------------------------------------------------------------------
+ # ****************************************************************************
+ # * @file FrameStore.py
+ # * @project: ROBOFEI-HT - FEI
+ # * @brief Camera frames shared between processes
+ # ****************************************************************************
+ # The vision process publishes every captured frame in the segment KEY+10
+ # (KEY is the blackboard key of the robot); any other process maps the latest
+ # frame as a NumPy array without copying it and without opening the camera.
+ # ****************************************************************************
+import ctypes
+import time
+from collections import namedtuple
+
+from SharedMemory import SharedMemory, SEQ_MASK, POLL_INTERVAL, SYS_FUTEX, futex_wait, futex_wake, monotonic, np
+
+FRAME_KEY_OFFSET = 10 # The frames of the robot with blackboard KEY live in the segment KEY+10
+FRAME_BUFFERS = 3 # Triple buffer: the writer never touches the frame being published
+HEADER_SIZE = 4096 # Header page, the frames start page aligned after it
+MAGIC = 0x46424b42 # 'BKBF'
+READ_RETRIES = 8 # Attempts of read before giving up on a consistent copy
+
+Frame = namedtuple('Frame', ('index', 'stamp', 'image', 'slot', 'seq'))
+
+
+class _Slot(ctypes.Structure):
+    _fields_ = [('seq', ctypes.c_uint32), ('pad', ctypes.c_uint32),
+                ('index', ctypes.c_uint64), ('stamp', ctypes.c_double)]
+
+
+class _Header(ctypes.Structure):
+    _fields_ = [('magic', ctypes.c_uint32), ('height', ctypes.c_uint32),
+                ('width', ctypes.c_uint32), ('channels', ctypes.c_uint32),
+                ('buffers', ctypes.c_uint32), ('count', ctypes.c_uint32),
+                ('slots', _Slot * FRAME_BUFFERS)]
+
+
+# Classe do buffer de frames ---------------------------------------------------------------
+class FrameStore(object):
+    '''Triple-buffered frames of one camera in shared memory.
+
+    A single writer (write) fills the slot after the latest one and then advances
+    count, which is also the futex word readers sleep on in wait. Each slot has a
+    sequence counter, odd while it is written: latest returns a zero-copy view
+    and valid tells whether it was overwritten meanwhile, read returns a checked
+    copy. The segment is attached through the backend of SharedMemory(), so the
+    mmap backend keeps the frames in a file as well.'''
+
+    def __init__(self, KEY, shape=(720, 1280, 3), backend=None):
+        if np is None:
+            raise ImportError('FrameStore needs numpy installed')
+        height, width, channels = shape
+        self.frame_size = height * width * channels
+        self.bkb = SharedMemory(backend) # Kept alive, the mmap backend owns the mapping
+        address = self.bkb.attach(KEY + FRAME_KEY_OFFSET, HEADER_SIZE + FRAME_BUFFERS * self.frame_size)
+        self.header = _Header.from_address(address)
+        if self.header.magic != MAGIC:
+            self.header.height, self.header.width, self.header.channels = shape
+            self.header.buffers = FRAME_BUFFERS
+            self.header.magic = MAGIC
+        elif (self.header.height, self.header.width, self.header.channels) != tuple(shape):
+            raise ValueError('segment %d holds frames of %dx%dx%d' % (KEY + FRAME_KEY_OFFSET,
+                             self.header.height, self.header.width, self.header.channels))
+        self.count_address = address + _Header.count.offset
+        buffer = (ctypes.c_uint8 * (FRAME_BUFFERS * self.frame_size)).from_address(address + HEADER_SIZE)
+        self.images = np.ctypeslib.as_array(buffer).reshape((FRAME_BUFFERS,) + tuple(shape))
+        self.skipped = 0 # Frames not published because their shape differs from the segment's
+
+    # Publica um frame (um único processo escritor), None se ele não tem a forma do segmento
+    def write(self, image, stamp=None):
+        if image.shape != self.images.shape[1:]:
+            self.skipped += 1
+            return None
+        header = self.header
+        count = header.count
+        slot = header.slots[count % FRAME_BUFFERS]
+        start = slot.seq & ~1
+        slot.seq = (start + 1) & SEQ_MASK # odd: frame being written
+        self.images[count % FRAME_BUFFERS][...] = image
+        slot.index = count
+        slot.stamp = monotonic() if stamp is None else stamp
+        slot.seq = (start + 2) & SEQ_MASK
+        header.count = (count + 1) & 0xffffffff
+        if SYS_FUTEX is not None:
+            futex_wake(self.count_address)
+        return count
+
+    # Último frame publicado, sem cópia (None se nenhum ainda) ------------------------------
+    def latest(self):
+        count = self.header.count
+        if count == 0:
+            return None
+        position = (count - 1) % FRAME_BUFFERS
+        slot = self.header.slots[position]
+        seq = slot.seq
+        return Frame(slot.index, slot.stamp, self.images[position], position, seq)
+
+    # Se o frame devolvido por latest ainda não foi sobrescrito
+    def valid(self, frame):
+        return not frame.seq & 1 and self.header.slots[frame.slot].seq == frame.seq
+
+    # Cópia consistente do último frame -----------------------------------------------------
+    def read(self):
+        for attempt in range(READ_RETRIES):
+            frame = self.latest()
+            if frame is None or not self.valid(frame):
+                continue
+            image = frame.image.copy()
+            if self.valid(frame):
+                return frame._replace(image=image)
+        return None
+
+    # Dorme até que um frame depois de index seja publicado ou o timeout (s) acabe -----------
+    def wait(self, index=None, timeout=None):
+        '''Returns the latest frame once one newer than index exists, or None on timeout.'''
+        deadline = None if timeout is None else monotonic() + timeout
+        while True:
+            count = self.header.count
+            if count != (0 if index is None else (index + 1) & 0xffffffff):
+                return self.latest()
+            remaining = None if deadline is None else deadline - monotonic()
+            if remaining is not None and remaining <= 0:
+                return None
+            if SYS_FUTEX is not None:
+                futex_wait(self.count_address, count, remaining)
+            else:
+                time.sleep(POLL_INTERVAL if remaining is None else min(POLL_INTERVAL, remaining))
+#------------------------------------------------------------------------------------------
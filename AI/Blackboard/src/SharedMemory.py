@@ -11,43 +11,348 @@
  # ****************************************************************************
  # ****************************************************************************
 import ctypes
+import ctypes.util
+import errno
 import time
 import os
+import mmap
+import platform
+import tempfile
+from collections import namedtuple
+
+import BlackboardSchema
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+SEGMENT_SIZE = 2048 # Bytes of the segment created by using_shared_memory (blackboard.cpp)
+FLOAT_OFFSET = BlackboardSchema.FLOAT_OFFSET # Floats start at Mem+125 (blackboard.cpp)
+RECORD_OFFSET = 256 # First word of the seqlock records, after the last float slot
+SEQLOCK_RETRIES = 8 # Attempts of read_record before returning the last consistent copy
+SEQ_MASK = 0x7fffffff # Keeps the sequence counters positive inside an int32
+NOTIFY_OFFSET = 320 # Word bumped (and futex-woken) when a watched key is written
+WATCH_OFFSET = 321 # One watch flag byte per word 0..NOTIFY_OFFSET-1, up to word 400
+WATCH_NOTIFY = 1 # Flag bits: a process waits for the word in wait_for_change
+WATCH_COUNT = 2 # a process reads its write counter (write_count/write_counts)
+WATCH_STAMP = 4 # a process reads its write time (write_time/age)
+POLL_INTERVAL = 0.002 # Sleep between checks of wait_for_change when there is no futex
+META_KEY_OFFSET = 1 # The write counters and timestamps live in the segment KEY+1
+META_SIZE = 4096 # Bytes of the metadata segment: NOTIFY_OFFSET uint32 counters + doubles
+STREAM_KEY_OFFSET = 2 # The ring buffers of stream_regions live in the segment KEY+2
+STREAM_SIZE = 32768 # Bytes of the ring buffer segment
+HEAD_MASK = 0xffffffff # Heads and cursors count entries modulo 2**32
+LAZY_META = ('counters', 'stamps') # Attributes that attach the segment KEY+1 when first read
+LAZY_STREAMS = ('rings', 'cursors', 'overflows') # and the ones that attach KEY+2
+IPC_CREAT = 0o1000
+BACKEND_ENV = 'BKB_BACKEND' # Environment variable choosing the backend of SharedMemory()
+DIRECTORY_ENV = 'BKB_DIR' # Directory of the segment files of the mmap backend
+PROFILE_ENV = 'BKB_PROFILE' # When set, SharedMemory() counts its accesses (BlackboardProfiler.py)
+
+
+# Futex sobre a palavra de notificação (Linux); sem ele wait_for_change faz polling --------
+try:
+    _libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+    _libc.syscall
+except (OSError, AttributeError, TypeError):
+    _libc = None
+SYS_FUTEX = {'x86_64': 202, 'amd64': 202, 'i386': 240, 'i686': 240,
+             'aarch64': 98, 'armv7l': 240, 'armv6l': 240}.get(platform.machine().lower())
+if platform.system() != 'Linux' or _libc is None:
+    SYS_FUTEX = None
+FUTEX_WAIT = 0 # Shared (not FUTEX_PRIVATE) operations, the word is in another process too
+FUTEX_WAKE = 1
+
+class _timespec(ctypes.Structure):
+    _fields_ = [('tv_sec', ctypes.c_long), ('tv_nsec', ctypes.c_long)]
+
+# Relógio monotônico comum a todos os processos (CLOCK_MONOTONIC) -------------------------
+try:
+    monotonic = time.monotonic
+except AttributeError:
+    CLOCK_MONOTONIC = 1
+    if _libc is not None and platform.system() == 'Linux':
+        def monotonic():
+            spec = _timespec()
+            _libc.clock_gettime(CLOCK_MONOTONIC, ctypes.byref(spec))
+            return spec.tv_sec + spec.tv_nsec * 1e-9
+    else:
+        monotonic = time.time
+
+# Cria ou acopla um segmento System V sem passar pelo libblackboardpy.so -----------------
+def attach_segment(key, size):
+    '''Returns the address of the SysV segment key, creating it with size bytes.'''
+    if _libc is None:
+        raise OSError('libc not found, cannot attach the segment %d' % key)
+    _libc.shmget.restype = ctypes.c_int
+    _libc.shmget.argtypes = (ctypes.c_int, ctypes.c_size_t, ctypes.c_int)
+    _libc.shmat.restype = ctypes.c_void_p
+    _libc.shmat.argtypes = (ctypes.c_int, ctypes.c_void_p, ctypes.c_int)
+    shmid = _libc.shmget(key, size, IPC_CREAT | 0o666)
+    if shmid == -1:
+        error = ctypes.get_errno()
+        if error == errno.EINVAL and _libc.shmget(key, 0, 0) != -1:
+            raise OSError(error, 'segment %d already exists and is smaller than %d bytes, '
+                          'remove it with ipcrm -M %d' % (key, size, key))
+        raise OSError(error, 'shmget of segment %d failed' % key)
+    address = _libc.shmat(shmid, None, 0)
+    if address is None or address == ctypes.c_void_p(-1).value:
+        raise OSError(ctypes.get_errno(), 'shmat of segment %d failed' % key)
+    return address
+
+def futex_wait(address, value, timeout=None):
+    '''Sleeps while the int32 at address holds value, at most timeout seconds.'''
+    if timeout is None:
+        spec = None
+    else:
+        timeout = max(timeout, 0.0)
+        spec = ctypes.byref(_timespec(int(timeout), int((timeout % 1) * 1e9)))
+    _libc.syscall(ctypes.c_long(SYS_FUTEX), ctypes.c_void_p(address), ctypes.c_long(FUTEX_WAIT),
+                  ctypes.c_long(value), spec, None, ctypes.c_long(0))
+
+def futex_wake(address):
+    '''Wakes every process sleeping on the int32 at address.'''
+    _libc.syscall(ctypes.c_long(SYS_FUTEX), ctypes.c_void_p(address), ctypes.c_long(FUTEX_WAKE),
+                  ctypes.c_long(SEQ_MASK), None, None, ctypes.c_long(0))
+
+
+# Registro versionado (seqlock) -----------------------------------------------------------
+class Record(object):
+    '''Region of the segment published as a whole by a single writer.
+
+    The word at seq is even while the record is stable and odd while it is being
+    written; fields follow it, one word each, typed by formats ('i' or 'f').
+    Readers retry when the counter is odd or changed during the read, so a record
+    is never seen half written and neither side ever waits on a lock.'''
+
+    def __init__(self, name, offset, fields, formats):
+        if offset < RECORD_OFFSET or offset + 1 + len(fields) > SEGMENT_SIZE // 4:
+            raise ValueError('record %s out of the record region' % name)
+        self.name = name
+        self.seq = offset
+        self.slots = list(range(offset + 1, offset + 1 + len(fields)))
+        self.floats = [fmt == 'f' for fmt in formats]
+        self.fields = [(slot - FLOAT_OFFSET if is_float else slot, is_float)
+                       for slot, is_float in zip(self.slots, self.floats)]
+        self.make = namedtuple(name.title().replace('_', ''), fields)._make
+        if np is not None:
+            self.dtype = np.dtype({'names': ['seq'] + list(fields),
+                                   'formats': ['<i4'] + ['<f4' if is_float else '<i4' for is_float in self.floats],
+                                   'offsets': [4 * offset] + [4 * slot for slot in self.slots],
+                                   'itemsize': SEGMENT_SIZE})
+
+
+# Fila circular de um único produtor --------------------------------------------------------
+class Stream(object):
+    '''Ring buffer of typed entries, written by a single producer, in the segment KEY+2.
+
+    The producer stores entry head % capacity and only then advances head, so it never
+    waits for anybody. Each consumer keeps its own cursor: entries overwritten before
+    it drained them are skipped and counted as overflows of that consumer. Every entry
+    carries the monotonic stamp of its push. slot is a word of the main segment touched
+    on each push, so wait_for_change and write_counts work on streams as on keys.'''
+
+    def __init__(self, name, slot, capacity, fields, formats, offset):
+        if capacity & (capacity - 1):
+            raise ValueError('capacity of stream %s must be a power of two' % name)
+        if slot < RECORD_OFFSET or slot >= NOTIFY_OFFSET:
+            raise ValueError('stream %s slot out of the record region' % name)
+        self.name = name
+        self.slot = slot
+        self.capacity = capacity
+        self.mask = capacity - 1
+        self.fields = tuple(fields)
+        self.entry = type(str(name.title().replace('_', '') + 'Entry'), (ctypes.Structure,),
+                          {'_fields_': [('stamp', ctypes.c_double)] +
+                                       [(str(field), ctypes.c_float if fmt == 'f' else ctypes.c_int32)
+                                        for field, fmt in zip(fields, formats)]})
+        self.make = namedtuple(name.title().replace('_', ''), ('stamp',) + self.fields)._make
+        self.offset = offset # Byte offset of the head word in the segment KEY+2
+        self.size = 8 + capacity * ctypes.sizeof(self.entry)
+        if offset + self.size > STREAM_SIZE:
+            raise ValueError('stream %s does not fit in the stream segment' % name)
+
+
+# Grupo de chaves pré-compilado -----------------------------------------------------------
+class KeyGroup(object):
+    '''Blackboard keys resolved once into positions of the segment.
+
+    fields holds (index, is_float) pairs, where index is relative to words or floats,
+    and slots the absolute word of each key. Values are returned in the order of keys,
+    as a tuple or, when record is given, as a namedtuple with the keys in lower case.'''
+
+    def __init__(self, keys, variable_int, variable_float, record=None):
+        self.keys = tuple(keys)
+        self.fields = []
+        for key in self.keys:
+            if key in variable_float:
+                self.fields.append((variable_float[key], True))
+            elif key in variable_int:
+                self.fields.append((variable_int[key], False))
+            else:
+                raise KeyError(key)
+        self.slots = [index + FLOAT_OFFSET if is_float else index for index, is_float in self.fields]
+        self.floats = [is_float for index, is_float in self.fields]
+        if np is not None:
+            # Structured dtype spanning the segment, one field per key at its byte offset
+            self.dtype = np.dtype({'names': list(self.keys),
+                                   'formats': ['<f4' if is_float else '<i4' for is_float in self.floats],
+                                   'offsets': [4 * slot for slot in self.slots],
+                                   'itemsize': SEGMENT_SIZE})
+        if record is None:
+            self.make = tuple
+        else:
+            self.make = namedtuple(record, [key.lower() for key in self.keys])._make
+
+
+# Acesso por atributo: bkb.vision.ball_dist ----------------------------------------------
+class Field(object):
+    '''Key of the blackboard seen as an attribute of its namespace.
+
+    index and slot are resolved when the class is built, so a read is a single
+    array access and a write also bumps the write counter of the word.'''
+    __slots__ = ('key', 'index', 'slot', 'is_float')
+
+    def __init__(self, key, kind, index):
+        self.key = key
+        self.index = index
+        self.is_float = kind == 'f'
+        self.slot = FLOAT_OFFSET + index if self.is_float else index
+
+    def __get__(self, namespace, owner):
+        if namespace is None:
+            return self
+        if self.is_float:
+            return namespace._float(self.index)
+        return namespace._int(self.index)
+
+    def __set__(self, namespace, value):
+        if self.is_float:
+            namespace._floats[self.index] = value
+        else:
+            namespace._words[self.index] = int(value)
+        namespace._bkb.touch(None, self.slot)
+
+
+class Namespace(object):
+    '''Keys of one module (vision, decision...) bound to an attached SharedMemory.'''
+    __slots__ = ('_bkb', '_words', '_floats', '_int', '_float')
+
+    def __init__(self, bkb):
+        self._bkb = bkb
+        self._words = bkb.words
+        self._floats = bkb.floats
+        # NumPy views return Python numbers through item, ctypes arrays through indexing
+        self._int = getattr(bkb.words, 'item', bkb.words.__getitem__)
+        self._float = getattr(bkb.floats, 'item', bkb.floats.__getitem__)
+
+
+class NamespaceAccessor(object):
+    '''Class attribute of SharedMemory creating the namespace on first use.'''
+
+    def __init__(self, name, namespace):
+        self.name = name
+        self.namespace = namespace
+
+    def __get__(self, bkb, owner):
+        if bkb is None:
+            return self.namespace
+        value = bkb.__dict__[self.name] = self.namespace(bkb)
+        return value
+
+
+def _compile_namespaces(fields):
+    namespaces = {}
+    for name, members in fields.items():
+        body = dict((attribute, Field(key, kind, index)) for attribute, key, kind, index in members)
+        body['__slots__'] = ()
+        namespaces[name] = type(str(name.title() + 'Namespace'), (Namespace,), body)
+    return namespaces
 
 
 # Classe do BlackBoard--------------------------------------------------------------------
 class SharedMemory(object):
 # Classe que lê e escreve na memória compartilhada do sistema '''
 
+    library = None # libblackboardpy.so, loaded by the first shd_constructor
+
+    # Escolhe o backend: SharedMemory() usa $BKB_BACKEND (ctypes se não definida),
+    # SharedMemory('numpy') usa a view NumPy, 'python' e 'mmap' dispensam a biblioteca c++
+    def __new__(cls, backend=None):
+        if cls is SharedMemory:
+            cls = backends[backend or os.environ.get(BACKEND_ENV, 'ctypes')]
+            if os.environ.get(PROFILE_ENV) is not None:
+                from BlackboardProfiler import profiled
+                cls = profiled(cls)
+        return object.__new__(cls)
+
     def shd_constructor(self,KEY):
         #print "Start the Class Blackboard"
         # Usando memoria compartilhada a partir das funções do c++-------------------------------------------------------
-        try:
-            self.testlib = ctypes.CDLL('../../build/lib/libblackboardpy.so') #chama a library que contem as funções em c++
-        except OSError:
-            self.testlib = ctypes.CDLL('../AI/build/lib/libblackboardpy.so') #chama a library que contem as funções em c++
-        self.testlib.using_shared_memory.restype = ctypes.POINTER(ctypes.c_int)
+        if SharedMemory.library is None: # loaded once per process, shared by every instance
+            try:
+                testlib = ctypes.CDLL('../../build/lib/libblackboardpy.so') #chama a library que contem as funções em c++
+            except OSError:
+                testlib = ctypes.CDLL('../AI/build/lib/libblackboardpy.so') #chama a library que contem as funções em c++
+            testlib.using_shared_memory.restype = ctypes.POINTER(ctypes.c_int)
+            testlib.read_float.restype = ctypes.c_float #defining the return type, that case defining float
+            testlib.read_int.restype = ctypes.c_int #defining the return type, that case defining int
+            SharedMemory.library = testlib
+        self.testlib = SharedMemory.library
         mem = self.testlib.using_shared_memory(KEY)         #using c++ function
         #print 'python', mem
-        self.testlib.read_float.restype = ctypes.c_float #defining the return type, that case defining float
-        self.testlib.read_int.restype = ctypes.c_int #defining the return type, that case defining int
+        self.map_segment(ctypes.addressof(mem.contents), KEY)
         return mem
         #--------------------------------------------------------------------------------------------------------------------
 
+    # Arrays ctypes sobre o mesmo segmento, usados pelas leituras e escritas em grupo---------
+    def map_segment(self, address, KEY):
+        self.address = address
+        self.words = (ctypes.c_int * (SEGMENT_SIZE // 4)).from_address(self.address)
+        self.floats = (ctypes.c_float * (SEGMENT_SIZE // 4 - FLOAT_OFFSET)).from_address(self.address + 4 * FLOAT_OFFSET)
+        self.watched = (ctypes.c_ubyte * NOTIFY_OFFSET).from_address(self.address + 4 * WATCH_OFFSET)
+        self.segment_key = KEY
+        self.mapped_at = monotonic()
+        for name in tuple(self.namespaces) + LAZY_META + LAZY_STREAMS:
+            self.__dict__.pop(name, None) # Namespaces and segments bound to a previous KEY
+
+    # Os segmentos KEY+1 e KEY+2 só são acoplados no primeiro uso (contadores, streams),
+    # os processos que só leem e escrevem chaves não os criam
+    def __getattr__(self, name):
+        if name in LAZY_META:
+            self.attach_meta(self.segment_key)
+        elif name in LAZY_STREAMS:
+            self.attach_streams(self.segment_key)
+        else:
+            raise AttributeError(name)
+        return self.__dict__[name]
+
+    # Segmentos auxiliares (KEY+1, KEY+2...), sobrescrito pelo backend mmap
+    def attach(self, key, size):
+        return attach_segment(key, size)
+    #-----------------------------------------------------------------------------------------
+
     # Criando função que escreve float--------------------------------------------------------
     def write_float(self, mem, variable, value):
-        self.testlib.write_float(mem, ctypes.c_int(self.variable_float[variable]), ctypes.c_float(value))
+        index = self.variable_float[variable]
+        self.testlib.write_float(mem, ctypes.c_int(index), ctypes.c_float(value))
+        self.touch(mem, FLOAT_OFFSET + index)
     #-----------------------------------------------------------------------------------------
 
 
     # Criando função que escreve float--------------------------------------------------------
     def write_floatDynamic(self, mem, variable,index, value):
-        self.testlib.write_float(mem, ctypes.c_int(self.variable_float[variable]+index), ctypes.c_float(value))
+        index += self.variable_float[variable]
+        self.testlib.write_float(mem, ctypes.c_int(index), ctypes.c_float(value))
+        self.touch(mem, FLOAT_OFFSET + index)
     #-----------------------------------------------------------------------------------------
 
     # Criando função que escreve float--------------------------------------------------------
     def write_int(self, mem, variable, value):
-        self.testlib.write_int(mem, ctypes.c_int(self.variable_int[variable]), ctypes.c_int(int(value)))
+        index = self.variable_int[variable]
+        self.testlib.write_int(mem, ctypes.c_int(index), ctypes.c_int(int(value)))
+        self.touch(mem, index)
     #-----------------------------------------------------------------------------------------
 
     # Criando função que lê float--------------------------------------------------------
@@ -55,219 +360,488 @@ class SharedMemory(object):
         return self.testlib.read_float(mem, ctypes.c_int(self.variable_float[variable]))
     #-----------------------------------------------------------------------------------------
 
+    # Criando função que lê float--------------------------------------------------------
+    def read_floatDynamic(self, mem, variable, index):
+        return self.testlib.read_float(mem, ctypes.c_int(self.variable_float[variable]+index))
+    #-----------------------------------------------------------------------------------------
+
     # Criando função que lê float--------------------------------------------------------
     def read_int(self, mem, variable):
         return self.testlib.read_int(mem, ctypes.c_int(self.variable_int[variable]))
     #-----------------------------------------------------------------------------------------
 
-    variable_int = {
-    'PLANNING_COMMAND' : 0,
-    'PLANNING_PARAMETER_VEL': 1,
-    'PLANNING_PARAMETER_ANGLE': 2,
-    'IMU_STATE' : 3,
-    'IMU_RESET': 4,
-    'CONTROL_ACTION': 13,
-    'CONTROL_HEIGHT_A': 14,
-    'CONTROL_HEIGHT_B': 15,
-    'CONTROL_HEIGHT_C': 16,
-    'DECISION_ACTION_A': 17,
-    'DECISION_ACTION_B': 18,
-    'DECISION_STATE': 19,
-    'DECISION_POSITION_A': 20,
-    'DECISION_POSITION_B': 21,
-    'DECISION_POSITION_C': 22,
-    'DECISION_BALL_POS': 23,
-    'DECISION_OPP1_POS': 24,
-    'DECISION_OPP2_POS': 25,
-    'DECISION_OPP3_POS': 26,
-    'COM_ACTION_ROBOT1': 27,
-    'COM_ACTION_ROBOT2': 28,
-    'COM_ACTION_ROBOT3': 29,
-    'COM_STATE_ROBOT1': 30,
-    'COM_STATE_ROBOT2': 31,
-    'COM_STATE_ROBOT3': 32,
-    'COM_POS_ROBOT1': 33,
-    'COM_POS_ROBOT2': 34,
-    'COM_POS_ROBOT3': 35,
-    'COM_POS_BALL_ROBOT1': 36,
-    'COM_POS_BALL_ROBOT2': 37,
-    'COM_POS_BALL_ROBOT3': 38,
-    'COM_POS_OPP_A_ROBOT1': 39,
-    'COM_POS_OPP_A_ROBOT2': 40,
-    'COM_POS_OPP_A_ROBOT3': 41,
-    'COM_POS_OPP_A_ROBOT4': 42,
-    'COM_POS_OPP_B_ROBOT1': 43,
-    'COM_POS_OPP_B_ROBOT2': 44,
-    'COM_POS_OPP_B_ROBOT3': 45,
-    'COM_POS_OPP_B_ROBOT4': 46,
-    'COM_POS_OPP_C_ROBOT1': 47,
-    'COM_POS_OPP_C_ROBOT2': 48,
-    'COM_POS_OPP_C_ROBOT3': 49,
-    'COM_POS_OPP_C_ROBOT4': 50,
-    'COM_REFEREE': 51,
-    'LOCALIZATION_X': 52,
-    'LOCALIZATION_Y': 53,
-    'LOCALIZATION_THETA': 54,
-    'VISION_LOST': 57,
-    'DECISION_SEARCH_ON': 58,
-    'DECISION_ACTION_VISION': 59,
-    'VISION_MOTOR1_GOAL': 60,
-    'VISION_MOTOR2_GOAL': 61,
-    'VISION_SEARCH_GOAL': 62,
-    'VISION_LOST_GOAL': 63,
-    'VISION_STATE': 64,
-    'ROBOT_NUMBER': 65,
-    'VISION_pos_servo1': 66,
-    'VISION_pos_servo2': 67,
-    'COM_POS_ORIENT_QUALIT_ROBOT_A': 68,
-    'COM_POS_DIST_QUALIT_ROBOT_A': 69,
-    'COM_POS_ORIENT_QUALIT_ROBOT_B': 70,
-    'COM_POS_DIST_QUALIT_ROBOT_B': 71,
-    'COM_POS_ORIENT_QUALIT_ROBOT_C': 72,
-    'COM_POS_DIST_QUALIT_ROBOT_C': 73,
-    'VISION_DELTA_ORIENT': 74,
-    'LOCALIZATION_FIND_ROBOT': 75,
-    'RECEIVED_ROBOT_SENDING': 76,
-    'RECEIVED_QUAL_ORIENT': 77,
-    'RECEIVED_QUAL_DIST': 78,
-    'RECEIVED_ROBOT_SEEN': 79,
-    'CONTROL_MESSAGES': 80,
-    'ASKED_QUALIT_DIRECT': 81,
-    'ASKED_QUALIT_DISTANCE': 82,
-    'ASKED_RELATED_ROBOT': 83,
-    'CONTROL_MOVING': 84,
-    'ROBOT_VIEW_ROTATE': 100,
-    'CONTROL_WORKING': 101,
-    'VISION_WORKING': 102,
-    'LOCALIZATION_WORKING': 103,
-    'DECISION_WORKING': 104,
-    'IMU_WORKING': 105,
-    'VOLTAGE': 106,
-    'DECISION_LOCALIZATION': 107,
+    # Compila uma lista de chaves para read_many/write_many-----------------------------------
+    @classmethod
+    def compile_group(cls, keys, record=None):
+        return KeyGroup(keys, cls.variable_int, cls.variable_float, record)
+    #-----------------------------------------------------------------------------------------
+
+    # Lê um grupo de chaves de uma vez (nome de key_groups ou KeyGroup)-----------------------
+    def read_many(self, mem, group):
+        if not isinstance(group, KeyGroup):
+            group = self.groups[group]
+        words = self.words
+        floats = self.floats
+        return group.make([floats[index] if is_float else words[index] for index, is_float in group.fields])
+    #-----------------------------------------------------------------------------------------
+
+    # Escreve um grupo de chaves de uma vez, values na ordem das chaves-----------------------
+    def write_many(self, mem, group, values):
+        if not isinstance(group, KeyGroup):
+            group = self.groups[group]
+        words = self.words
+        floats = self.floats
+        for (index, is_float), value in zip(group.fields, values):
+            if is_float:
+                floats[index] = value
+            else:
+                words[index] = int(value)
+        self.touch_slots(mem, group.slots)
+    #-----------------------------------------------------------------------------------------
+
+    # Publica um registro inteiro de forma atômica (um único escritor por registro)----------
+    def write_record(self, mem, name, values):
+        record = self.records[name]
+        words = self.words
+        floats = self.floats
+        start = int(words[record.seq]) & ~1
+        words[record.seq] = (start + 1) & SEQ_MASK # odd: write in progress
+        for (index, is_float), value in zip(record.fields, values):
+            if is_float:
+                floats[index] = value
+            else:
+                words[index] = int(value)
+        words[record.seq] = (start + 2) & SEQ_MASK # even: record stable
+        self.touch(mem, record.seq)
+    #-----------------------------------------------------------------------------------------
+
+    # Lê um registro consistente, sem bloquear o escritor-------------------------------------
+    def read_record(self, mem, name):
+        record = self.records[name]
+        words = self.words
+        floats = self.floats
+        for attempt in range(SEQLOCK_RETRIES):
+            seq = words[record.seq]
+            if seq & 1:
+                continue
+            values = [floats[index] if is_float else words[index] for index, is_float in record.fields]
+            if words[record.seq] == seq:
+                return self._keep_record(name, record.make(values))
+        return self._last_record(name, record)
+    #-----------------------------------------------------------------------------------------
+
+    # Contadores e instantes de escrita de cada palavra, no segmento KEY+1-------------------
+    def attach_meta(self, KEY):
+        address = self.attach(KEY + META_KEY_OFFSET, META_SIZE)
+        self.counters = (ctypes.c_uint32 * NOTIFY_OFFSET).from_address(address)
+        self.stamps = (ctypes.c_double * NOTIFY_OFFSET).from_address(address + 4 * NOTIFY_OFFSET)
+
+    # Registra uma escrita na palavra slot e acorda quem a observa. Só as palavras marcadas
+    # em watched pagam o contador, o relógio e o futex; as outras escritas saem de graça
+    def touch(self, mem, slot):
+        flags = self.watched[slot]
+        if flags:
+            self.counters[slot] += 1
+            if flags & WATCH_STAMP:
+                self.stamps[slot] = monotonic()
+            if flags & WATCH_NOTIFY:
+                self.notify(mem)
+
+    def touch_slots(self, mem, slots):
+        counters = self.counters
+        stamps = self.stamps
+        watched = self.watched
+        now = None
+        notify = False
+        for slot in slots:
+            flags = watched[slot]
+            if flags:
+                counters[slot] += 1
+                if flags & WATCH_STAMP:
+                    if now is None:
+                        now = monotonic()
+                    stamps[slot] = now
+                notify = notify or flags & WATCH_NOTIFY
+        if notify:
+            self.notify(mem)
+
+    # Marca as palavras para que todos os processos passem a contar (e datar) suas escritas
+    def track(self, slots, flag):
+        watched = self.watched
+        for slot in slots:
+            if not watched[slot] & flag:
+                watched[slot] |= flag
+        return slots
+
+    # Quantas vezes a chave (ou registro) foi escrita desde que algum processo a observou
+    def write_count(self, mem, variable):
+        return self.counters[self.track(self.watch_slots(variable), WATCH_COUNT)[0]]
+
+    # Contadores de várias chaves, registros ou grupos, na ordem de watch_slots
+    def write_counts(self, mem, keys):
+        counters = self.counters
+        return [counters[slot] for slot in self.track(self.watch_slots(keys), WATCH_COUNT)]
+
+    # Instante monotônico da última escrita (0 se não foi escrita desde a primeira consulta)
+    def write_time(self, mem, variable):
+        return self.stamps[self.track(self.watch_slots(variable), WATCH_COUNT | WATCH_STAMP)[0]]
+
+    # Segundos desde a última escrita da chave
+    def age(self, mem, variable):
+        return monotonic() - self.write_time(mem, variable)
+    #-----------------------------------------------------------------------------------------
+
+    # Filas circulares das streams, no segmento KEY+2----------------------------------------
+    def attach_streams(self, KEY):
+        address = self.attach(KEY + STREAM_KEY_OFFSET, STREAM_SIZE)
+        self.rings = {}
+        self.cursors = {}
+        self.overflows = {}
+        for name, stream in self.streams.items():
+            head = ctypes.c_uint32.from_address(address + stream.offset)
+            entries = (stream.entry * stream.capacity).from_address(address + stream.offset + 8)
+            self.rings[name] = (head, entries)
+            # Only entries pushed after shd_constructor are drained, even when the segment
+            # is attached later by the first drain
+            cursor = head.value
+            while ((head.value - cursor) & HEAD_MASK < stream.capacity
+                   and entries[(cursor - 1) & stream.mask].stamp >= self.mapped_at):
+                cursor = (cursor - 1) & HEAD_MASK
+            self.cursors[name] = cursor
+            self.overflows[name] = 0
+
+    # Adiciona uma entrada à stream (um único produtor por stream)
+    def push(self, mem, name, values):
+        stream = self.streams[name]
+        head, entries = self.rings[name]
+        position = head.value
+        entries[position & stream.mask] = stream.entry(monotonic(), *values)
+        head.value = (position + 1) & HEAD_MASK
+        self.touch(mem, stream.slot)
+
+    # Devolve as entradas publicadas desde o último drain, da mais antiga à mais nova
+    def drain(self, mem, name):
+        stream = self.streams[name]
+        head, entries = self.rings[name]
+        cursor = self.cursors[name]
+        end = head.value
+        if (end - cursor) & HEAD_MASK > stream.capacity:
+            self.overflows[name] += ((end - cursor) & HEAD_MASK) - stream.capacity
+            cursor = (end - stream.capacity) & HEAD_MASK
+        copies = []
+        position = cursor
+        while position != end:
+            entry = entries[position & stream.mask]
+            copies.append(tuple(getattr(entry, field) for field, kind in entry._fields_))
+            position = (position + 1) & HEAD_MASK
+        # Entries the producer may have overwritten while they were copied are discarded
+        lapped = min(((head.value - cursor) & HEAD_MASK) - stream.capacity + 1, len(copies))
+        if lapped > 0:
+            self.overflows[name] += lapped
+            copies = copies[lapped:]
+        self.cursors[name] = end
+        return [stream.make(values) for values in copies]
+
+    # Entradas perdidas por este consumidor porque a fila deu a volta
+    def overflow_count(self, mem, name):
+        return self.overflows[name]
+    #-----------------------------------------------------------------------------------------
+
+    # Acorda os processos esperando em wait_for_change---------------------------------------
+    def notify(self, mem):
+        words = self.words
+        words[NOTIFY_OFFSET] = (int(words[NOTIFY_OFFSET]) + 1) & SEQ_MASK
+        if SYS_FUTEX is not None:
+            futex_wake(self.address + 4 * NOTIFY_OFFSET)
+
+    #-----------------------------------------------------------------------------------------
+
+    # Dorme até que uma das chaves seja escrita ou o timeout (s) acabe-------------------------
+    def wait_for_change(self, mem, keys, timeout=None, since=None):
+        '''Sleeps until one of keys is written by any process, or until timeout.
+
+        keys may be key names, record names or group names (or a single one of them).
+        since is a list from write_counts(mem, keys); when given, writes made after it
+        was taken also count, so nothing is lost between reading and waiting.
+        Returns True when a key was written and False on timeout. Only writes made
+        through SharedMemory are seen (the C++ processes do not count nor notify).'''
+        slots = self.track(self.watch_slots(keys), WATCH_NOTIFY)
+        words = self.words
+        counters = self.counters
+        if since is None:
+            since = [counters[slot] for slot in slots]
+        deadline = None if timeout is None else monotonic() + timeout
+        while True:
+            generation = int(words[NOTIFY_OFFSET]) # read before the counters, see notify
+            if [counters[slot] for slot in slots] != list(since):
+                return True
+            remaining = None if deadline is None else deadline - monotonic()
+            if remaining is not None and remaining <= 0:
+                return False
+            if SYS_FUTEX is not None:
+                futex_wait(self.address + 4 * NOTIFY_OFFSET, generation, remaining)
+            else:
+                time.sleep(POLL_INTERVAL if remaining is None else min(POLL_INTERVAL, remaining))
+
+    def watch_slots(self, keys):
+        # Palavras do segmento de cada chave, registro ou grupo, resolvidas uma vez
+        try:
+            return self._watch_cache[keys]
+        except AttributeError:
+            self._watch_cache = {}
+        except (KeyError, TypeError):
+            pass
+        names = (keys,) if isinstance(keys, str) else keys
+        slots = []
+        for name in names:
+            if name in self.variable_int:
+                slots.append(self.variable_int[name])
+            elif name in self.variable_float:
+                slots.append(FLOAT_OFFSET + self.variable_float[name])
+            elif name in self.records:
+                slots.append(self.records[name].seq)
+            elif name in self.streams:
+                slots.append(self.streams[name].slot)
+            else:
+                slots.extend(self.groups[name].slots)
+        try:
+            self._watch_cache[keys] = slots
+        except TypeError:
+            pass # lists are not hashable, resolved again on every call
+        return slots
+    #-----------------------------------------------------------------------------------------
+
+    # Cópia consistente mais recente de cada registro, devolvida quando o escritor não libera
+    def _keep_record(self, name, value):
+        try:
+            self._records_seen[name] = value
+        except AttributeError:
+            self._records_seen = {name: value}
+        return value
+
+    def _last_record(self, name, record):
+        try:
+            return self._records_seen[name]
+        except (AttributeError, KeyError):
+            return record.make([0] * len(record.fields))
+    #-----------------------------------------------------------------------------------------
+
+    # Registros versionados na região após os floats, compilados em records--------------------
+    record_regions = {
+    'LOCALIZATION_POSE': (256, ('x', 'y', 'theta', 'std'), 'ffff'),
+    'VISION_BALL': (261, ('dist', 'pan'), 'ff'),
+    'LOCALIZATION_HYPOTHESIS': (264, ('x', 'y', 'theta', 'weight', 'std', 'count'), 'fffffi'),
+    }
+
+    # Streams de observações: palavra de notificação, capacidade, campos e tipos-------------
+    stream_regions = {
+    'LANDMARKS': (300, 64, ('blue', 'red', 'yellow', 'purple'), 'ffff'),
+    'BALL': (301, 64, ('dist', 'pan'), 'ff'),
+    'IMU': (302, 256, ('euler_x', 'euler_y', 'euler_z'), 'fff'),
+    'TEAM': (303, 32, ('robot', 'code', 'value'), 'iif'),
+    'FIELD_POINTS': (304, 256, ('dist', 'angle', 'kind'), 'ffi'),
     }
 
-    variable_float = {
-    'IMU_GYRO_X': 1,
-    'IMU_GYRO_Y': 2,
-    'IMU_GYRO_Z': 3,
-    'IMU_ACCEL_X': 4,
-    'IMU_ACCEL_Y': 5,
-    'IMU_ACCEL_Z': 6,
-    'IMU_COMPASS_X': 7,
-    'IMU_COMPASS_Y': 8,
-    'IMU_COMPASS_Z': 9,
-    'IMU_EULER_X': 10,
-    'IMU_EULER_Y': 11,
-    'IMU_EULER_Z': 12,
-    'IMU_QUAT_X': 13,
-    'IMU_QUAT_Y': 14,
-    'IMU_QUAT_Z': 15,
-    'VISION_AREA_SEGMENT': 16,
-    'VISION_BALL_DIST': 17,
-    'VISION_BALL_ANGLE': 18,
-    'VISION_GOAL_DIST': 19,
-    'VISION_GOAL_ANGLE': 20,
-    'VISION_OPP01_DIST': 21,
-    'VISION_OPP02_DIST': 22,
-    'VISION_OPP03_DIST': 23,
-    'VISION_OPP04_DIST': 24,
-    'VISION_OPP05_DIST': 25,
-    'VISION_OPP06_DIST': 26,
-    'VISION_OPP07_DIST': 27,
-    'VISION_OPP08_DIST': 28,
-    'VISION_OPP09_DIST': 29,
-    'VISION_OPP10_DIST': 30,
-    'VISION_OPP11_DIST': 31,
-    'VISION_OPP01_ANGLE': 32,
-    'VISION_OPP02_ANGLE': 33,
-    'VISION_OPP03_ANGLE': 34,
-    'VISION_OPP04_ANGLE': 35,
-    'VISION_OPP05_ANGLE': 36,
-    'VISION_OPP06_ANGLE': 37,
-    'VISION_OPP07_ANGLE': 38,
-    'VISION_OPP08_ANGLE': 39,
-    'VISION_OPP09_ANGLE': 40,
-    'VISION_OPP10_ANGLE': 41,
-    'VISION_OPP11_ANGLE': 42,
-    'VISION_RBT01_DIST': 43,
-    'VISION_RBT02_DIST': 44,
-    'VISION_RBT03_DIST': 45,
-    'VISION_RBT04_DIST': 46,
-    'VISION_RBT05_DIST': 47,
-    'VISION_RBT06_DIST': 48,
-    'VISION_RBT07_DIST': 49,
-    'VISION_RBT08_DIST': 50,
-    'VISION_RBT09_DIST': 51,
-    'VISION_RBT10_DIST': 52,
-    'VISION_RBT11_DIST': 53,
-    'VISION_RBT01_ANGLE': 54,
-    'VISION_RBT02_ANGLE': 55,
-    'VISION_RBT03_ANGLE': 56,
-    'VISION_RBT04_ANGLE': 57,
-    'VISION_RBT05_ANGLE': 58,
-    'VISION_RBT06_ANGLE': 59,
-    'VISION_RBT07_ANGLE': 60,
-    'VISION_RBT08_ANGLE': 61,
-    'VISION_RBT09_ANGLE': 62,
-    'VISION_RBT10_ANGLE': 63,
-    'VISION_RBT11_ANGLE': 64,
-    'VISION_TILT_DEG': 65,
-    'VISION_PAN_DEG': 66,
-    'CBR_COORDINATOR': 67,
-    'CBR_RUN': 68,
-    'LOCALIZATION_BALL_X': 69,
-    'LOCALIZATION_BALL_Y': 70,
-    'LOCALIZATION_RBT01_X': 71,
-    'LOCALIZATION_RBT01_Y': 72,
-    'LOCALIZATION_RBT02_X': 73,
-    'LOCALIZATION_RBT02_Y': 74,
-    'LOCALIZATION_RBT03_X': 75,
-    'LOCALIZATION_RBT03_Y': 76,
-    'LOCALIZATION_RBT04_X': 77,
-    'LOCALIZATION_RBT04_Y': 78,
-    'LOCALIZATION_RBT05_X': 79,
-    'LOCALIZATION_RBT05_Y': 80,
-    'LOCALIZATION_RBT06_X': 81,
-    'LOCALIZATION_RBT06_Y': 82,
-    'LOCALIZATION_RBT07_X': 83,
-    'LOCALIZATION_RBT07_Y': 84,
-    'LOCALIZATION_RBT08_X': 85,
-    'LOCALIZATION_RBT08_Y': 86,
-    'LOCALIZATION_RBT09_X': 87,
-    'LOCALIZATION_RBT09_Y': 88,
-    'LOCALIZATION_RBT10_X': 89,
-    'LOCALIZATION_RBT10_Y': 90,
-    'LOCALIZATION_RBT11_X': 91,
-    'LOCALIZATION_RBT11_Y': 92,
-    'LOCALIZATION_OPP01_X': 93,
-    'LOCALIZATION_OPP01_Y': 94,
-    'LOCALIZATION_OPP02_X': 95,
-    'LOCALIZATION_OPP02_Y': 96,
-    'LOCALIZATION_OPP03_X': 97,
-    'LOCALIZATION_OPP03_Y': 98,
-    'LOCALIZATION_OPP04_X': 99,
-    'LOCALIZATION_OPP04_Y': 100,
-    'LOCALIZATION_OPP05_X': 101,
-    'LOCALIZATION_OPP05_Y': 102,
-    'LOCALIZATION_OPP06_X': 103,
-    'LOCALIZATION_OPP06_Y': 104,
-    'LOCALIZATION_OPP07_X': 105,
-    'LOCALIZATION_OPP07_Y': 106,
-    'LOCALIZATION_OPP08_X': 107,
-    'LOCALIZATION_OPP08_Y': 108,
-    'LOCALIZATION_OPP09_X': 109,
-    'LOCALIZATION_OPP09_Y': 110,
-    'LOCALIZATION_OPP10_X': 111,
-    'LOCALIZATION_OPP10_Y': 112,
-    'LOCALIZATION_OPP11_X': 113,
-    'LOCALIZATION_OPP11_Y': 114,
-    'DECISION_RBT01_DIST_BALL': 115,
-    'DECISION_RBT02_DIST_BALL': 116,
-    'DECISION_RBT03_DIST_BALL': 117,
-    'DECISION_RBT04_DIST_BALL': 118,
-    'VISION_BLUE_LANDMARK_DEG': 119,
-    'VISION_RED_LANDMARK_DEG': 120,
-    'VISION_YELLOW_LANDMARK_DEG': 121,
-    'VISION_PURPLE_LANDMARK_DEG': 122,
+    # Grupos de chaves lidos juntos pelos processos, compilados em groups---------------------
+    key_groups = {
+    'VISION_LANDMARK_DEG': ('VISION_BLUE_LANDMARK_DEG', 'VISION_RED_LANDMARK_DEG',
+                            'VISION_YELLOW_LANDMARK_DEG', 'VISION_PURPLE_LANDMARK_DEG'),
+    'DECISION_DIST_BALL': ('DECISION_RBT01_DIST_BALL', 'DECISION_RBT02_DIST_BALL',
+                           'DECISION_RBT03_DIST_BALL', 'DECISION_RBT04_DIST_BALL'),
+    'WORKING': ('CONTROL_WORKING', 'VISION_WORKING', 'LOCALIZATION_WORKING',
+                'DECISION_WORKING', 'IMU_WORKING'),
+    'TELEMETRY': ('IMU_EULER_Z', 'VISION_BALL_DIST', 'VISION_PAN_DEG',
+                  'CONTROL_WORKING', 'VISION_WORKING', 'LOCALIZATION_WORKING',
+                  'DECISION_WORKING', 'IMU_WORKING', 'DECISION_ACTION_A',
+                  'VOLTAGE', 'VISION_LOST'),
     }
+
+    # Chaves por nome (API por string), geradas a partir de BlackboardSchema.layout
+    variable_int, variable_float, namespace_fields = BlackboardSchema.compile_layout(BlackboardSchema.layout)
+#------------------------------------------------------------------------------------------
+
+SharedMemory.groups = dict((name, SharedMemory.compile_group(keys, name.title().replace('_', '')))
+                           for name, keys in SharedMemory.key_groups.items())
+SharedMemory.records = dict((name, Record(name, *region))
+                            for name, region in SharedMemory.record_regions.items())
+
+def _compile_streams(regions):
+    # Filas dispostas em ordem alfabética, alinhadas em 8 bytes, iguais em todos os processos
+    streams = {}
+    offset = 0
+    for name in sorted(regions):
+        stream = streams[name] = Stream(name, *regions[name], offset=offset)
+        offset += (stream.size + 7) & ~7
+    return streams
+
+SharedMemory.streams = _compile_streams(SharedMemory.stream_regions)
+
+# Registros, palavras das streams e flags não podem invadir as chaves nem uns aos outros
+BlackboardSchema.check_spans(
+    [(key, index, 1) for key, index in SharedMemory.variable_int.items()] +
+    [(key, FLOAT_OFFSET + index, 1) for key, index in SharedMemory.variable_float.items()] +
+    [(name, record.seq, 1 + len(record.fields)) for name, record in SharedMemory.records.items()] +
+    [(name, stream.slot, 1) for name, stream in SharedMemory.streams.items()] +
+    [('NOTIFY_OFFSET', NOTIFY_OFFSET, 1), ('WATCH_OFFSET', WATCH_OFFSET, (NOTIFY_OFFSET + 3) // 4)])
+
+SharedMemory.namespaces = _compile_namespaces(SharedMemory.namespace_fields)
+for _name, _namespace in SharedMemory.namespaces.items():
+    if hasattr(SharedMemory, _name):
+        raise ValueError('namespace %s hides an attribute of SharedMemory' % _name)
+    setattr(SharedMemory, _name, NamespaceAccessor(_name, _namespace))
+
+
+# Backend NumPy ---------------------------------------------------------------------------
+class NumpySharedMemory(SharedMemory):
+    '''Maps the same segment attached by using_shared_memory as NumPy arrays.
+
+    words is an int32 view of the whole segment and floats a float32 view starting at
+    Mem+125, so reads and writes are plain array indexing instead of calls into
+    libblackboardpy.so. The mem argument is kept only for API compatibility.'''
+
+    def shd_constructor(self, KEY):
+        if np is None:
+            raise ImportError('NumpySharedMemory needs numpy installed')
+        mem = SharedMemory.shd_constructor(self, KEY)
+        self.words = np.ctypeslib.as_array(self.words)
+        self.floats = self.words[FLOAT_OFFSET:].view(np.float32)
+        return mem
+
+    def write_float(self, mem, variable, value):
+        index = self.variable_float[variable]
+        self.floats[index] = value
+        self.touch(mem, FLOAT_OFFSET + index)
+
+    def write_floatDynamic(self, mem, variable, index, value):
+        index += self.variable_float[variable]
+        self.floats[index] = value
+        self.touch(mem, FLOAT_OFFSET + index)
+
+    def write_int(self, mem, variable, value):
+        index = self.variable_int[variable]
+        self.words[index] = int(value)
+        self.touch(mem, index)
+
+    def read_float(self, mem, variable):
+        return self.floats.item(self.variable_float[variable])
+
+    def read_floatDynamic(self, mem, variable, index):
+        return self.floats.item(self.variable_float[variable]+index)
+
+    def read_int(self, mem, variable):
+        return self.words.item(self.variable_int[variable])
+
+    def write_record(self, mem, name, values):
+        record = self.records[name]
+        words = self.words
+        start = words.item(record.seq) & ~1
+        words[record.seq] = (start + 1) & SEQ_MASK
+        view = self.group_view(record)
+        view[()] = (start + 1,) + tuple(values)
+        words[record.seq] = (start + 2) & SEQ_MASK
+        self.touch(mem, record.seq)
+
+    def read_record(self, mem, name):
+        record = self.records[name]
+        words = self.words
+        view = self.group_view(record)
+        for attempt in range(SEQLOCK_RETRIES):
+            seq = words.item(record.seq)
+            if seq & 1:
+                continue
+            values = view.item()
+            if values[0] == seq and words.item(record.seq) == seq:
+                return self._keep_record(name, record.make(values[1:]))
+        return self._last_record(name, record)
+
+    def group_view(self, group):
+        # Array 0-d com o dtype do grupo (ou registro) sobre o segmento, criado uma vez
+        try:
+            return self._group_views[group]
+        except AttributeError:
+            self._group_views = {}
+        except KeyError:
+            pass
+        view = self._group_views[group] = np.ndarray((), group.dtype, buffer=self.words)
+        return view
+
+    def read_many(self, mem, group):
+        if not isinstance(group, KeyGroup):
+            group = self.groups[group]
+        return group.make(self.group_view(group).item())
+
+    def write_many(self, mem, group, values):
+        if not isinstance(group, KeyGroup):
+            group = self.groups[group]
+        self.group_view(group)[()] = tuple(values)
+        self.touch_slots(mem, group.slots)
+#------------------------------------------------------------------------------------------
+
+
+# Backend em Python puro ------------------------------------------------------------------
+class PythonSharedMemory(SharedMemory):
+    '''Attaches the System V segment KEY directly through libc, without libblackboardpy.so.
+
+    The layout is the same as blackboard.cpp (2048 bytes, floats from Mem+125), so this
+    backend talks to the C++ processes as usual; reads and writes index ctypes arrays
+    over the segment. shd_constructor returns an int pointer to it, like the C++ path.'''
+
+    def shd_constructor(self, KEY):
+        address = self.attach(KEY, SEGMENT_SIZE)
+        self.map_segment(address, KEY)
+        return ctypes.cast(address, ctypes.POINTER(ctypes.c_int))
+
+    def write_float(self, mem, variable, value):
+        index = self.variable_float[variable]
+        self.floats[index] = value
+        self.touch(mem, FLOAT_OFFSET + index)
+
+    def write_floatDynamic(self, mem, variable, index, value):
+        index += self.variable_float[variable]
+        self.floats[index] = value
+        self.touch(mem, FLOAT_OFFSET + index)
+
+    def write_int(self, mem, variable, value):
+        index = self.variable_int[variable]
+        self.words[index] = int(value)
+        self.touch(mem, index)
+
+    def read_float(self, mem, variable):
+        return self.floats[self.variable_float[variable]]
+
+    def read_floatDynamic(self, mem, variable, index):
+        return self.floats[self.variable_float[variable]+index]
+
+    def read_int(self, mem, variable):
+        return self.words[self.variable_int[variable]]
+
+
+class MmapSharedMemory(PythonSharedMemory):
+    '''Keeps every segment in a file mapped with mmap, blackboard-<key> in $BKB_DIR.
+
+    Needs neither the C++ build nor System V IPC, so the simulator runs anywhere; the
+    processes see each other only when they share the directory (default /dev/shm,
+    or the temporary directory when it does not exist). The C++ processes do not.'''
+
+    def attach(self, key, size):
+        directory = os.environ.get(DIRECTORY_ENV) or ('/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir())
+        fd = os.open(os.path.join(directory, 'blackboard-%d' % key), os.O_RDWR | os.O_CREAT, 0o666)
+        try:
+            if os.fstat(fd).st_size < size:
+                os.ftruncate(fd, size)
+            segment = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+        try:
+            self._segments.append(segment) # The mapping lives as long as the instance
+        except AttributeError:
+            self._segments = [segment]
+        return ctypes.addressof(ctypes.c_char.from_buffer(segment))
 #------------------------------------------------------------------------------------------
+
+backends = {
+    'ctypes': SharedMemory,
+    'numpy': NumpySharedMemory,
+    'python': PythonSharedMemory,
+    'mmap': MmapSharedMemory,
+}
@@ -0,0 +1,60 @@
+#! /usr/bin/env python
+#coding: utf-8
+ # ----------------------------------------------------------------------------
+ # ****************************************************************************
+ # * @file benchmark.py
+ # * @project: ROBOFEI-HT - FEI
+ # * @brief Benchmark of the blackboard backends
+ # ****************************************************************************
+ # Times read_int/write_int/read_float/write_float on every backend of
+ # SharedMemory.py over the same segment and prints the speedup against the
+ # ctypes path. Run from AI/Blackboard/src after building the blackboard.
+ # ****************************************************************************
+from __future__ import print_function
+
+import argparse
+import timeit
+
+from SharedMemory import SharedMemory, backends
+
+parser = argparse.ArgumentParser(description='Blackboard benchmark', epilog='Uses a scratch segment, never run it with a robot key.')
+parser.add_argument('-k', '--key', type=int, default=9900, help='key of the scratch segment (default 9900)')
+parser.add_argument('-n', '--number', type=int, default=100000, help='calls per operation (default 100000)')
+parser.add_argument('-b', '--backends', nargs='+', default=sorted(backends), help='backends to compare')
+
+args = parser.parse_args()
+
+# Operations measured, single 4-byte accesses, one read of the telemetry group and
+# the attribute accessor of the same float
+operations = (
+    ('read_int', lambda bkb, mem: bkb.read_int(mem, 'DECISION_ACTION_A')),
+    ('write_int', lambda bkb, mem: bkb.write_int(mem, 'DECISION_ACTION_A', 1)),
+    ('read_float', lambda bkb, mem: bkb.read_float(mem, 'VISION_BALL_DIST')),
+    ('write_float', lambda bkb, mem: bkb.write_float(mem, 'VISION_BALL_DIST', 1.5)),
+    ('read_many', lambda bkb, mem: bkb.read_many(mem, 'TELEMETRY')),
+    ('vision.ball_dist', lambda bkb, mem: bkb.vision.ball_dist),
+)
+
+def measure(name):
+    bkb = SharedMemory(name)
+    mem = bkb.shd_constructor(args.key)
+    result = {}
+    for op, call in operations:
+        # Best of three runs, in nanoseconds per call
+        best = min(timeit.repeat(lambda: call(bkb, mem), number=args.number, repeat=3))
+        result[op] = 1e9 * best / args.number
+    return result
+
+results = dict((name, measure(name)) for name in args.backends)
+base = results.get('ctypes')
+
+print()
+print('%-12s' % 'ns/call' + ''.join('%18s' % op for op, _ in operations))
+for name in args.backends:
+    line = '%-12s' % name
+    for op, _ in operations:
+        line += '%18.1f' % results[name][op]
+    print(line)
+    if base is not None and name != 'ctypes':
+        print('%-12s' % '  speedup' + ''.join('%17.1fx' % (base[op] / results[name][op]) for op, _ in operations))
+print()
@@ -0,0 +1,154 @@
+#! /usr/bin/env python
+#coding: utf-8
+ # ----------------------------------------------------------------------------
+ # ****************************************************************************
+ # * @file recorder.py
+ # * @project: ROBOFEI-HT - FEI
+ # * @brief Record and replay of the blackboard segment
+ # ****************************************************************************
+ # record samples the whole 2048-byte segment at a fixed rate (or only when it
+ # changes) into a binary log of fixed-size frames; replay writes the frames
+ # back into a segment at 1x, Nx or full speed, so Localization and Decision
+ # can run offline on match data. The log is a 64-byte header followed by
+ # frames of (double stamp, uint64 frame number, segment), and read_log maps
+ # it as a NumPy record array when numpy is installed.
+ # ****************************************************************************
+from __future__ import print_function
+
+import argparse
+import ctypes
+import mmap
+import struct
+import sys
+import time
+from array import array
+
+from SharedMemory import SharedMemory, SEGMENT_SIZE, NOTIFY_OFFSET, monotonic, np
+
+try:
+    from configparser import ConfigParser
+except ImportError:
+    from ConfigParser import ConfigParser
+
+MAGIC = b'BKBLOG01'
+HEADER = struct.Struct('<8sIIIId') # magic, version, segment size, frame size, key, wall time
+HEADER_SIZE = 64
+FRAME = struct.Struct('<dQ') # monotonic stamp (s) and frame number, followed by the segment
+FRAME_SIZE = FRAME.size + SEGMENT_SIZE
+REPLAYED_WORDS = NOTIFY_OFFSET # Keys and records; the notify word and watch flags stay local
+
+
+# Chave do blackboard do robô, como nos outros processos ----------------------------------
+def default_key():
+    config = ConfigParser()
+    try:
+        config.read('../../Control/Data/config.ini')
+        return int(config.get('Communication', 'no_player_robofei'))*100
+    except Exception:
+        return None
+
+
+# Grava o segmento em frames de tamanho fixo ----------------------------------------------
+def record(args):
+    bkb = SharedMemory()
+    mem = bkb.shd_constructor(args.key)
+    keys = sorted(bkb.variable_int) + sorted(bkb.variable_float) + sorted(bkb.records) + sorted(bkb.streams)
+    period = 1.0 / args.rate
+    frames = 0
+    last = None
+    with open(args.log, 'wb') as log:
+        log.write(HEADER.pack(MAGIC, 1, SEGMENT_SIZE, FRAME_SIZE, args.key, time.time()).ljust(HEADER_SIZE, b'\0'))
+        start = monotonic()
+        deadline = start + args.duration if args.duration else None
+        try:
+            while deadline is None or monotonic() < deadline:
+                tick = monotonic()
+                segment = ctypes.string_at(bkb.address, SEGMENT_SIZE)
+                if not args.on_change or segment != last:
+                    log.write(FRAME.pack(tick - start, frames))
+                    log.write(segment)
+                    frames += 1
+                    last = segment
+                if args.on_change:
+                    # Python writers wake us at once, the C++ ones are seen on the next poll
+                    bkb.wait_for_change(mem, keys, period)
+                else:
+                    time.sleep(max(0.0, tick + period - monotonic()))
+        except KeyboardInterrupt:
+            pass
+    print('%d frames written to %s' % (frames, args.log))
+
+
+# Lê um log gravado por record -------------------------------------------------------------
+def read_log(path):
+    '''Returns the header fields and the frames of the log at path.
+
+    frames is a NumPy record array (stamp, frame, segment) mapped from the file when
+    numpy is installed, or a list of (stamp, frame, segment bytes) otherwise.'''
+    with open(path, 'rb') as log:
+        magic, version, segment_size, frame_size, key, wall = HEADER.unpack(log.read(HEADER.size))
+        if magic != MAGIC or segment_size != SEGMENT_SIZE or frame_size != FRAME_SIZE:
+            raise ValueError('%s is not a blackboard log of this layout' % path)
+        log.seek(0, 2)
+        count = (log.tell() - HEADER_SIZE) // FRAME_SIZE
+        if np is not None:
+            dtype = np.dtype([('stamp', '<f8'), ('frame', '<u8'), ('segment', 'u1', SEGMENT_SIZE)])
+            frames = np.memmap(path, dtype, 'r', HEADER_SIZE, (count,))
+        else:
+            data = mmap.mmap(log.fileno(), 0, access=mmap.ACCESS_READ)
+            frames = []
+            for n in range(count):
+                offset = HEADER_SIZE + n * FRAME_SIZE
+                stamp, frame = FRAME.unpack_from(data, offset)
+                frames.append((stamp, frame, data[offset + FRAME.size:offset + FRAME_SIZE]))
+    return (key, wall), frames
+
+
+# Escreve os frames de volta no segmento ---------------------------------------------------
+def replay(args):
+    (key, wall), frames = read_log(args.log)
+    bkb = SharedMemory()
+    mem = bkb.shd_constructor(args.key if args.key is not None else key)
+    words = (ctypes.c_int * REPLAYED_WORDS).from_address(bkb.address)
+    print('replaying %d frames of key %d recorded at %s' % (len(frames), key, time.ctime(wall)))
+    try:
+        while True:
+            start = monotonic()
+            for stamp, frame, segment in frames:
+                if args.speed > 0:
+                    time.sleep(max(0.0, start + stamp / args.speed - monotonic()))
+                new = array('i', bytes(bytearray(segment[:4 * REPLAYED_WORDS])))
+                changed = [slot for slot in range(REPLAYED_WORDS) if words[slot] != new[slot]]
+                for slot in changed:
+                    words[slot] = new[slot]
+                bkb.touch_slots(mem, changed) # Counters and waiters see the replayed writes
+            if not args.loop:
+                break
+    except KeyboardInterrupt:
+        pass
+
+
+parser = argparse.ArgumentParser(description='Blackboard recorder', epilog='Records the blackboard segment to a binary log and replays it.')
+subparsers = parser.add_subparsers()
+recorder = subparsers.add_parser('record', help='samples the segment into a log')
+recorder.add_argument('log', help='log file to write')
+recorder.add_argument('-k', '--key', type=int, default=default_key(), help='key of the segment (default from config.ini)')
+recorder.add_argument('-r', '--rate', type=float, default=100.0, help='frames per second, or polls per second with -c (default 100)')
+recorder.add_argument('-c', '--on-change', action='store_true', help='writes a frame only when the segment changed')
+recorder.add_argument('-d', '--duration', type=float, default=0, help='seconds to record (default until Ctrl-C)')
+recorder.set_defaults(run=record)
+replayer = subparsers.add_parser('replay', help='writes the frames of a log into a segment')
+replayer.add_argument('log', help='log file to read')
+replayer.add_argument('-k', '--key', type=int, default=None, help='key of the segment (default the recorded one)')
+replayer.add_argument('-s', '--speed', type=float, default=1.0, help='replay speed, 0 for as fast as possible (default 1)')
+replayer.add_argument('-l', '--loop', action='store_true', help='starts over at the end of the log')
+replayer.set_defaults(run=replay)
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    if getattr(args, 'run', None) is None:
+        parser.print_help()
+        sys.exit(1)
+    if args.run is record and args.key is None:
+        parser.error('no key given and config.ini not found')
+    args.run(args)
@@ -57,11 +57,7 @@ sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM) # UDP
 sock.setsockopt(socket.SOL_SOCKET,socket.SO_BROADCAST,1) # Broadcast
 
 bkb.write_int(mem, 'CONTROL_MESSAGES', 0)
-bkb.write_int(mem, 'CONTROL_WORKING', 0) # Sets the flag
-bkb.write_int(mem, 'VISION_WORKING', 0) # Sets the flag
-bkb.write_int(mem, 'LOCALIZATION_WORKING', 0) # Sets the flag
-bkb.write_int(mem, 'DECISION_WORKING', 0) # Sets the flag
-bkb.write_int(mem, 'IMU_WORKING', 0) # Sets the flag
+bkb.write_many(mem, 'WORKING', (0, 0, 0, 0, 0)) # Sets the flags
 
 while(True):
     if bkb.read_int(mem,'CONTROL_MESSAGES') == 2: #code #2 - sends distance value
@@ -75,34 +71,33 @@ while(True):
         bkb.write_int(mem,'CONTROL_MESSAGES',0)
 
     # Used for Telemetry
+    tele = bkb.read_many(mem, 'TELEMETRY') # Reads all the telemetry fields at once
+    ball = bkb.read_record(mem, 'VISION_BALL') # Distance and angle of the same detection
     message = str(rbt_number) + ' ' # Robot number
     # Localization Variables
-    # message += str(bkb.read_int(mem,'LOCALIZATION_X')) + ' ' # X Position
-    # message += str(bkb.read_int(mem,'LOCALIZATION_Y')) + ' ' # Y Position
-    # message += str(bkb.read_int(mem,'LOCALIZATION_THETA')) + ' ' # THETA Position
-    # message += str(bkb.read_float(mem,'LOCALIZATION_RBT01_X')) + ' ' # Belief
+    # pose = bkb.read_record(mem, 'LOCALIZATION_POSE') # Consistent x, y, theta and belief
+    # message += str(int(pose.x)) + ' ' # X Position
+    # message += str(int(pose.y)) + ' ' # Y Position
+    # message += str(int(pose.theta)) + ' ' # THETA Position
+    # message += str(pose.std) + ' ' # Belief
     message += str(X_ROBOT) + ' '
     message += str(Y_ROBOT) + ' '
-    message += str(bkb.read_float(mem, 'IMU_EULER_Z')) + ' '
+    message += str(tele.imu_euler_z) + ' '
     message += str(2) + ' '
-    message += str(bkb.read_float(mem, 'VISION_BALL_DIST')) + ' ' # Distance Ball's Position
-    message += str(bkb.read_float(mem, 'VISION_PAN_DEG')) + ' ' # Angle Ball's Position
+    message += str(ball.dist) + ' ' # Distance Ball's Position
+    message += str(ball.pan) + ' ' # Angle Ball's Position
     # Flags of Execution
-    message += str(bkb.read_int(mem,'CONTROL_WORKING')) + ' ' # Return 1 if Control is working
-    bkb.write_int(mem, 'CONTROL_WORKING', 0) # Resets the flag for Control
-    message += str(bkb.read_int(mem, 'VISION_WORKING')) + ' ' # Equal previous
-    bkb.write_int(mem, 'VISION_WORKING', 0) # Equal previous
-    message += str(bkb.read_int(mem, 'LOCALIZATION_WORKING')) + ' ' # Equal previous
-    bkb.write_int(mem, 'LOCALIZATION_WORKING', 0) # Equal previous
-    message += str(bkb.read_int(mem, 'DECISION_WORKING')) + ' ' # Equal previous
-    bkb.write_int(mem, 'DECISION_WORKING', 0) # Equal previous
-    message += str(bkb.read_int(mem, 'IMU_WORKING')) + ' ' # Equal previous
-    bkb.write_int(mem, 'IMU_WORKING', 0) # Equal previous
+    message += str(tele.control_working) + ' ' # Return 1 if Control is working
+    message += str(tele.vision_working) + ' ' # Equal previous
+    message += str(tele.localization_working) + ' ' # Equal previous
+    message += str(tele.decision_working) + ' ' # Equal previous
+    message += str(tele.imu_working) + ' ' # Equal previous
+    bkb.write_many(mem, 'WORKING', (0, 0, 0, 0, 0)) # Resets the flags of execution
     # Other Variables
-    message += str(bkb.read_int(mem, 'DECISION_ACTION_A')) + ' ' # Sends the movement the decision is executing.
-    message += str(bkb.read_float(mem, 'IMU_EULER_Z')) + ' ' # Sends the orientation of the IMU
-    message += str(bkb.read_int(mem, 'VOLTAGE')) + ' ' # Sends the Voltage on motors.
-    message += str(bkb.read_int(mem, 'VISION_LOST')) + ' '
+    message += str(tele.decision_action_a) + ' ' # Sends the movement the decision is executing.
+    message += str(tele.imu_euler_z) + ' ' # Sends the orientation of the IMU
+    message += str(tele.voltage) + ' ' # Sends the Voltage on motors.
+    message += str(tele.vision_lost) + ' '
 
     # End of Message
     message += 'OUT'
@@ -90,7 +90,8 @@ class TreatingRawData(object):
         return self.config.getint('Offset', 'ID_20')'''
 
     def get_search_status(self):
-        time.sleep(0.1)
+        # waits up to 0.1 s for vision to update the status, instead of always sleeping
+        self.bkb.wait_for_change(self.mem,'VISION_LOST',0.1)
         return self.bkb.read_int(self.mem,'VISION_LOST')
 
     def get_vision_status(self):
@@ -342,10 +343,7 @@ class NaiveIMU(TreatingRawData):
         print
         self.kickoff_ctrl = 0
         #set a far distance to robots
-        self.bkb.write_float(self.mem,'DECISION_RBT01_DIST_BALL',999)
-        self.bkb.write_float(self.mem,'DECISION_RBT02_DIST_BALL',999)
-        self.bkb.write_float(self.mem,'DECISION_RBT03_DIST_BALL',999)
-        self.bkb.write_float(self.mem,'DECISION_RBT04_DIST_BALL',999)
+        self.bkb.write_many(self.mem,'DECISION_DIST_BALL',(999, 999, 999, 999))
 
     def decision(self, referee):
         if referee == 1:  # stopped
@@ -390,18 +388,21 @@ class NaiveIMU(TreatingRawData):
 
                 self.bkb.write_int(self.mem,'CONTROL_MESSAGES',2)
 
-                print 'dist Robot 1: ',self.bkb.read_float(self.mem,'DECISION_RBT01_DIST_BALL')
-                print 'dist Robot 2: ',self.bkb.read_float(self.mem,'DECISION_RBT02_DIST_BALL')
-                print 'dist Robot 3: ',self.bkb.read_float(self.mem,'DECISION_RBT03_DIST_BALL')
-                print 'dist Robot 4: ',self.bkb.read_float(self.mem,'DECISION_RBT04_DIST_BALL')
+                # reads the distances of all robots at once
+                d1, d2, d3, d4 = self.bkb.read_many(self.mem,'DECISION_DIST_BALL')
 
-                if self.bkb.read_float(self.mem,'DECISION_RBT01_DIST_BALL') < self.bkb.read_float(self.mem,'DECISION_RBT02_DIST_BALL') and self.bkb.read_float(self.mem,'DECISION_RBT01_DIST_BALL') < self.bkb.read_float(self.mem,'DECISION_RBT03_DIST_BALL') and self.bkb.read_float(self.mem,'DECISION_RBT01_DIST_BALL') < self.bkb.read_float(self.mem,'DECISION_RBT04_DIST_BALL'):
+                print 'dist Robot 1: ',d1
+                print 'dist Robot 2: ',d2
+                print 'dist Robot 3: ',d3
+                print 'dist Robot 4: ',d4
+
+                if d1 < d2 and d1 < d3 and d1 < d4:
                     self.bkb.write_float(self.mem,'CBR_COORDINATOR',1)
-                elif self.bkb.read_float(self.mem,'DECISION_RBT02_DIST_BALL') < self.bkb.read_float(self.mem,'DECISION_RBT01_DIST_BALL') and self.bkb.read_float(self.mem,'DECISION_RBT02_DIST_BALL') < self.bkb.read_float(self.mem,'DECISION_RBT03_DIST_BALL') and self.bkb.read_float(self.mem,'DECISION_RBT02_DIST_BALL') < self.bkb.read_float(self.mem,'DECISION_RBT04_DIST_BALL'):
+                elif d2 < d1 and d2 < d3 and d2 < d4:
                     self.bkb.write_float(self.mem,'CBR_COORDINATOR',2)
-                elif self.bkb.read_float(self.mem,'DECISION_RBT03_DIST_BALL') < self.bkb.read_float(self.mem,'DECISION_RBT02_DIST_BALL') and self.bkb.read_float(self.mem,'DECISION_RBT03_DIST_BALL') < self.bkb.read_float(self.mem,'DECISION_RBT01_DIST_BALL') and self.bkb.read_float(self.mem,'DECISION_RBT03_DIST_BALL') < self.bkb.read_float(self.mem,'DECISION_RBT04_DIST_BALL'):
+                elif d3 < d2 and d3 < d1 and d3 < d4:
                     self.bkb.write_float(self.mem,'CBR_COORDINATOR',3)
-                elif self.bkb.read_float(self.mem,'DECISION_RBT04_DIST_BALL') < self.bkb.read_float(self.mem,'DECISION_RBT02_DIST_BALL') and self.bkb.read_float(self.mem,'DECISION_RBT04_DIST_BALL') < self.bkb.read_float(self.mem,'DECISION_RBT03_DIST_BALL') and self.bkb.read_float(self.mem,'DECISION_RBT04_DIST_BALL') < self.bkb.read_float(self.mem,'DECISION_RBT01_DIST_BALL'):
+                elif d4 < d2 and d4 < d3 and d4 < d1:
                     self.bkb.write_float(self.mem,'CBR_COORDINATOR',4)
                 else:
                     self.bkb.write_float(self.mem,'CBR_COORDINATOR',float(self.bkb.read_int(self.mem,'ROBOT_NUMBER')))
@@ -64,6 +64,9 @@ else:
     robot = Ordinary()
 
 
+# Keys which wake the decision loop up when written
+DECISION_INPUTS = ('VISION_LOST', 'VISION_STATE', 'VISION_BALL', 'VISION_PAN_DEG', 'COM_REFEREE')
+
 #loop
 while True:
 
@@ -74,7 +77,8 @@ while True:
 
     robot.bkb.write_int(robot.mem, 'DECISION_WORKING', 1)
 
-    time.sleep(0.05) 
+    # Sleeps until vision or the referee write something new, at most 0.05 s as before
+    robot.bkb.wait_for_change(robot.mem, DECISION_INPUTS, 0.05)
     
     
     
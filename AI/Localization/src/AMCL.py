@@ -16,12 +16,13 @@ class MonteCarlo():
     #----------------------------------------------------------------------------------------------
     #   Constructor of the particle filter
     #----------------------------------------------------------------------------------------------
-    def __init__(self, max_qtd=0):
+    def __init__(self, max_qtd=0, min_qtd=None):
         # Holds the particles objects
         self.particles = []
 
         # Limits the quantity of particles the filter will have
         self.max_qtd = max_qtd
+        self.min_qtd = min_qtd # With a lower bound, KLD-sampling adapts the quantity in between
         self.qtd = max_qtd
 
         for i in range(self.qtd):
@@ -29,6 +30,7 @@ class MonteCarlo():
             self.particles.append(Particle())
 
         self.totalweight = 0 # Holds the total sum of particles' weights.
+        self.ess_threshold = ESS_THRESHOLD # Fraction of effective particles below which it resamples
 
         # Coefficients used to determine if it is supposed to generate new particles.
         self.wslow = 0
@@ -57,67 +59,54 @@ class MonteCarlo():
 
         if z != None:
             for particle in self.particles:
-                self.totalweight += particle.Sensor(z)
+                self.totalweight += particle.Sensor(z, particle.weight)
     
     #----------------------------------------------------------------------------------------------
     #   Resample step
     #----------------------------------------------------------------------------------------------
     def Resample(self, qtd):
-        parts = [] # Starts a empty list, which will hold copies of old particles
-        new = [] # Starts a empty list, whihc will hold new random particles
-
         # Coefficients adjusments
         self.wslow += self.aslow * (self.totalweight/len(self.particles) - self.wslow)
         self.wfast += self.afast * (self.totalweight/len(self.particles) - self.wfast)
 
         # print self.wslow, self.wfast, self.totalweight/len(self.particles)
 
-        step = self.totalweight / qtd # Computes the step size
-        s = step/2 # the first step is given by half the total.
-
-        m_x = 0 # Sum of x
-        m_y = 0 # Sum of y
-        m_s = 0 # Sum of sin of rotation
-        m_c = 0 # Sum of cos of rotation
-        m_count = 0 # Quantity counter
-
-        for p in self.particles: # For each particle,
-            while s < p.weight: # while the particles weight is grater than the step,
-                s += step # rises the step size,
-                if max(0, 1.0-self.wfast/self.wslow) > rnd.random():
-                    new.append(Particle()) # generates a new random particle
-                else:
-                    parts.append(Particle(p.x, p.y, p.rotation)) # adds the particle to the list.
-                    # Do the summing process for the mean computation
-                    m_x += p.x 
-                    m_y += p.y 
-                    m_s += sin(radians(p.rotation))
-                    m_c += cos(radians(p.rotation))
-            s -= p.weight # Removes the used steps.
-
-        oldqtd = len(parts) # Saves the quantity of particles.
-
-        # Computes the mean dividing the sum for the quantity
-        self.mean[0] = m_x / oldqtd
-        self.mean[1] = m_y / oldqtd
-        # computes mean rotation by finding the arctan of the sum of sins over cossins
-        self.mean[2] = degrees(atan2(m_s,m_c))
-
-        # Computes the standard deviation of particles
-        sum_std = 0
-        for p in parts:
-            sum_std += (p.x - self.mean[0])**2 + (p.y - self.mean[1])**2
-        self.std = sqrt(sum_std / oldqtd)
-
-        # Saves the particles for the next iteration
-        self.particles = parts + new
-        self.qtd = len(self.particles)
+        # Chance of replacing a selected particle by a random one
+        chance = max(0, 1.0-self.wfast/self.wslow) if self.wslow > 0 else 0
+
+        # While the weights are healthy and no particle is to be replaced they are kept as they are
+        if not self.totalweight > 0 or (chance == 0 and EffectiveSampleSize(self.particles) > self.ess_threshold * len(self.particles)):
+            NormalizeWeights(self.particles, self.totalweight)
+            self.mean, self.std = WeightedMean(self.particles)
+            return
+
+        # Copies the chosen particles over the old ones
+        indices = LowVarianceIndices([p.weight for p in self.particles], self.totalweight, qtd)
+        if self.min_qtd:
+            indices = KLDIndices(self.particles, indices, self.min_qtd, qtd)
+        ResampleInPlace(self.particles, indices)
+        self.qtd = len(self.particles) # Saves the quantity of particles.
+
+        kept = [] # Particles copied from the old ones
+        for i in range(self.qtd):
+            if chance > rnd.random():
+                self.particles[i] = Particle() # generates a new random particle
+            else:
+                kept.append(self.particles[i])
+
+        # Computes the mean and standard deviation of the copied particles
+        if kept:
+            self.mean, self.std = WeightedMean(kept)
 
     #----------------------------------------------------------------------------------------------
     #   Main algorithm
     #----------------------------------------------------------------------------------------------
     def main(self, u=None, z=None):
         self.Prediction(u)
-        self.Update(z)
-        self.Resample(self.max_qtd)
+        # Without new measures only the odometry moves the particles, their weights are kept
+        if z != None:
+            self.Update(z)
+            self.Resample(self.max_qtd)
+        else:
+            self.mean, self.std = WeightedMean(self.particles)
         return self.mean, self.std
\ No newline at end of file
@@ -0,0 +1,91 @@
+__author__ = "RoboFEI-HT"
+__authors__ = "Aislan C. Almeida"
+__license__ = "GNU General Public License v3.0"
+
+import numpy as np
+
+#--------------------------------------------------------------------------------------------------
+#   This module splits the particles into pose hypotheses
+#   - The field is symmetric, so the particles may gather around two mirrored poses and their mean
+#     would fall between them. The peaks of a weighted histogram over a coarse grid of the field
+#     seed the hypotheses, and every particle joins the closest one.
+#   - Each hypothesis has its share of the weight, its mean pose and the covariance of x, y and
+#     rotation, the heaviest one is the pose the robot publishes.
+#--------------------------------------------------------------------------------------------------
+
+CELL = 50 # Size of the cells of the histogram, in cm
+BOUNDS = ((0, 900), (0, 600)) # Region of the histogram, particles out of it count on its border
+
+#--------------------------------------------------------------------------------------------------
+#   Positions, rotations and weights of the particles as arrays, from any of the filters
+#--------------------------------------------------------------------------------------------------
+def ParticleArrays(PF):
+    # The NumPy engines already hold the arrays, the other ones a list of particle objects
+    if isinstance(getattr(PF, 'x', None), np.ndarray):
+        return PF.x, PF.y, PF.rotation, PF.weight
+    n = len(PF.particles)
+    return tuple(np.fromiter((getattr(p, field) for p in PF.particles), np.float64, n)
+                 for field in ('x', 'y', 'rotation', 'weight'))
+
+#--------------------------------------------------------------------------------------------------
+#   Up to k hypotheses (weight, [x, y, rotation], covariance), from the heaviest to the lightest
+#--------------------------------------------------------------------------------------------------
+def Hypotheses(x, y, rotation, weight, k=3, cell=CELL, bounds=BOUNDS):
+    total = weight.sum()
+    if not total > 0:
+        weight = np.ones(len(x))
+        total = float(len(x))
+
+    # Weighted histogram of the positions, summed over the neighbours of every cell so a cluster
+    # split by the border of two cells still makes a single peak
+    nx = int((bounds[0][1] - bounds[0][0]) // cell) + 1
+    ny = int((bounds[1][1] - bounds[1][0]) // cell) + 1
+    i = np.clip(((x - bounds[0][0]) // cell).astype(np.intp), 0, nx - 1)
+    j = np.clip(((y - bounds[1][0]) // cell).astype(np.intp), 0, ny - 1)
+    histogram = np.pad(np.bincount(i * ny + j, weight, nx * ny).reshape(nx, ny), 1, 'constant')
+    smooth = sum(histogram[a:a + nx, b:b + ny] for a in range(3) for b in range(3))
+
+    # Peaks are the cells as heavy as all their neighbours, away from the heavier peaks
+    padded = np.pad(smooth, 1, 'constant', constant_values=-1)
+    top = np.max([padded[a:a + nx, b:b + ny] for a in range(3) for b in range(3)], axis=0)
+    candidates = np.flatnonzero((smooth >= top) & (smooth > 0))
+    peaks = []
+    for c in candidates[np.argsort(-smooth.ravel()[candidates])]:
+        if all(abs(c // ny - p // ny) > 2 or abs(c % ny - p % ny) > 2 for p in peaks):
+            peaks.append(c)
+            if len(peaks) == k:
+                break
+    if not peaks:
+        return [] # No particles, or none with weight
+    centers = np.array([(bounds[0][0] + (p // ny + 0.5) * cell, bounds[1][0] + (p % ny + 0.5) * cell) for p in peaks])
+
+    # Every particle joins the closest center, twice, the second time to the means of the first
+    for iteration in range(2):
+        distance = (x[:, None] - centers[:, 0])**2 + (y[:, None] - centers[:, 1])**2
+        label = np.argmin(distance, axis=1)
+        share = np.bincount(label, weight, len(centers))
+        kept = share > 0
+        centers = np.stack((np.bincount(label, weight * x, len(centers))[kept] / share[kept],
+                            np.bincount(label, weight * y, len(centers))[kept] / share[kept]), axis=1)
+        if not kept.all():
+            label = np.argmin((x[:, None] - centers[:, 0])**2 + (y[:, None] - centers[:, 1])**2, axis=1)
+
+    # Mean pose and covariance of each hypothesis, the rotation as a circular mean
+    theta = np.radians(rotation)
+    hypotheses = []
+    for h in range(len(centers)):
+        member = label == h
+        w = weight[member]
+        if not w.sum() > 0:
+            continue
+        mean_x = np.average(x[member], weights=w)
+        mean_y = np.average(y[member], weights=w)
+        mean_theta = np.degrees(np.arctan2(np.average(np.sin(theta[member]), weights=w),
+                                           np.average(np.cos(theta[member]), weights=w)))
+        residual = np.stack((x[member] - mean_x, y[member] - mean_y,
+                             (rotation[member] - mean_theta + 180) % 360 - 180))
+        covariance = (residual * w).dot(residual.T) / w.sum()
+        hypotheses.append((w.sum() / total, [mean_x, mean_y, mean_theta], covariance))
+
+    hypotheses.sort(key=lambda hypothesis: -hypothesis[0])
+    return hypotheses
@@ -0,0 +1,95 @@
+__author__ = "RoboFEI-HT"
+__authors__ = "Aislan C. Almeida"
+__license__ = "GNU General Public License v3.0"
+
+import NumpyMCL
+from NumpyMCL import *
+
+#--------------------------------------------------------------------------------------------------
+#   This module implements the NumPy particle filter conditioned on the IMU heading
+#   - The particles only sample the position. Each one holds a gaussian estimate of the bias of
+#     the IMU, a scalar Kalman filter, and its rotation is the IMU angle minus that bias.
+#   - Every landmark seen tells the rotation at the particle's position, so it corrects the bias
+#     and weighs the particle by how likely it was given the bias (Rao-Blackwellization).
+#   - Between measures the rotation follows the odometry without motion noise, as it is taken from
+#     the IMU on the next update, and the bias drifts as a random walk.
+#--------------------------------------------------------------------------------------------------
+
+#--------------------------------------------------------------------------------------------------
+#   Class implementing the heading conditioned particle filter
+#--------------------------------------------------------------------------------------------------
+
+class MonteCarlo(NumpyMCL.MonteCarlo):
+    #----------------------------------------------------------------------------------------------
+    #   Constructor, takes the arguments of NumpyMCL.MonteCarlo and the errors of the IMU in degrees
+    #----------------------------------------------------------------------------------------------
+    def __init__(self, max_qtd=0, mode='mcl', errstd=None, min_qtd=None, imu_std=2, drift=1, field=False):
+        NumpyMCL.MonteCarlo.__init__(self, max_qtd, mode, errstd, min_qtd, field=field)
+
+        # The bias starts with the error the IMU likelihood assumed, errstd[1]
+        self.bias = np.zeros(self.qtd)
+        self.variance = np.full(self.qtd, float(self.errstd[1])**2)
+        self.imu_std = imu_std # Noise of each IMU reading
+        self.drift = drift # Standard deviation of the bias change over a second
+
+    #----------------------------------------------------------------------------------------------
+    #   Prediction step, samples the position only, the bias gets less certain as it drifts
+    #----------------------------------------------------------------------------------------------
+    def Prediction(self, u=None):
+        # If there was movement, run the predction step
+        if u != None:
+            rotation = (self.rotation + u[2] * u[4] + 180) % 360 - 180
+            Predict(self.x, self.y, self.rotation, self.a, u)
+            self.rotation = rotation
+            self.variance += self.drift**2 * u[4]
+
+    #----------------------------------------------------------------------------------------------
+    #   Update step, corrects the bias of every particle and weighs it by the landmarks
+    #----------------------------------------------------------------------------------------------
+    def Update(self, z=None):
+        # If there was any measure, run the update step
+        self.totalweight = 0
+        self.z = z
+
+        if z != None:
+            for i in range(4):
+                if z[i] != -999:
+                    # The landmark is seen at its bearing minus the rotation, so it tells the rotation,
+                    # and with the IMU angle the bias, of each particle
+                    bearing = -np.degrees(np.arctan2(LANDMARKS[i][1] - self.y, LANDMARKS[i][0] - self.x))
+                    innovation = (z[4] - (bearing - z[i]) - self.bias + 180) % 360 - 180
+                    S = self.variance + self.errstd[0]**2 + self.imu_std**2
+
+                    # Likelihood of the measure given the bias, and the Kalman correction of the bias
+                    self.weight *= np.exp(-innovation**2 / (2 * S)) / np.sqrt(2 * pi * S)
+                    K = self.variance / S
+                    self.bias += K * innovation
+                    self.variance *= 1 - K
+
+            # The rotation comes from the IMU
+            self.rotation[:] = (z[4] - self.bias + 180) % 360 - 180
+            if self.field is not None and len(z) > 5 and len(z[5]):
+                # Points of the field lines and goalposts seen, read from the likelihood field
+                self.weight *= self.field.Likelihood(self.x, self.y, self.rotation, z[5])
+            self.totalweight = self.weight.sum()
+
+    #----------------------------------------------------------------------------------------------
+    #   Replaces the particles selected by new, with a bias of their own
+    #----------------------------------------------------------------------------------------------
+    def Replace(self, new, poses):
+        NumpyMCL.MonteCarlo.Replace(self, new, poses)
+        if self.mode == 'srmcl':
+            # The reset rotation comes from the landmarks, so with the IMU angle it tells the bias
+            self.bias[new] = (self.z[4] - self.rotation[new] + 180) % 360 - 180
+            self.variance[new] = self.errstd[0]**2 + self.imu_std**2
+        else:
+            self.bias[new] = 0
+            self.variance[new] = float(self.errstd[1])**2
+
+    #----------------------------------------------------------------------------------------------
+    #   Copies the particles at index, their bias estimate included
+    #----------------------------------------------------------------------------------------------
+    def Gather(self, index):
+        NumpyMCL.MonteCarlo.Gather(self, index)
+        self.bias = self.bias[index]
+        self.variance = self.variance[index]
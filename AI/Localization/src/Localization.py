@@ -5,13 +5,16 @@ __license__ = "GNU General Public License v3.0"
 from Viewer import * # Imports the environment of the viewer
 # from AMCL import * # Imports the Particle Filter Class
 import time 
+import numpy as np
+from Clustering import Hypotheses, ParticleArrays
+from Tracking import Hybrid
 
 # To pass arguments to the function
 import argparse
 # Import a shared memory
 import sys
 sys.path.append('../../Blackboard/src/')
-from SharedMemory import SharedMemory
+from SharedMemory import SharedMemory, monotonic
 
 try:
     from configparser import ConfigParser
@@ -21,14 +24,41 @@ except ImportError:
 # To parse arguments on execution
 parser = argparse.ArgumentParser(description='Robot Localization', epilog= 'Implements particle filters to self-localize a robot on the field.')
 parser.add_argument('-g', '--graphs', action="store_true", help='Shows graphical interface which visualizes the particles.')
+parser.add_argument('--heatmap', action="store_true", help='With --graphs, draws the density of the particles instead of each one.')
+parser.add_argument('--decimation', type=int, default=1, help='With --graphs, draws one of every so many iterations (default 1).')
 parser.add_argument('-l', '--log', action="store_true", help='Print variable logs.')
 parser.add_argument('-m', '--mcl', action="store_true", help='Uses Monte-Carlo Localization')
 parser.add_argument('-a', '--amcl', action="store_true", help='Uses Augmented Monte-Carlo Localization')
 parser.add_argument('-s', '--srmcl', action="store_true", help='Uses Sensor Reseting Monte-Carlo Localization')
+parser.add_argument('-n', '--numpy', action="store_true", help='Runs the chosen version on the vectorized NumPy particle engine')
+parser.add_argument('-t', '--table', action="store_true", help='With --numpy, reads the landmark bearings from a precomputed table cached on disk.')
+parser.add_argument('-f', '--field', action="store_true", help='With --numpy, also weighs the particles by the field lines and goalposts points vision sees.')
+parser.add_argument('-i', '--heading', action="store_true", help='With --numpy, takes the rotation from the IMU, estimating its bias, and samples only x and y.')
+parser.add_argument('-p', '--processes', type=int, default=1, help='With --numpy, splits the prediction and the weighting over this many processes.')
+parser.add_argument('--min-particles', type=int, default=300, help='Fewest particles KLD-sampling keeps once the belief is tight (default 300).')
+parser.add_argument('--max-particles', type=int, default=5000, help='Most particles KLD-sampling grows to while the robot is lost (default 5000).')
+parser.add_argument('-e', '--ekf', type=float, default=0, help='Tracks the pose with an EKF while the particles std is under this many cm, 0 disables it (default 0).')
+parser.add_argument('-k', '--hypotheses', type=int, default=3, help='Most pose hypotheses the particles are clustered into (default 3).')
+parser.add_argument('-w', '--window', type=float, default=0, help='Seconds of landmark measures averaged on each update, 0 uses only the latest one (default 0).')
 
 args = parser.parse_args()
-
-if args.mcl:
+if args.field and not args.numpy:
+    parser.error('--field needs --numpy, the other engines do not weigh the field points')
+if args.heading and (args.table or args.processes > 1):
+    parser.error('--heading weighs the particles by the bias of the IMU, neither --table nor --processes apply')
+
+engine = {} # Extra arguments of MonteCarlo, only the NumPy engine takes the mode
+if args.numpy and (args.mcl or args.amcl or args.srmcl):
+    engine = {'mode': 'amcl' if args.amcl else 'srmcl' if args.srmcl else 'mcl', 'field': args.field}
+    if args.heading:
+        from HeadingMCL import *
+    elif args.processes > 1:
+        from ShardedMCL import *
+        engine.update(table=args.table, workers=args.processes)
+    else:
+        from NumpyMCL import *
+        engine['table'] = args.table
+elif args.mcl:
     from MCL import *
 elif args.amcl:
     from AMCL import *
@@ -67,11 +97,11 @@ class Localization():
         # Timestamp to use on the time step used for motion
         self.timestamp = time.time()
 
-        # Clears the variables in the blackboard
-        self.bkb.write_float(self.Mem, 'VISION_BLUE_LANDMARK_DEG', -999)
-        self.bkb.write_float(self.Mem, 'VISION_RED_LANDMARK_DEG', -999)
-        self.bkb.write_float(self.Mem, 'VISION_YELLOW_LANDMARK_DEG', -999)
-        self.bkb.write_float(self.Mem, 'VISION_PURPLE_LANDMARK_DEG', -999)
+        # Pushes to the landmark stream seen so far, used to sleep until the next one
+        self.lm_counts = self.bkb.write_counts(self.Mem, 'LANDMARKS')
+
+        # Clears the landmark keys, written by the vision processes that do not push to the stream
+        self.bkb.write_many(self.Mem, 'VISION_LANDMARK_DEG', (-999, -999, -999, -999))
 
     #----------------------------------------------------------------------------------------------
     #   Localization's main method.
@@ -80,27 +110,25 @@ class Localization():
         screen = Screen(self.args.graphs) # Creates a new screen
 
         if self.args.graphs:
-            simul = Simulation(screen) # Creates the interface structure
+            simul = Simulation(screen, self.args.heatmap, self.args.decimation) # Creates the interface structure
             field = SoccerField(screen) # Draws the field
             simul.field = field # Passes the field to the simulation
 
-        PF = MonteCarlo(5000) # Starts the Particle Filter
+        # Starts the Particle Filter, KLD-sampling adapts the quantity of particles within the bounds
+        PF = MonteCarlo(self.args.max_particles, min_qtd=min(self.args.min_particles, self.args.max_particles), **engine)
+        if self.args.ekf > 0:
+            # Once the particles converge, an extended Kalman filter tracks the pose in their place
+            PF = Hybrid(PF, self.args.ekf)
 
         print
 
-        zb = []
-        zr = []
-        zy = []
-        zp = []
-        timecount = []
+        # Landmark measures of the last seconds, averaged on each update when --window is given
+        measures = MeasureWindow(window=self.args.window)
+
+        best = None # Hypothesis published last, kept while the particles give none
 
         # Main loop
         while True:
-            z0 = 0
-            z1 = 0
-            z2 = 0
-            z3 = 0
-
             self.bkb.write_int(self.Mem, 'LOCALIZATION_WORKING', 1) # Sets the flag for telemetry
 
             # Process interactions events
@@ -110,45 +138,40 @@ class Localization():
             # Gets the motion command from the blackboard.
             u = self.GetU(self.bkb.read_int(self.Mem, 'CONTROL_ACTION'))
 
-            auxtime = time.time()
-            try:
-                if auxtime-timecount[0] > 0:
-                    timecount.pop(0)
-                    for zn in [zb, zr, zy, zp]:
-                        zn.pop(0)
-            except:
-                pass
-
-            # print timecount
-
-            timecount.append(auxtime)
-            # Gets the measured variable from the blackboard,
-            # and free them.
-            zb.append(self.bkb.read_float(self.Mem, 'VISION_BLUE_LANDMARK_DEG'))
-            self.bkb.write_float(self.Mem, 'VISION_BLUE_LANDMARK_DEG', -999)
-            zr.append(self.bkb.read_float(self.Mem, 'VISION_RED_LANDMARK_DEG'))
-            self.bkb.write_float(self.Mem, 'VISION_RED_LANDMARK_DEG', -999)
-            zy.append(self.bkb.read_float(self.Mem, 'VISION_YELLOW_LANDMARK_DEG'))
-            self.bkb.write_float(self.Mem, 'VISION_YELLOW_LANDMARK_DEG', -999)
-            zp.append(self.bkb.read_float(self.Mem, 'VISION_PURPLE_LANDMARK_DEG'))
-            self.bkb.write_float(self.Mem, 'VISION_PURPLE_LANDMARK_DEG', -999)
-
-
-            z0 = mean(zb)
-            z1 = mean(zr)
-            z2 = mean(zy)
-            z3 = mean(zp)
-            z4 = degrees(self.bkb.read_float(self.Mem, 'IMU_EULER_Z'))
-
-            # print zn[0], z0         
-
-            # Mounts the vector to be sent
-            z = (z0, z1, z2, z3, z4)
-            # print z
-               
+            # Gets every landmark observation vision pushed since the last tick,
+            # so a burst of frames between two ticks is not lost.
+            self.lm_counts = self.bkb.write_counts(self.Mem, 'LANDMARKS')
+            observations = self.bkb.drain(self.Mem, 'LANDMARKS')
+            written = self.LandmarkKeys()
+            if not observations:
+                # Vision processes which only write the keys still feed the filter
+                observations = written
+            points = self.bkb.drain(self.Mem, 'FIELD_POINTS') if self.args.field else []
+
+            # Only new observations update the particles, otherwise the odometry just moves them
+            z = None
+            if observations or points:
+                measures.Push(observations)
+                # Mounts the vector to be sent
+                z = measures.Mean(monotonic()) + (degrees(self.bkb.read_float(self.Mem, 'IMU_EULER_Z')),)
+                if points:
+                    # The points of the field lines and goalposts follow the IMU angle
+                    z += ([point[1:] for point in points],)
+
             # Performs Particle Filter's Update
             pos, std = PF.main(u,z)
 
+            # The heaviest cluster of particles is the pose, their mean may fall between two of them
+            if getattr(PF, 'tracking', False):
+                hypotheses = [(1.0, pos, PF.kalman.covariance)] # The Kalman filter holds a single one
+            else:
+                hypotheses = Hypotheses(*ParticleArrays(PF), k=self.args.hypotheses)
+            if hypotheses:
+                best = hypotheses[0]
+            elif best is None:
+                best = (0.0, pos, np.zeros((3, 3))) # Nothing to cluster yet, the mean of the filter
+            weight, pos, covariance = best
+
             if std > 1: # Se o erro for muito alto ele acha landmarks
                 self.bkb.write_int(self.Mem, 'DECISION_LOCALIZATION', 1)
             elif std < 1: # Se for pequeno o bastante ele acha a bola
@@ -159,23 +182,41 @@ class Localization():
                 print '\x1b[32m[x:\x1b[34m{} cm'.format(int(pos[0])), #  Prints the x position
                 print '\x1b[32m| y:\x1b[34m{} cm'.format(int(pos[1])), # Prints the y position
                 print u'\x1b[32m| \u03B8:\x1b[34m{}\u00B0'.format(int(pos[2])), # Prints the theta
-                print u'\x1b[32m| \u03C3:\x1b[34m{} cm\x1b[32m]'.format(int(std)) # Prints the standard deviation
+                print u'\x1b[32m| \u03C3:\x1b[34m{} cm'.format(int(std)), # Prints the standard deviation
+                print '\x1b[32m| hypotheses:\x1b[34m{} ({:.0%})\x1b[32m]'.format(len(hypotheses), weight) # Prints the share of the best
 
             # Wirte the robot's position on Black Board to be read by telemetry
             self.bkb.write_int(self.Mem, 'LOCALIZATION_X', int(pos[0]))
             self.bkb.write_int(self.Mem, 'LOCALIZATION_Y', int(pos[1]))
             self.bkb.write_int(self.Mem, 'LOCALIZATION_THETA', int(pos[2]))
+            self.bkb.write_int(self.Mem, 'LOCALIZATION_PARTICLES', PF.qtd) # Kept by KLD-sampling, also while tracking
             self.bkb.write_float(self.Mem, 'LOCALIZATION_RBT01_X', std)
+            # Publishes the whole pose at once, so readers never see it half written
+            self.bkb.write_record(self.Mem, 'LOCALIZATION_POSE', (pos[0], pos[1], pos[2], std))
+            self.bkb.write_record(self.Mem, 'LOCALIZATION_HYPOTHESIS', (pos[0], pos[1], pos[2], weight,
+                                  sqrt(covariance[0, 0] + covariance[1, 1]), len(hypotheses)))
 
-            if self.args.graphs:
+            if self.args.graphs and not simul.skip_frame():
                 # Redraws the screen background
                 field.draw_soccer_field()
 
-                # Draws all particles on screen
-                simul.display_update(PF.particles)
+                # Draws all particles on screen, straight from the arrays of the NumPy engines
+                simul.display_update(PF)
+
+            # Sleeps until vision pushes a landmark, predicting at least every 0.1 s. The C++
+            # processes do not wake it, their keys are read on the next tick.
+            self.bkb.wait_for_change(self.Mem, 'LANDMARKS', 0.1, self.lm_counts)
 
-            # Updates for the next clock
-            screen.clock.tick(60)
+    #----------------------------------------------------------------------------------------------
+    #   Landmarks written on the VISION_*_LANDMARK_DEG keys since the last tick, as an observation
+    #   of the stream. The keys are cleared so each bearing is used once.
+    #----------------------------------------------------------------------------------------------
+    def LandmarkKeys(self):
+        landmarks = self.bkb.read_many(self.Mem, 'VISION_LANDMARK_DEG')
+        if all(lm == -999 for lm in landmarks):
+            return []
+        self.bkb.write_many(self.Mem, 'VISION_LANDMARK_DEG', (-999, -999, -999, -999))
+        return [(monotonic(),) + tuple(landmarks)]
 
     #----------------------------------------------------------------------------------------------
     #   This method returns a command instruction to the particles.
@@ -222,19 +263,43 @@ class Localization():
         self.timestamp = auxtime
         return timer
 
-def mean(vec):
-    s = 0
-    n = 0
-    m = 0
-    for x in vec:
-        if x != -999:
-            n += 1
-            s += x*n
-            m += n
-    if n == 0:
-        return -999
-    else:
-        return s/m
+#--------------------------------------------------------------------------------------------------
+#   Ring buffer of the landmark measures of the last seconds
+#--------------------------------------------------------------------------------------------------
+
+class MeasureWindow():
+    #----------------------------------------------------------------------------------------------
+    #   Constructor, room for size observations, the ones older than window seconds are ignored.
+    #   With a window of 0 only the latest observation is used, as the landmark keys held it
+    #----------------------------------------------------------------------------------------------
+    def __init__(self, size=64, window=0):
+        self.measures = np.full((size, 4), -999.0) # Angles of the four landmarks, -999 if not seen
+        self.stamps = np.full(size, -np.inf) # Monotonic time of each observation
+        self.size = size
+        self.window = window
+        self.head = 0 # Position of the next observation
+
+    #----------------------------------------------------------------------------------------------
+    #   Stores the observations drained from the blackboard, overwriting the oldest ones
+    #----------------------------------------------------------------------------------------------
+    def Push(self, observations):
+        for observation in observations:
+            self.stamps[self.head] = observation[0]
+            self.measures[self.head] = observation[1:5]
+            self.head = (self.head + 1) % self.size
+
+    #----------------------------------------------------------------------------------------------
+    #   Mean angle of each landmark within the window, the n-th measure of a landmark weighs n
+    #----------------------------------------------------------------------------------------------
+    def Mean(self, now):
+        if self.window <= 0:
+            return tuple(float(angle) for angle in self.measures[(self.head - 1) % self.size])
+        order = np.roll(np.arange(self.size), -self.head) # From the oldest to the newest
+        seen = (self.measures[order] != -999) & (self.stamps[order] > now - self.window)[:, None]
+        rank = np.cumsum(seen, axis=0) * seen
+        total = rank.sum(axis=0)
+        s = (self.measures[order] * rank).sum(axis=0)
+        return tuple(float(s[i]) / total[i] if total[i] > 0 else -999 for i in range(4))
 
 #Call the main function, start up the simulation
 if __name__ == "__main__":
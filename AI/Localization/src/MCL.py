@@ -15,12 +15,13 @@ class MonteCarlo():
     #----------------------------------------------------------------------------------------------
     #   Constructor of the particle filter
     #----------------------------------------------------------------------------------------------
-    def __init__(self, max_qtd=0):
+    def __init__(self, max_qtd=0, min_qtd=None):
         # Holds the particles objects
         self.particles = []
 
         # Limits the quantity of particles the filter will have
         self.max_qtd = max_qtd
+        self.min_qtd = min_qtd # With a lower bound, KLD-sampling adapts the quantity in between
 
         # Initializes with the max quantity of particles
         self.qtd = max_qtd
@@ -30,6 +31,7 @@ class MonteCarlo():
             self.particles.append(Particle())
 
         self.totalweight = 0 # Holds the total sum of particles' weights.
+        self.ess_threshold = ESS_THRESHOLD # Fraction of effective particles below which it resamples
 
         self.mean = [450, 300, 0] # Holds the mean position of the estimated position.
         self.std = 1
@@ -52,52 +54,35 @@ class MonteCarlo():
 
         if z != None:
             for particle in self.particles:
-                self.totalweight += particle.Sensor(z)
+                self.totalweight += particle.Sensor(z, particle.weight)
     
     #----------------------------------------------------------------------------------------------
     #   Resample step
     #----------------------------------------------------------------------------------------------
     def Resample(self, qtd):
-        parts = [] # Starts a empty list.
-
-        step = self.totalweight / qtd # Computes the step size
-        s = step/2 # the first step is given by half the total.
-
-        m_x = 0 # Sum of x
-        m_y = 0 # Sum of y
-        m_s = 0 # Sum of sin of rotation
-        m_c = 0 # Sum of cos of rotation
-
-        for p in self.particles: # For each particle,
-            while s < p.weight: # while the particles weight is grater than the step,
-                s += step # rises the step size,
-                parts.append(Particle(p.x, p.y, p.rotation)) # adds the particle to the list.
-                # Do the summing process for the mean computation
-                m_x += p.x 
-                m_y += p.y 
-                m_s += sin(radians(p.rotation))
-                m_c += cos(radians(p.rotation))
-            s -= p.weight # Removes the used steps.
-
-        self.particles = parts # Overwrites the previous particles.
-        self.qtd = len(self.particles) # Saves the quantity of particles.
-
-        # Computes the mean dividing the sum for the quantity
-        self.mean[0] = m_x / self.qtd
-        self.mean[1] = m_y / self.qtd
-        # computes mean rotation by finding the arctan of the sum of sins over cossins
-        self.mean[2] = degrees(atan2(m_s,m_c))
-
-        sum_std = 0
-        for p in self.particles:
-            sum_std += (p.x - self.mean[0])**2 + (p.y - self.mean[1])**2
-        self.std = sqrt(sum_std / self.qtd)
+        # While the weights are healthy the particles are kept with their weights
+        if not self.totalweight > 0 or EffectiveSampleSize(self.particles) > self.ess_threshold * len(self.particles):
+            NormalizeWeights(self.particles, self.totalweight)
+        else:
+            # Copies the chosen particles over the old ones
+            indices = LowVarianceIndices([p.weight for p in self.particles], self.totalweight, qtd)
+            if self.min_qtd:
+                indices = KLDIndices(self.particles, indices, self.min_qtd, qtd)
+            ResampleInPlace(self.particles, indices)
+            self.qtd = len(self.particles) # Saves the quantity of particles.
+
+        # Computes the mean and standard deviation of the particles
+        self.mean, self.std = WeightedMean(self.particles)
 
     #----------------------------------------------------------------------------------------------
     #   Main algorithm
     #----------------------------------------------------------------------------------------------
     def main(self, u=None, z=None):
         self.Prediction(u)
-        self.Update(z)
-        self.Resample(self.max_qtd)
+        # Without new measures only the odometry moves the particles, their weights are kept
+        if z != None:
+            self.Update(z)
+            self.Resample(self.max_qtd)
+        else:
+            self.mean, self.std = WeightedMean(self.particles)
         return self.mean, self.std
\ No newline at end of file
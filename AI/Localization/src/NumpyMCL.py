@@ -0,0 +1,336 @@
+__author__ = "RoboFEI-HT"
+__authors__ = "Aislan C. Almeida"
+__license__ = "GNU General Public License v3.0"
+
+from math import *
+from collections import namedtuple
+import numpy as np
+from SensorTable import *
+from particle import ESS_THRESHOLD, KLD_BIN, KLDSize
+
+#--------------------------------------------------------------------------------------------------
+#   This module implements the Monte Carlo's Particle Filter on NumPy arrays
+#   - Same models as particle.py, but every particle is a column of contiguous arrays, so the
+#     prediction, the likelihood and the resampling run as whole-array operations.
+#   - mode chooses the algorithm: 'mcl' (MCL.py), 'amcl' (AMCL.py) or 'srmcl' (SRMCL.py).
+#--------------------------------------------------------------------------------------------------
+
+# Field limits used when creating random particles: x, y and rotation
+REGIONS = ((0, 900), (0, 600), (-180, 180))
+
+# Landmarks positions, in sequence blue, red, yellow, purple
+LANDMARKS = np.array([(0, 0), (900, 0), (0, 600), (900, 600)], dtype=np.float64)
+
+# Mean and standard deviation of the 16 motion error coefficients of a particle (see particle.py)
+COEFFICIENTS = np.array([(0.0007, 0.0002), (0.0007, 0.0002), (7, 2), (7, 2),
+                         (0.0007, 0.0002), (0.0007, 0.0002), (7, 2), (7, 2),
+                         (0.000007, 0.000002), (0.000007, 0.000002), (0.07, 0.02), (0.07, 0.02),
+                         (0.000007, 0.000002), (0.000007, 0.000002), (0.07, 0.02), (0.07, 0.02)])
+
+# Read-only view of one particle, used by the viewer
+ParticleState = namedtuple('ParticleState', ('x', 'y', 'rotation', 'weight'))
+
+#--------------------------------------------------------------------------------------------------
+#   Draws the motion error coefficients of n particles, one row per coefficient
+#--------------------------------------------------------------------------------------------------
+def RandomCoefficients(n):
+    return COEFFICIENTS[:, 0:1] + COEFFICIENTS[:, 1:2] * np.random.standard_normal((16, n))
+
+#--------------------------------------------------------------------------------------------------
+#   Computes the likelihood between arrays of angles in degrees, as ComputeAngLikelihoodDeg
+#--------------------------------------------------------------------------------------------------
+def AngLikelihoodDeg(ang, base, std_deviation):
+    return CosLikelihood(np.cos(np.radians(ang - base)), std_deviation)
+
+#--------------------------------------------------------------------------------------------------
+#   Arc motion of Particle.Motion on arrays of particles, changing them in place
+#--------------------------------------------------------------------------------------------------
+def Predict(x, y, rotation, a, u):
+    straight, drift, rotational, moving, dt = u
+    n = len(x)
+
+    rtt = radians(rotational) # converts rotational from degrees to radians
+    terms = np.array([straight**2, drift**2, rtt**2, moving], dtype=np.float64)
+
+    # Gaussian errors of forward, drift and rotational speeds, and of the final rotation
+    noise = np.random.standard_normal((4, n))
+    F = straight + noise[0] * terms.dot(a[0:4])
+    D = drift + noise[1] * terms.dot(a[4:8])
+    W = rtt + noise[2] * terms.dot(a[8:12])
+    g = noise[3] * terms.dot(a[12:16])
+
+    theta = np.radians(rotation) # converts particles' rotation to radians.
+
+    # Straight motion where the angle is smaller than 1 degree, arcs elsewhere
+    straightline = np.abs(W) < radians(1)
+    Ws = np.where(straightline, 1.0, W)
+    arc = theta + W * dt
+    back = -theta + W * dt
+    x += np.where(straightline,
+                  (D * np.sin(theta) + F * np.cos(theta)) * dt,
+                  (-F * np.sin(theta) + F * np.sin(arc) - D * np.cos(-theta) + D * np.cos(back)) / Ws)
+    y += np.where(straightline,
+                  (D * np.cos(theta) - F * np.sin(theta)) * dt,
+                  (-F * np.cos(theta) + F * np.cos(arc) - D * np.sin(-theta) + D * np.sin(back)) / Ws)
+
+    # Final particles rotation
+    rotation[...] = np.degrees(arc + g * dt)
+
+#--------------------------------------------------------------------------------------------------
+#   Class implementing the particle filter over arrays
+#--------------------------------------------------------------------------------------------------
+
+class MonteCarlo():
+    #----------------------------------------------------------------------------------------------
+    #   Constructor of the particle filter
+    #----------------------------------------------------------------------------------------------
+    def __init__(self, max_qtd=0, mode='mcl', errstd=None, min_qtd=None, table=False, field=False):
+        if mode not in ('mcl', 'amcl', 'srmcl'):
+            raise ValueError('unknown particle filter mode %r' % mode)
+        self.mode = mode
+
+        # Limits the quantity of particles the filter will have
+        self.max_qtd = max_qtd
+        self.min_qtd = min_qtd # With a lower bound, KLD-sampling adapts the quantity in between
+        self.qtd = max_qtd
+
+        # Standard deviation used for computing angles likelihoods, in degrees (landmarks, IMU).
+        if errstd == None:
+            self.errstd = [5, 30]
+        else:
+            self.errstd = errstd
+
+        # Bearings of the landmarks over the field, loaded from the cache when there is one. The
+        # lookup pays off where atan2 and cos are slow, elsewhere they are computed for each particle.
+        self.table = BearingTable(LANDMARKS) if table else None
+
+        # Likelihood of the points of the field lines and goalposts, which come after the IMU angle
+        self.field = LikelihoodField() if field else None
+
+        # Poses drawn from the measures, which replace particles on the SRMCL
+        self.resetting = SensorResetting(LANDMARKS, self.errstd) if mode == 'srmcl' else None
+        self.z = None # Measures of the last update
+
+        # Particles' state, one position of each array per particle
+        self.x, self.y, self.rotation, self.a = self.RandomParticles(self.qtd)
+        self.weight = np.ones(self.qtd)
+        self.spare = None # Arrays the next resampling copies the particles into
+
+        self.totalweight = 0 # Holds the total sum of particles' weights.
+        self.ess_threshold = ESS_THRESHOLD # Fraction of effective particles below which it resamples
+
+        # Coefficients used by the AMCL and the SRMCL to determine if new particles are needed.
+        self.wslow = 0
+        self.wfast = 0
+        self.aslow = 0.1 # 0 < aslow << afast
+        self.afast = 1
+
+        self.mean = [450, 300, 0] # Holds the mean position of the estimated position.
+        self.std = 1
+
+    #----------------------------------------------------------------------------------------------
+    #   Particles as objects with x, y, rotation and weight, for drawing
+    #----------------------------------------------------------------------------------------------
+    @property
+    def particles(self):
+        return [ParticleState(*p) for p in zip(self.x, self.y, self.rotation, self.weight)]
+
+    #----------------------------------------------------------------------------------------------
+    #   Creates n random particles on the field
+    #----------------------------------------------------------------------------------------------
+    def RandomParticles(self, n):
+        x = np.random.randint(REGIONS[0][0], REGIONS[0][1] + 1, n).astype(np.float64)
+        y = np.random.randint(REGIONS[1][0], REGIONS[1][1] + 1, n).astype(np.float64)
+        rotation = np.random.randint(REGIONS[2][0], REGIONS[2][1] + 1, n).astype(np.float64)
+        return x, y, rotation, RandomCoefficients(n)
+
+    #----------------------------------------------------------------------------------------------
+    #   Prediction step, the arc motion of Particle.Motion on every particle
+    #----------------------------------------------------------------------------------------------
+    def Prediction(self, u=None):
+        # If there was movement, run the predction step
+        if u != None:
+            Predict(self.x, self.y, self.rotation, self.a, u)
+
+    #----------------------------------------------------------------------------------------------
+    #   Update step, the likelihood of Particle.Sensor on every particle
+    #----------------------------------------------------------------------------------------------
+    def Update(self, z=None):
+        # If there was any measure, run the update step
+        self.totalweight = 0
+        self.z = z
+
+        if z != None:
+            # The weights kept from the previous iteration are multiplied by the likelihood
+            self.Likelihood(self.x, self.y, self.rotation, z, self.weight)
+            self.totalweight = self.weight.sum()
+
+    def Likelihood(self, x, y, rotation, z, weight=None):
+        if weight is None:
+            weight = np.ones(len(x))
+        if self.field is not None and len(z) > 5 and len(z[5]):
+            # Points of the field lines and goalposts seen, read from the likelihood field
+            weight *= self.field.Likelihood(x, y, rotation, z[5])
+        if self.table is not None:
+            return self.TableLikelihood(x, y, rotation, z, weight)
+        for i in range(4):
+            if z[i] != -999:
+                # Angle the particle should be perceiving the landmark
+                M = -np.degrees(np.arctan2(LANDMARKS[i][1] - y, LANDMARKS[i][0] - x)) - rotation
+                weight *= AngLikelihoodDeg(z[i], M, self.errstd[0])
+        # Computes the likelihood given the IMU angle
+        weight *= AngLikelihoodDeg(z[4], rotation, self.errstd[1])
+        return weight
+
+    #----------------------------------------------------------------------------------------------
+    #   Same likelihood, reading the bearings of the landmarks from the precomputed table
+    #----------------------------------------------------------------------------------------------
+    def TableLikelihood(self, x, y, rotation, z, weight):
+        theta = np.radians(rotation)
+        cr = np.cos(theta)
+        sr = np.sin(theta)
+
+        # The landmark should be seen at its bearing minus the rotation, so the difference to the
+        # measure is z + rotation - bearing, whose cos comes from the table and the sums of angles.
+        cells = None
+        for i in range(4):
+            if z[i] != -999:
+                if cells is None:
+                    cells = self.table.Cells(x, y)
+                cb, sb = self.table.Lookup(i, cells)
+                cz = cos(radians(z[i]))
+                sz = sin(radians(z[i]))
+                weight *= CosLikelihood((cz * cr - sz * sr) * cb + (sz * cr + cz * sr) * sb, self.errstd[0])
+        # Computes the likelihood given the IMU angle
+        cz = cos(radians(z[4]))
+        sz = sin(radians(z[4]))
+        weight *= CosLikelihood(cz * cr + sz * sr, self.errstd[1])
+        return weight
+
+    #----------------------------------------------------------------------------------------------
+    #   Effective sample size, how many particles are really holding the estimate
+    #----------------------------------------------------------------------------------------------
+    def EffectiveSampleSize(self):
+        square = self.weight.dot(self.weight)
+        if square == 0:
+            return 0
+        return self.totalweight**2 / square
+
+    #----------------------------------------------------------------------------------------------
+    #   Resample step, low variance sampling of qtd particles
+    #----------------------------------------------------------------------------------------------
+    def Resample(self, qtd):
+        chance = 0
+        if self.mode != 'mcl':
+            # Coefficients adjusments
+            average = self.totalweight / len(self.x)
+            self.wslow += self.aslow * (average - self.wslow)
+            self.wfast += self.afast * (average - self.wfast)
+            # Chance of replacing a selected particle, given by how much the likelihood fell
+            chance = max(0, 1.0 - self.wfast / self.wslow) if self.wslow > 0 else 0
+
+        # While the weights are healthy and no particle is to be replaced they are kept as they are
+        healthy = self.EffectiveSampleSize() > self.ess_threshold * len(self.x)
+        if not self.totalweight > 0 or (healthy and chance == 0):
+            if self.totalweight > 0:
+                self.weight *= len(self.x) / self.totalweight # Mean weight of 1, they do not underflow
+            else:
+                self.weight.fill(1)
+            self.ComputeMean(self.x, self.y, self.rotation, self.weight)
+            return
+
+        step = self.totalweight / qtd # Computes the step size
+        # The first step is given by half the step, the particle holding it is selected.
+        positions = step / 2 + step * np.arange(qtd)
+        index = np.searchsorted(np.cumsum(self.weight), positions, side='right')
+        np.minimum(index, len(self.x) - 1, out=index)
+        if self.min_qtd:
+            index = self.KLDIndices(index, self.min_qtd, qtd)
+        self.Gather(index)
+
+        new = np.random.random_sample(len(index)) < chance if chance > 0 else None
+        poses = None
+        if new is not None and new.any():
+            if self.mode == 'srmcl':
+                # Sensor resetting, the poses come from the measures and keep their motion errors
+                poses = self.resetting.Poses(self.z, int(new.sum())) if self.z != None else None
+            else:
+                # The AMCL replaces them by random ones
+                poses = self.RandomParticles(int(new.sum()))
+
+        if poses is not None:
+            kept = ~new
+            self.ComputeMean(self.x[kept], self.y[kept], self.rotation[kept])
+            self.Replace(new, poses)
+        else:
+            self.ComputeMean(self.x, self.y, self.rotation)
+
+    #----------------------------------------------------------------------------------------------
+    #   Replaces the particles selected by new with the reset poses
+    #----------------------------------------------------------------------------------------------
+    def Replace(self, new, poses):
+        self.x[new], self.y[new], self.rotation[new] = poses[:3]
+        if len(poses) > 3:
+            self.a[:, new] = poses[3]
+
+    #----------------------------------------------------------------------------------------------
+    #   Thins the indices drawn for max_qtd particles to the KLD-sampling quantity, within the bounds
+    #----------------------------------------------------------------------------------------------
+    def KLDIndices(self, index, min_qtd, max_qtd):
+        # Bins of the field holding any of the chosen ancestors
+        ancestors = np.unique(index)
+        bins = np.stack((np.floor_divide(self.x[ancestors], KLD_BIN[0]),
+                         np.floor_divide(self.y[ancestors], KLD_BIN[1]),
+                         np.floor_divide(np.mod(self.rotation[ancestors], 360), KLD_BIN[2])), axis=1)
+        k = len(np.unique(bins.view([('', bins.dtype)] * 3)))
+        # The set shrinks at most to half on each resampling, so one sharp measure does not deplete it
+        qtd = max(min_qtd, len(self.x) // 2, min(max_qtd, KLDSize(k)))
+        qtd = min(qtd, len(index))
+
+        # Keeps evenly spaced samples, which is the low variance sampling of qtd particles
+        return index[((np.arange(qtd) + 0.5) * len(index) / qtd).astype(int)]
+
+    #----------------------------------------------------------------------------------------------
+    #   Copies the particles at index, the motion coefficients included, into the spare arrays
+    #----------------------------------------------------------------------------------------------
+    def Gather(self, index):
+        n = len(index)
+        if self.spare is None or len(self.spare[0]) != n:
+            self.spare = (np.empty(n), np.empty(n), np.empty(n), np.empty((16, n)), np.empty(n))
+        x, y, rotation, a, weight = self.spare
+        np.take(self.x, index, out=x)
+        np.take(self.y, index, out=y)
+        np.take(self.rotation, index, out=rotation)
+        np.take(self.a, index, axis=1, out=a)
+        weight.fill(1)
+
+        # The old arrays become the spare ones of the next resampling
+        self.spare = (self.x, self.y, self.rotation, self.a, self.weight)
+        self.x, self.y, self.rotation, self.a, self.weight = x, y, rotation, a, weight
+        self.qtd = n # Saves the quantity of particles.
+
+    #----------------------------------------------------------------------------------------------
+    #   Mean and standard deviation of the estimated position
+    #----------------------------------------------------------------------------------------------
+    def ComputeMean(self, x, y, rotation, weight=None):
+        if len(x) == 0:
+            return
+        self.mean[0] = np.average(x, weights=weight)
+        self.mean[1] = np.average(y, weights=weight)
+        # computes mean rotation by finding the arctan of the sum of sins over cossins
+        theta = np.radians(rotation)
+        self.mean[2] = degrees(atan2(np.average(np.sin(theta), weights=weight), np.average(np.cos(theta), weights=weight)))
+        self.std = sqrt(np.average((x - self.mean[0])**2 + (y - self.mean[1])**2, weights=weight))
+
+    #----------------------------------------------------------------------------------------------
+    #   Main algorithm
+    #----------------------------------------------------------------------------------------------
+    def main(self, u=None, z=None):
+        self.Prediction(u)
+        # Without new measures only the odometry moves the particles, their weights are kept
+        if z != None:
+            self.Update(z)
+            self.Resample(self.max_qtd)
+        else:
+            self.ComputeMean(self.x, self.y, self.rotation, self.weight)
+        return self.mean, self.std
@@ -5,6 +5,7 @@ __license__ = "GNU General Public License v3.0"
 from math import *
 import random as rnd
 from particle import *
+from SensorTable import SensorResetting
 
 #--------------------------------------------------------------------------------------------------
 #   This class implements the Monte Carlo's Particle Filter
@@ -15,19 +16,20 @@ class MonteCarlo():
     #----------------------------------------------------------------------------------------------
     #   Constructor of the particle filter
     #----------------------------------------------------------------------------------------------
-    def __init__(self, max_qtd=0, errstd=None):
+    def __init__(self, max_qtd=0, errstd=None, min_qtd=None):
         # Holds the particles objects
         self.particles = []
 
         # Limits the quantity of particles the filter will have
         self.max_qtd = max_qtd
+        self.min_qtd = min_qtd # With a lower bound, KLD-sampling adapts the quantity in between
         self.qtd = max_qtd
 
         # Standard deviation used for computing angles likelihoods, in degrees.
         if errstd == None:
             self.errstd = [5, 30]
         else:
-            self.errstd == errstd
+            self.errstd = errstd
 
         for i in range(self.qtd):
             # Randomly generates n particles
@@ -35,59 +37,29 @@ class MonteCarlo():
 
         self.totalweight = 0 # Holds the total sum of particles' weights.
         self.maxweight = 0 # Holds the weight of the best particle.
+        self.ess_threshold = ESS_THRESHOLD # Fraction of effective particles below which it resamples
+
+        # Grid which draws poses from the measures
+        self.resetting = SensorResetting(LANDMARKS, self.errstd)
+
+        # Coefficients used to determine how many particles are replaced by the sensor resetting.
+        self.wslow = 0
+        self.wfast = 0
+        self.aslow = 0.1 # 0 < aslow << afast
+        self.afast = 1
 
         self.mean = [450, 300, 0] # Holds the mean position of the estimated position.
         self.std = 10
 
     #----------------------------------------------------------------------------------------------
-    #   Method that returns a probable position for the robot given its sensoring
+    #   Method that returns n probable poses for the robot given its sensoring
     #----------------------------------------------------------------------------------------------
-    def SensorReseting(self, z=None):
-        x = [0, 100, 200, 300, 400, 500, 600, 700, 800, 900] # Grid in X position
-        y = [0, 100, 200, 300, 400, 500, 600] # Grid in Y position
-        k = [(0, 0), (900, 0), (0, 600), (900, 600)] # Coefficients of distance for blue, red, yellow and purple
-        n = None # Landmark index
-
-        # Return the index of the first seen landmark
-        for m in range(4):
-            if z[m] != -999:
-                n = m
-                break
-
-        if n == None:
+    def SensorReseting(self, z=None, n=0):
+        # Poses drawn from the measures over the grid of the field, None if no landmark was seen
+        poses = self.resetting.Poses(z, n)
+        if poses is None:
             return []
-
-        P = [] # Points in the grid
-        sumW = 0
-
-        # For each point in the grid
-        for i in x:
-            for j in y: 
-                # Computes the possible angle for the angle
-                ang = degrees(atan2(j-k[n][1], k[n][0]-i) - radians(z[n]))
-                # Create a particle on the point with the computed angle
-                aux = Particle(i,j,ang)
-                # Computes the weight given the sensors
-                weight = aux.Sensor(z)
-                # Appends the particle to the grid list
-                P.append(aux)
-                # Update with the best particle's weight
-                sumW += weight
-
-        ret = [] # Returning with possibilities
-        
-
-        # For each particle on the grid
-        for part in P:
-            # chooses those with the best weight
-            if part.weight > sumW/(1+len(P)):
-                ret.append(part)
-
-        # Sort the particles by the weight
-        ret.sort(key=lambda aux: aux.weight, reverse=True)
-        # print len(ret), z
-        # print threshold, '\n'
-        return ret
+        return zip(*[p.tolist() for p in poses])
 
     #----------------------------------------------------------------------------------------------
     #   Prediction step
@@ -108,67 +80,50 @@ class MonteCarlo():
 
         if z != None:
             for particle in self.particles:
-                self.totalweight += particle.Sensor(z)
+                self.totalweight += particle.Sensor(z, particle.weight)
                 self.maxweight = max(self.maxweight, particle.weight)
     
     #----------------------------------------------------------------------------------------------
     #   Resample step
     #----------------------------------------------------------------------------------------------
     def Resample(self, qtd, z):
-        parts = [] # Starts a empty list.
-
-        step = self.totalweight / qtd # Computes the step size
-        s = step/2 # the first step is given by half the total.
-
-        m_x = 0 # Sum of x
-        m_y = 0 # Sum of y
-        m_s = 0 # Sum of sin of rotation
-        m_c = 0 # Sum of cos of rotation
-
-        for p in self.particles: # For each particle,
-            while s < p.weight: # while the particles weight is grater than the step,
-                s += step # rises the step size,
-                parts.append(Particle(p.x, p.y, p.rotation)) # adds the particle to the list.
-                # Do the summing process for the mean computation
-                m_x += p.x 
-                m_y += p.y 
-                m_s += sin(radians(p.rotation))
-                m_c += cos(radians(p.rotation))
-            s -= p.weight # Removes the used steps.
-
-        self.particles = parts # Overwrites the previous particles.
-        self.qtd = len(self.particles) # Saves the quantity of particles.
-
-        # Computes the mean dividing the sum for the quantity
-        self.mean[0] = m_x / self.qtd
-        self.mean[1] = m_y / self.qtd
-        # computes mean rotation by finding the arctan of the sum of sins over cossins
-        self.mean[2] = degrees(atan2(m_s,m_c))
-
-        sum_std = 0
-        for p in self.particles:
-            sum_std += (p.x - self.mean[0])**2 + (p.y - self.mean[1])**2
-        self.std = sqrt(sum_std / self.qtd)
-
-        P = Particle(*self.mean)
-        print P.Sensor(z), '\t', self.std
+        # Coefficients adjusments
+        self.wslow += self.aslow * (self.totalweight/len(self.particles) - self.wslow)
+        self.wfast += self.afast * (self.totalweight/len(self.particles) - self.wfast)
+
+        # Share of the particles replaced by poses taken from the measures
+        chance = max(0, 1.0-self.wfast/self.wslow) if self.wslow > 0 else 0
+
+        # While the weights are healthy and no particle is to be replaced they are kept as they are
+        if not self.totalweight > 0 or (chance == 0 and EffectiveSampleSize(self.particles) > self.ess_threshold * len(self.particles)):
+            NormalizeWeights(self.particles, self.totalweight)
+            self.mean, self.std = WeightedMean(self.particles)
+        else:
+            # Copies the chosen particles over the old ones
+            indices = LowVarianceIndices([p.weight for p in self.particles], self.totalweight, qtd)
+            if self.min_qtd:
+                indices = KLDIndices(self.particles, indices, self.min_qtd, qtd)
+            ResampleInPlace(self.particles, indices)
+            self.qtd = len(self.particles) # Saves the quantity of particles.
+
+            # Computes the mean and standard deviation of the particles
+            self.mean, self.std = WeightedMean(self.particles)
+
+            # Moves the replaced particles to the poses, they keep their motion errors
+            replaced = [p for p in self.particles if chance > rnd.random()]
+            for p, pose in zip(replaced, self.SensorReseting(z, len(replaced))):
+                p.x, p.y, p.rotation = pose
 
     #----------------------------------------------------------------------------------------------
     #   Main algorithm
     #----------------------------------------------------------------------------------------------
     def main(self, u=None, z=None):
-        
-        SRset = self.SensorReseting(z)
-        for i in range(int(self.qtd/10)):
-            # if SRset == []:
-            if True:
-                self.particles.append(Particle())
-            else:
-                aux = SRset[i % len(SRset)]
-                self.particles.append(Particle(normals=[[aux.x,20],[aux.y,20],[aux.rotation,5]]))
-
         self.Prediction(u)
-        self.Update(z)
-        self.Resample(self.qtd, z)
+        # Without new measures only the odometry moves the particles, their weights are kept
+        if z != None:
+            self.Update(z)
+            self.Resample(self.max_qtd, z)
+        else:
+            self.mean, self.std = WeightedMean(self.particles)
 
-        return self.mean, self.std
\ No newline at end of file
+        return self.mean, self.std
@@ -0,0 +1,316 @@
+__author__ = "RoboFEI-HT"
+__authors__ = "Aislan C. Almeida"
+__license__ = "GNU General Public License v3.0"
+
+from math import *
+import os
+import hashlib
+import numpy as np
+from particle import AngConstants
+
+#--------------------------------------------------------------------------------------------------
+#   This module holds the precomputed bearings of the landmarks over the field
+#   - For every point of a grid the table keeps the cos and sin of the angle at which each landmark
+#     is seen, so the sensor model reads them back instead of calling atan2 for every particle.
+#   - The table is built once and saved to the user's cache folder, later runs just load it.
+#   - SensorResetting draws poses from the measures over a coarse table, for the sensor resetting.
+#   - LikelihoodField keeps, for every point of the grid, how likely a field line or a goalpost is
+#     seen there, from the distance to the closest one.
+#--------------------------------------------------------------------------------------------------
+
+CELL = 5 # Size of the grid cells, in cm
+BOUNDS = ((-100, 1000), (-100, 700)) # Region covered in x and y, the field and a margin around it
+# Folder of the saved tables, out of the source tree: $LOCALIZATION_CACHE or the user's cache
+CACHE = os.environ.get('LOCALIZATION_CACHE') or os.path.join(
+    os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'), 'robofei-localization')
+
+# Lines of Simulator/world.SoccerField without its 70 pixels of margin, in cm: the segments, the
+# center circle (center, radius) and the goalposts (centers, radius)
+FIELD_LINES = (((0, 0), (900, 0)), ((900, 0), (900, 600)), ((900, 600), (0, 600)), ((0, 600), (0, 0)),
+               ((450, 0), (450, 600)),
+               ((0, 127), (60, 127)), ((60, 127), (60, 472)), ((60, 472), (0, 472)),
+               ((900, 127), (840, 127)), ((840, 127), (840, 472)), ((840, 472), (900, 472)),
+               ((175, 300), (185, 300)), ((180, 295), (180, 305)),
+               ((445, 300), (455, 300)), ((450, 295), (450, 305)),
+               ((705, 300), (715, 300)), ((710, 295), (710, 305)))
+FIELD_CIRCLES = (((450, 300), 75),)
+GOALPOSTS = ((0, 210), (0, 390), (900, 210), (900, 390))
+GOALPOST_RADIUS = 10
+
+# Kinds of the points of the field seen by vision
+LINE = 0
+GOALPOST = 1
+
+#--------------------------------------------------------------------------------------------------
+#   Likelihood of angles given the cos of their difference to the expected ones, on arrays, with
+#   the constants of particle.ComputeAngLikelihoodDeg
+#--------------------------------------------------------------------------------------------------
+def CosLikelihood(cosdiff, std_deviation):
+    k, norm = AngConstants(std_deviation)
+    # Distance between the points of the unit circle at both angles (the chord)
+    d = np.sqrt(np.maximum(2 - 2 * cosdiff, 0))
+    return np.exp(-k * d) * norm
+
+#--------------------------------------------------------------------------------------------------
+#   Class implementing the table of bearings
+#--------------------------------------------------------------------------------------------------
+
+class BearingTable():
+    #----------------------------------------------------------------------------------------------
+    #   Constructor, loads the table from the cache or builds it
+    #----------------------------------------------------------------------------------------------
+    def __init__(self, landmarks, cell=CELL, bounds=BOUNDS, cache=CACHE):
+        self.landmarks = np.asarray(landmarks, dtype=np.float64)
+        self.Grid(cell, bounds)
+        self.shape = (len(self.landmarks), 2, self.ny * self.nx)
+        self.Open('bearings', (self.landmarks.tolist(), self.cell, bounds), cache)
+
+    #----------------------------------------------------------------------------------------------
+    #   Size of the cells and quantity of grid points in x and y
+    #----------------------------------------------------------------------------------------------
+    def Grid(self, cell, bounds):
+        self.cell = float(cell)
+        self.bounds = bounds
+        self.nx = int((bounds[0][1] - bounds[0][0]) / cell) + 1
+        self.ny = int((bounds[1][1] - bounds[1][0]) / cell) + 1
+
+    #----------------------------------------------------------------------------------------------
+    #   Loads the table from the cache or builds it, key holds anything the table depends on
+    #----------------------------------------------------------------------------------------------
+    def Open(self, name, key, cache):
+        # The name of the file changes with the key
+        self.path = None
+        if cache:
+            digest = hashlib.md5(repr(key).encode()).hexdigest()[:12]
+            self.path = os.path.join(cache, '%s-%s.npy' % (name, digest))
+
+        self.table = self.Load()
+        if self.table is None:
+            self.table = self.Build()
+            self.Save()
+
+    #----------------------------------------------------------------------------------------------
+    #   Computes the cos and sin of the bearing of every landmark on every grid point
+    #----------------------------------------------------------------------------------------------
+    def Build(self):
+        x = self.bounds[0][0] + self.cell * np.arange(self.nx)
+        y = self.bounds[1][0] + self.cell * np.arange(self.ny)
+        X, Y = np.meshgrid(x, y) # One row per y, one column per x
+
+        # Same angle of Particle.Sensor, before subtracting the particle's rotation. Each landmark
+        # has a flat array of cos and another of sin, the grid point (i, j) is the position j*nx + i.
+        table = np.empty((len(self.landmarks), 2, self.ny * self.nx))
+        for n, (lx, ly) in enumerate(self.landmarks):
+            bearing = -np.arctan2(ly - Y, lx - X).ravel()
+            table[n, 0] = np.cos(bearing)
+            table[n, 1] = np.sin(bearing)
+        return table
+
+    #----------------------------------------------------------------------------------------------
+    #   Reads the table saved by a previous run, None if there is none
+    #----------------------------------------------------------------------------------------------
+    def Load(self):
+        if self.path is None or not os.path.exists(self.path):
+            return None
+        try:
+            table = np.load(self.path)
+        except (IOError, ValueError):
+            return None
+        if table.shape != self.shape:
+            return None
+        return table
+
+    #----------------------------------------------------------------------------------------------
+    #   Saves the table for the next runs, a read-only folder just means rebuilding it each time
+    #----------------------------------------------------------------------------------------------
+    def Save(self):
+        if self.path is None:
+            return
+        try:
+            if not os.path.isdir(os.path.dirname(self.path)):
+                os.makedirs(os.path.dirname(self.path))
+            temporary = '%s.%d.tmp' % (self.path, os.getpid())
+            with open(temporary, 'wb') as output:
+                np.save(output, self.table)
+            os.rename(temporary, self.path) # Other processes never load a half written table
+        except (IOError, OSError):
+            pass
+
+    #----------------------------------------------------------------------------------------------
+    #   Corners of the grid cells holding the points (x, y) and their weights, once for all landmarks
+    #----------------------------------------------------------------------------------------------
+    def Cells(self, x, y):
+        # Position inside the grid, points out of the covered region take the bearings of its border
+        fx = np.clip((x - self.bounds[0][0]) / self.cell, 0, self.nx - 1)
+        fy = np.clip((y - self.bounds[1][0]) / self.cell, 0, self.ny - 1)
+        i = np.minimum(fx.astype(np.intp), self.nx - 2)
+        j = np.minimum(fy.astype(np.intp), self.ny - 2)
+        tx = fx - i
+        ty = fy - j
+
+        # Positions of the four corners in the flat arrays, and the weights of bilinear interpolation
+        corner = j * self.nx + i
+        corners = (corner, corner + 1, corner + self.nx, corner + self.nx + 1)
+        weights = ((1 - tx) * (1 - ty), tx * (1 - ty), (1 - tx) * ty, tx * ty)
+        return corners, weights
+
+    #----------------------------------------------------------------------------------------------
+    #   Bilinear interpolation of the cos and sin of the bearing of one landmark at the cells
+    #----------------------------------------------------------------------------------------------
+    def Lookup(self, landmark, cells):
+        corners, weights = cells
+        c, s = [sum(t[k] * w for k, w in zip(corners, weights)) for t in self.table[landmark]]
+
+        # Brings the interpolated vectors back to the unit circle
+        norm = np.maximum(np.sqrt(c * c + s * s), 1e-9)
+        c /= norm
+        s /= norm
+        return c, s
+
+#--------------------------------------------------------------------------------------------------
+#   Class drawing poses from the inverse observation model, used to reset the particles
+#--------------------------------------------------------------------------------------------------
+
+class SensorResetting():
+    #----------------------------------------------------------------------------------------------
+    #   Constructor, the bearings of every cell of a coarse grid over the field
+    #----------------------------------------------------------------------------------------------
+    def __init__(self, landmarks, errstd, cell=20, bounds=((0, 900), (0, 600)), cache=CACHE):
+        self.table = BearingTable(landmarks, cell, bounds, cache)
+        self.errstd = errstd
+        self.cell = self.table.cell
+
+        # Position of every grid point, in the order of the table
+        x = bounds[0][0] + self.cell * np.arange(self.table.nx)
+        y = bounds[1][0] + self.cell * np.arange(self.table.ny)
+        X, Y = np.meshgrid(x, y)
+        self.x = X.ravel()
+        self.y = Y.ravel()
+        self.bounds = bounds
+
+    #----------------------------------------------------------------------------------------------
+    #   Likelihood of the measures on every grid point, at the rotation that best explains them
+    #----------------------------------------------------------------------------------------------
+    def Likelihood(self, z):
+        seen = [i for i in range(4) if z[i] != -999]
+        if not seen:
+            return None, None, None
+
+        # Each landmark at bearing b seen at the angle z tells the rotation is b - z. The rotation of
+        # a point is the mean of these and of the IMU, weighted by the inverse of their variances.
+        vectors = []
+        for i in seen:
+            cb, sb = self.table.table[i]
+            cz = cos(radians(z[i]))
+            sz = sin(radians(z[i]))
+            vectors.append((cb, sb, cz, sz))
+        ci = cos(radians(z[4]))
+        si = sin(radians(z[4]))
+        wl = 1.0 / self.errstd[0]**2
+        wi = 1.0 / self.errstd[1]**2
+        cr = wi * ci
+        sr = wi * si
+        for cb, sb, cz, sz in vectors:
+            cr = cr + wl * (cb * cz + sb * sz) # cos(b - z)
+            sr = sr + wl * (sb * cz - cb * sz) # sin(b - z)
+        norm = np.maximum(np.sqrt(cr * cr + sr * sr), 1e-9)
+        cr = cr / norm
+        sr = sr / norm
+
+        # Same likelihood of the particle filter, computed with sums of angles only
+        weight = CosLikelihood(ci * cr + si * sr, self.errstd[1])
+        for cb, sb, cz, sz in vectors:
+            weight *= CosLikelihood((cz * cr - sz * sr) * cb + (sz * cr + cz * sr) * sb, self.errstd[0])
+        return weight, cr, sr
+
+    #----------------------------------------------------------------------------------------------
+    #   Draws n poses (x, y, rotation) with probability given by the measures z
+    #----------------------------------------------------------------------------------------------
+    def Poses(self, z, n):
+        weight, cr, sr = self.Likelihood(z)
+        if weight is None or n <= 0 or not weight.sum() > 0:
+            return None
+
+        # Chooses the grid points and spreads the poses over their cells
+        cells = np.searchsorted(np.cumsum(weight), np.random.random_sample(n) * weight.sum())
+        cells = np.minimum(cells, len(weight) - 1)
+        x = self.x[cells] + self.cell * (np.random.random_sample(n) - 0.5)
+        y = self.y[cells] + self.cell * (np.random.random_sample(n) - 0.5)
+        x = np.clip(x, self.bounds[0][0], self.bounds[0][1])
+        y = np.clip(y, self.bounds[1][0], self.bounds[1][1])
+        rotation = np.degrees(np.arctan2(sr[cells], cr[cells])) + self.errstd[0] * np.random.standard_normal(n)
+        return x, y, rotation
+
+#--------------------------------------------------------------------------------------------------
+#   Points (x, y, kind) every 10 cm over the lines of the field, and the goalposts, for the
+#   simulated vision
+#--------------------------------------------------------------------------------------------------
+def FieldPoints():
+    points = []
+    for a, b in FIELD_LINES:
+        n = max(1, int(hypot(b[0] - a[0], b[1] - a[1]) // 10))
+        points += [(a[0] + (b[0] - a[0]) * k / float(n), a[1] + (b[1] - a[1]) * k / float(n), LINE) for k in range(n + 1)]
+    for c, r in FIELD_CIRCLES:
+        n = int(2 * pi * r // 10)
+        points += [(c[0] + r * cos(2 * pi * k / n), c[1] + r * sin(2 * pi * k / n), LINE) for k in range(n)]
+    return points + [(x, y, GOALPOST) for x, y in GOALPOSTS]
+
+#--------------------------------------------------------------------------------------------------
+#   Distance from the points (X, Y) to the segment from a to b
+#--------------------------------------------------------------------------------------------------
+def SegmentDistance(X, Y, a, b):
+    dx = b[0] - a[0]
+    dy = b[1] - a[1]
+    # Position of the closest point along the segment, from 0 at a to 1 at b
+    t = np.clip(((X - a[0]) * dx + (Y - a[1]) * dy) / float(dx * dx + dy * dy), 0, 1)
+    return np.hypot(X - a[0] - t * dx, Y - a[1] - t * dy)
+
+#--------------------------------------------------------------------------------------------------
+#   Class implementing the likelihood field of the field lines and goalposts
+#--------------------------------------------------------------------------------------------------
+
+class LikelihoodField(BearingTable):
+    #----------------------------------------------------------------------------------------------
+    #   Constructor, sigma is the error of the points seen, in cm, and floor the likelihood of a
+    #   point far from any line, so a false detection does not discard a particle
+    #----------------------------------------------------------------------------------------------
+    def __init__(self, sigma=10, floor=0.05, limit=32, cell=CELL, bounds=BOUNDS, cache=CACHE):
+        self.sigma = sigma
+        self.floor = floor
+        self.limit = limit # Most points used on each update
+        self.Grid(cell, bounds)
+        self.shape = (2, self.ny * self.nx)
+        self.Open('field', (FIELD_LINES, FIELD_CIRCLES, GOALPOSTS, GOALPOST_RADIUS, sigma, floor, self.cell, bounds), cache)
+
+    #----------------------------------------------------------------------------------------------
+    #   Likelihood of a line and of a goalpost on every grid point, from the distance to the closest
+    #----------------------------------------------------------------------------------------------
+    def Build(self):
+        x = self.bounds[0][0] + self.cell * np.arange(self.nx)
+        y = self.bounds[1][0] + self.cell * np.arange(self.ny)
+        X, Y = [grid.ravel() for grid in np.meshgrid(x, y)] # The grid point (i, j) is the position j*nx + i
+
+        lines = np.min([SegmentDistance(X, Y, a, b) for a, b in FIELD_LINES] +
+                       [np.abs(np.hypot(X - c[0], Y - c[1]) - r) for c, r in FIELD_CIRCLES], axis=0)
+        posts = np.min([np.maximum(np.hypot(X - c[0], Y - c[1]) - GOALPOST_RADIUS, 0) for c in GOALPOSTS], axis=0)
+
+        distance = np.stack((lines, posts))
+        return self.floor + (1 - self.floor) * np.exp(-distance**2 / (2.0 * self.sigma**2))
+
+    #----------------------------------------------------------------------------------------------
+    #   Likelihood of the points (distance, angle, kind) seen from the poses (x, y, rotation)
+    #----------------------------------------------------------------------------------------------
+    def Likelihood(self, x, y, rotation, points):
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+        if len(points) > self.limit:
+            points = points[(np.arange(self.limit) * len(points)) // self.limit]
+
+        # Where each particle would place each point, the angle as the landmarks'
+        theta = np.radians(rotation[:, None] + points[:, 1])
+        px = x[:, None] + points[:, 0] * np.cos(theta)
+        py = y[:, None] - points[:, 0] * np.sin(theta)
+
+        # Closest grid point, the ones out of the covered region take the value of its border
+        i = np.clip(np.rint((px - self.bounds[0][0]) / self.cell), 0, self.nx - 1).astype(np.intp)
+        j = np.clip(np.rint((py - self.bounds[1][0]) / self.cell), 0, self.ny - 1).astype(np.intp)
+        return self.table[points[:, 2].astype(np.intp), j * self.nx + i].prod(axis=1)
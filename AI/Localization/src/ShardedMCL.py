@@ -0,0 +1,159 @@
+__author__ = "RoboFEI-HT"
+__authors__ = "Aislan C. Almeida"
+__license__ = "GNU General Public License v3.0"
+
+import multiprocessing
+from multiprocessing.sharedctypes import RawArray
+import NumpyMCL
+from NumpyMCL import *
+
+#--------------------------------------------------------------------------------------------------
+#   This module runs the NumPy particle filter over several processes
+#   - The particles' arrays live in shared memory, every worker process owns a slice of them and
+#     runs the prediction and the weighting of its slice in place.
+#   - Only the sums of the weights of each slice go back to the master, which resamples.
+#--------------------------------------------------------------------------------------------------
+
+#--------------------------------------------------------------------------------------------------
+#   Creates a NumPy array of the given shape in memory shared with the worker processes
+#--------------------------------------------------------------------------------------------------
+def SharedArray(*shape):
+    size = 1
+    for n in shape:
+        size *= n
+    return np.frombuffer(RawArray('d', size), dtype=np.float64).reshape(shape)
+
+#--------------------------------------------------------------------------------------------------
+#   Loop of a worker process: prediction and weighting of a slice of the particles
+#--------------------------------------------------------------------------------------------------
+def Worker(pf, connection, seed):
+    np.random.seed(seed) # Every worker draws its own motion errors, the same ones on every run
+    while True:
+        command = connection.recv()
+        if command is None:
+            break
+        buffer, start, stop, u, z = command
+        x, y, rotation, a, weight = [array[..., start:stop] for array in pf.buffers[buffer]]
+
+        if u != None:
+            Predict(x, y, rotation, a, u)
+
+        total = 0
+        square = 0
+        if z != None:
+            # The weights kept from the previous iteration are multiplied by the likelihood
+            pf.Likelihood(x, y, rotation, z, weight)
+            total = weight.sum()
+            square = weight.dot(weight)
+        connection.send((total, square))
+
+#--------------------------------------------------------------------------------------------------
+#   Class implementing the sharded particle filter
+#--------------------------------------------------------------------------------------------------
+
+class MonteCarlo(NumpyMCL.MonteCarlo):
+    #----------------------------------------------------------------------------------------------
+    #   Constructor, takes the arguments of NumpyMCL.MonteCarlo, the quantity of workers and the
+    #   seed of their motion errors, by default drawn from the generator of the master
+    #----------------------------------------------------------------------------------------------
+    def __init__(self, max_qtd=0, mode='mcl', errstd=None, min_qtd=None, table=False, workers=None, field=False, seed=None):
+        NumpyMCL.MonteCarlo.__init__(self, max_qtd, mode, errstd, min_qtd, table, field)
+        del self.spare # Gather switches between the shared buffers instead
+
+        # Two sets of arrays for max_qtd particles, the resampling copies from one into the other
+        self.buffers = [(SharedArray(max_qtd), SharedArray(max_qtd), SharedArray(max_qtd),
+                         SharedArray(16, max_qtd), SharedArray(max_qtd)) for i in range(2)]
+        self.current = 0
+        x, y, rotation, a = self.x, self.y, self.rotation, self.a
+        self.View(self.current, self.qtd)
+        self.x[:], self.y[:], self.rotation[:], self.a[:] = x, y, rotation, a
+        self.weight.fill(1)
+        self.square = 0 # Sum of the squared weights, from the workers
+
+        # The workers are forked with the filter, so they see the same arrays and tables
+        if seed is None:
+            seed = np.random.randint(2**31)
+        self.workers = []
+        for i in range(workers or multiprocessing.cpu_count()):
+            connection, child = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=Worker, args=(self, child, [seed, i]))
+            process.daemon = True
+            process.start()
+            child.close()
+            self.workers.append((process, connection))
+
+    #----------------------------------------------------------------------------------------------
+    #   Points the particles' arrays to the first n particles of a set of buffers
+    #----------------------------------------------------------------------------------------------
+    def View(self, buffer, n):
+        self.x, self.y, self.rotation, self.a, self.weight = [array[..., :n] for array in self.buffers[buffer]]
+
+    #----------------------------------------------------------------------------------------------
+    #   Prediction and update steps, each worker runs them on its slice of the particles
+    #----------------------------------------------------------------------------------------------
+    def Step(self, u=None, z=None):
+        n = len(self.x)
+        self.z = z
+        for k, (process, connection) in enumerate(self.workers):
+            connection.send((self.current, k * n // len(self.workers), (k + 1) * n // len(self.workers), u, z))
+
+        # Reduction of the weights of every slice
+        self.totalweight = 0
+        self.square = 0
+        for process, connection in self.workers:
+            total, square = connection.recv()
+            self.totalweight += total
+            self.square += square
+
+    def Prediction(self, u=None):
+        if u != None:
+            self.Step(u, None)
+
+    def Update(self, z=None):
+        self.Step(None, z)
+
+    #----------------------------------------------------------------------------------------------
+    #   Effective sample size, from the sums the workers sent back
+    #----------------------------------------------------------------------------------------------
+    def EffectiveSampleSize(self):
+        if self.square == 0:
+            return 0
+        return self.totalweight**2 / self.square
+
+    #----------------------------------------------------------------------------------------------
+    #   Copies the particles at index, the motion coefficients included, into the other buffers
+    #----------------------------------------------------------------------------------------------
+    def Gather(self, index):
+        n = len(index)
+        x, y, rotation, a, weight = [array[..., :n] for array in self.buffers[1 - self.current]]
+        np.take(self.x, index, out=x)
+        np.take(self.y, index, out=y)
+        np.take(self.rotation, index, out=rotation)
+        a[...] = self.a[:, index]
+        weight.fill(1)
+
+        self.current = 1 - self.current
+        self.x, self.y, self.rotation, self.a, self.weight = x, y, rotation, a, weight
+        self.qtd = n # Saves the quantity of particles.
+
+    #----------------------------------------------------------------------------------------------
+    #   Main algorithm, the prediction and the update go to the workers together
+    #----------------------------------------------------------------------------------------------
+    def main(self, u=None, z=None):
+        self.Step(u, z)
+        # Without new measures only the odometry moves the particles, their weights are kept
+        if z != None:
+            self.Resample(self.max_qtd)
+        else:
+            self.ComputeMean(self.x, self.y, self.rotation, self.weight)
+        return self.mean, self.std
+
+    #----------------------------------------------------------------------------------------------
+    #   Stops the worker processes
+    #----------------------------------------------------------------------------------------------
+    def Close(self):
+        for process, connection in self.workers:
+            connection.send(None)
+        for process, connection in self.workers:
+            process.join()
+        self.workers = []
@@ -0,0 +1,187 @@
+__author__ = "RoboFEI-HT"
+__authors__ = "Aislan C. Almeida"
+__license__ = "GNU General Public License v3.0"
+
+from math import *
+import numpy as np
+from NumpyMCL import Predict, LANDMARKS, COEFFICIENTS
+from Clustering import Hypotheses, ParticleArrays
+
+#--------------------------------------------------------------------------------------------------
+#   This module tracks the pose with an extended Kalman filter once the particles converged
+#   - The state is the pose [x, y, rotation] and its covariance, moved by the same arc motion of
+#     the particles and corrected by the same landmark bearings and IMU angle.
+#   - Hybrid runs a particle filter until its standard deviation falls under a threshold, then the
+#     Kalman filter alone. Measures too far from what it expects are rejected, and after a few in a
+#     row the particles start again around its estimate.
+#--------------------------------------------------------------------------------------------------
+
+# Upper 0.999 quantiles of the chi-square distribution, by the quantity of measures
+CHI2_GATE = {1: 10.83, 2: 13.82, 3: 16.27, 4: 18.47, 5: 20.52}
+
+# Least covariance the Kalman filter starts with, the particles may have collapsed on a few poses
+MIN_COVARIANCE = np.diag([10.0**2, 10.0**2, 5.0**2])
+
+#--------------------------------------------------------------------------------------------------
+#   Class implementing the extended Kalman filter
+#--------------------------------------------------------------------------------------------------
+
+class KalmanFilter():
+    #----------------------------------------------------------------------------------------------
+    #   Constructor, starts from a pose and its covariance
+    #----------------------------------------------------------------------------------------------
+    def __init__(self, mean, covariance, errstd=None):
+        self.mean = np.array(mean, dtype=np.float64)
+        self.covariance = np.array(covariance, dtype=np.float64)
+
+        # Standard deviation of the landmarks' and the IMU's angles, in degrees, as the particles'
+        if errstd == None:
+            self.errstd = [5, 30]
+        else:
+            self.errstd = errstd
+
+        self.nis = 0 # Normalized innovation squared of the last measures
+
+    #----------------------------------------------------------------------------------------------
+    #   Prediction step
+    #----------------------------------------------------------------------------------------------
+    def Prediction(self, u=None):
+        # If there was movement, run the predction step
+        if u == None:
+            return
+        straight, drift, rotational, moving, dt = u
+
+        # Arc motion of the particles without errors, on the mean and on a copy of it moved by a
+        # unit on each coordinate, which gives the jacobian by finite differences
+        x, y, rotation = np.tile(self.mean[:, None], (1, 4))
+        x[1] += 1
+        y[2] += 1
+        rotation[3] += 1
+        Predict(x, y, rotation, np.zeros((16, 1)), u)
+        jacobian = np.stack((x[1:] - x[0], y[1:] - y[0], (rotation[1:] - rotation[0] + 180) % 360 - 180))
+
+        # Errors of the forward, drift and rotational speeds, with the mean coefficients of the particles
+        terms = np.array([straight**2, drift**2, radians(rotational)**2, moving], dtype=np.float64)
+        sf, sd, sw, sg = [terms.dot(COEFFICIENTS[k:k + 4, 0]) for k in (0, 4, 8, 12)]
+        theta = radians(self.mean[2])
+        spread = np.array([[cos(theta) * dt, sin(theta) * dt, 0],
+                           [-sin(theta) * dt, cos(theta) * dt, 0],
+                           [0, 0, degrees(dt)]])
+        noise = spread.dot(np.diag([sf**2, sd**2, sw**2 + sg**2])).dot(spread.T)
+
+        self.mean = np.array([x[0], y[0], (rotation[0] + 180) % 360 - 180])
+        self.covariance = jacobian.dot(self.covariance).dot(jacobian.T) + noise
+
+    #----------------------------------------------------------------------------------------------
+    #   Update step, False when the measures do not fit the pose and were rejected
+    #----------------------------------------------------------------------------------------------
+    def Update(self, z=None):
+        # If there was any measure, run the update step
+        if z == None:
+            return True
+        seen = [i for i in range(4) if z[i] != -999]
+        x, y, rotation = self.mean
+
+        # Angles the landmarks should be seen at, as in Particle.Sensor, and the IMU angle
+        dx = LANDMARKS[seen, 0] - x
+        dy = LANDMARKS[seen, 1] - y
+        expected = np.append(-np.degrees(np.arctan2(dy, dx)) - rotation, rotation)
+        innovation = (np.array([z[i] for i in seen] + [z[4]]) - expected + 180) % 360 - 180
+
+        # Derivatives of those angles over x, y and rotation
+        H = np.zeros((len(seen) + 1, 3))
+        H[:-1, 0] = -np.degrees(dy / (dx**2 + dy**2))
+        H[:-1, 1] = np.degrees(dx / (dx**2 + dy**2))
+        H[:-1, 2] = -1
+        H[-1, 2] = 1
+        R = np.diag([self.errstd[0]**2] * len(seen) + [self.errstd[1]**2])
+
+        S = H.dot(self.covariance).dot(H.T) + R
+        Sinv = np.linalg.inv(S)
+        self.nis = innovation.dot(Sinv).dot(innovation)
+        if self.nis > CHI2_GATE[len(innovation)]:
+            return False
+
+        # Correction, in the Joseph form so the covariance stays symmetric and positive
+        K = self.covariance.dot(H.T).dot(Sinv)
+        self.mean += K.dot(innovation)
+        self.mean[2] = (self.mean[2] + 180) % 360 - 180
+        I = np.eye(3) - K.dot(H)
+        self.covariance = I.dot(self.covariance).dot(I.T) + K.dot(R).dot(K.T)
+        return True
+
+    #----------------------------------------------------------------------------------------------
+    #   Standard deviation of the position, as the particle filters'
+    #----------------------------------------------------------------------------------------------
+    def Std(self):
+        return sqrt(self.covariance[0, 0] + self.covariance[1, 1])
+
+#--------------------------------------------------------------------------------------------------
+#   Spreads the particles of a filter over a gaussian, with weight 1
+#--------------------------------------------------------------------------------------------------
+def Scatter(PF, mean, covariance):
+    # The NumPy engines hold the arrays, the other ones a list of particle objects
+    if isinstance(getattr(PF, 'x', None), np.ndarray):
+        PF.x[:], PF.y[:], PF.rotation[:] = np.random.multivariate_normal(mean, covariance, len(PF.x)).T
+        PF.weight.fill(1)
+    else:
+        for p, pose in zip(PF.particles, np.random.multivariate_normal(mean, covariance, len(PF.particles))):
+            p.x, p.y, p.rotation = pose
+            p.weight = 1
+
+#--------------------------------------------------------------------------------------------------
+#   Class switching between a particle filter and the Kalman filter
+#--------------------------------------------------------------------------------------------------
+
+class Hybrid(object):
+    #----------------------------------------------------------------------------------------------
+    #   Constructor, takes the particle filter and the standard deviation, in cm, to hand it over
+    #----------------------------------------------------------------------------------------------
+    def __init__(self, PF, threshold=20, errstd=None, settle=3, misses=3, inflation=4):
+        self.PF = PF
+        self.threshold = threshold
+        self.errstd = errstd
+        self.settle = settle # Updates in a row under the threshold which hand the pose to the Kalman filter
+        self.converged = 0
+        self.misses = misses # Measures rejected in a row which give the pose back to the particles
+        self.inflation = inflation # Growth of the covariance the particles are spread over
+        self.kalman = None # The Kalman filter, while it tracks the pose
+        self.rejected = 0
+
+    # The viewer, the clustering and qtd see the particles of the particle filter, which keeps
+    # them while the Kalman filter tracks the pose
+    def __getattr__(self, name):
+        return getattr(self.PF, name)
+
+    @property
+    def tracking(self):
+        return self.kalman is not None
+
+    #----------------------------------------------------------------------------------------------
+    #   Main algorithm
+    #----------------------------------------------------------------------------------------------
+    def main(self, u=None, z=None):
+        if self.kalman is None:
+            mean, std = self.PF.main(u, z)
+            if z != None:
+                self.converged = self.converged + 1 if std < self.threshold else 0
+            if self.converged >= self.settle:
+                # Converged, the mean and covariance of the particles start the Kalman filter
+                weight, mean, covariance = Hypotheses(*ParticleArrays(self.PF), k=1)[0]
+                self.kalman = KalmanFilter(mean, np.maximum(covariance, MIN_COVARIANCE), self.errstd)
+                self.converged = 0
+                self.rejected = 0
+            return mean, std
+
+        self.kalman.Prediction(u)
+        if self.kalman.Update(z):
+            self.rejected = 0
+        else:
+            self.rejected += 1
+
+        if self.rejected >= self.misses:
+            # Lost the track, the particles start again around the estimate
+            Scatter(self.PF, self.kalman.mean, self.inflation * self.kalman.covariance)
+            self.kalman = None
+            return self.PF.main(None, None)
+        return list(self.kalman.mean), self.kalman.Std()
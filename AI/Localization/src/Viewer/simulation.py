@@ -1,31 +1,87 @@
 # from particle import *
 import pygame
 import sys
+import numpy as np
 from math import *
 
+# Points of the mark of each particle along its heading, and their colors: black near the
+# position, blue towards where it faces
+MARK = np.arange(6)
+MARK_COLORS = np.array([(0, 0, 0)] * 2 + [(0, 0, 255)] * 4, dtype=np.uint8)
+
+HEATMAP_CELL = 10 # Size in pixels of the cells of the density heatmap
+HEATMAP_COLOR = np.array((255, 0, 0), dtype=np.uint16)
+
+#--------------------------------------------------------------------------------------------------
+#   Positions and rotations of the particles as arrays, from a filter or a list of particles
+#--------------------------------------------------------------------------------------------------
+def particle_arrays(particles):
+    # The NumPy engines already hold the arrays, the other ones a list of particle objects
+    if isinstance(getattr(particles, 'x', None), np.ndarray):
+        return particles.x, particles.y, particles.rotation
+    particles = getattr(particles, 'particles', particles)
+    n = len(particles)
+    x = np.fromiter((p.x for p in particles), np.float64, n)
+    y = np.fromiter((p.y for p in particles), np.float64, n)
+    rotation = np.fromiter((p.rotation for p in particles), np.float64, n)
+    return x, y, rotation
+
 class Simulation():
-    def __init__(self, screen):
+    def __init__(self, screen, heatmap=False, decimation=1):
         self.mx = 0
         self.my = 0
         self.screen = screen
 
         self.field = None
 
+        self.heatmap = heatmap # Draws the density of the particles instead of each one
+        self.decimation = max(1, decimation) # Draws one of every so many frames
+        self.frame = 0
+
     def perform_events(self):
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 sys.exit()
 
+    # True when this frame is not to be drawn, so the field is not redrawn either
+    def skip_frame(self):
+        self.frame += 1
+        return self.frame % self.decimation != 0
+
     def display_update(self, particles):
-        
-        for particle in particles:
-            xi = particle.x + 70
-            yi = particle.y + 70
-            xm = xi + 2 * cos(radians(particle.rotation))
-            ym = yi - 2 * sin(radians(particle.rotation))
-            xf = xm + 3 * cos(radians(particle.rotation))
-            yf = ym - 3 * sin(radians(particle.rotation))
-            pygame.draw.line(self.screen.background,(0,0,0),(xi,yi),(xm,ym), 1)
-            pygame.draw.line(self.screen.background,(0,0,255),(xm,ym),(xf,yf), 1)
+        x, y, rotation = particle_arrays(particles)
+
+        # Writes straight into the pixels of the screen, all particles at once
+        pixels = pygame.surfarray.pixels3d(self.screen.background)
+        if self.heatmap:
+            self.draw_heatmap(pixels, x + 70, y + 70)
+        else:
+            self.draw_particles(pixels, x + 70, y + 70, rotation)
+        del pixels # Unlocks the surface
 
         pygame.display.flip()
+
+    # Marks of 6 pixels along the heading of every particle
+    def draw_particles(self, pixels, x, y, rotation):
+        theta = np.radians(rotation)
+        px = np.rint(x[:, None] + MARK * np.cos(theta)[:, None]).astype(np.intp)
+        py = np.rint(y[:, None] - MARK * np.sin(theta)[:, None]).astype(np.intp)
+        color = np.broadcast_to(MARK_COLORS, px.shape + (3,))
+
+        inside = (px >= 0) & (px < pixels.shape[0]) & (py >= 0) & (py < pixels.shape[1])
+        pixels[px[inside], py[inside]] = color[inside]
+
+    # Tints each cell of the screen by the share of the particles in it
+    def draw_heatmap(self, pixels, x, y):
+        nx = pixels.shape[0] // HEATMAP_CELL
+        ny = pixels.shape[1] // HEATMAP_CELL
+        count = np.histogram2d(x, y, bins=(nx, ny), range=((0, nx * HEATMAP_CELL), (0, ny * HEATMAP_CELL)))[0]
+        if not count.any():
+            return
+
+        # The square root keeps the cells with few particles visible next to the peak, in 256ths
+        alpha = np.rint(256 * np.sqrt(count / count.max())).astype(np.uint16)[:, None, :, None, None]
+
+        # Every cell is a block of the screen, blended with integers over a view of its pixels
+        area = pixels[:nx * HEATMAP_CELL, :ny * HEATMAP_CELL].reshape(nx, HEATMAP_CELL, ny, HEATMAP_CELL, 3)
+        area[...] = (area * (256 - alpha) + HEATMAP_COLOR * alpha) >> 8
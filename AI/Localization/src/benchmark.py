@@ -0,0 +1,236 @@
+#! /usr/bin/env python
+from __future__ import print_function
+
+__author__ = "RoboFEI-HT"
+__authors__ = "Aislan C. Almeida"
+__license__ = "GNU General Public License v3.0"
+
+import argparse
+import json
+import multiprocessing
+import os
+import random as rnd
+import resource
+import sys
+import time
+from math import *
+
+import numpy as np
+from particle import Particle
+from Tracking import Hybrid
+from SensorTable import FieldPoints
+
+#--------------------------------------------------------------------------------------------------
+#   Benchmark of the particle filters
+#   - Every engine is fed the same (u, z) sequence, with the ground truth pose of each step, from
+#     the same seeds, each one in its own process so the peak memory is its own.
+#   - Sequences are synthetic, built with the landmark model of the simulator, or read from a file
+#     written with --save, one JSON step per line.
+#   - Prints a table with the latency per step, the peak memory, the convergence time and the RMSE.
+#--------------------------------------------------------------------------------------------------
+
+# Engines that can be compared: module, extra arguments of MonteCarlo
+engines = {
+    'mcl': ('MCL', {}),
+    'amcl': ('AMCL', {}),
+    'srmcl': ('SRMCL', {}),
+    'numpy-mcl': ('NumpyMCL', {'mode': 'mcl'}),
+    'numpy-amcl': ('NumpyMCL', {'mode': 'amcl'}),
+    'numpy-srmcl': ('NumpyMCL', {'mode': 'srmcl'}),
+    'sharded-mcl': ('ShardedMCL', {'mode': 'mcl'}),
+    'heading-mcl': ('HeadingMCL', {'mode': 'mcl'}),
+    'heading-srmcl': ('HeadingMCL', {'mode': 'srmcl'}),
+}
+
+# Commands of the walk of the synthetic sequences, as Localization.GetU: (straight, drift, rotational, moving)
+commands = ((20, 0, 0, 1), (10, 0, 0, 1), (0, 0, 20, 1), (0, 0, -20, 1), (0, -10, 0, 1), (0, 10, 0, 1), (0, 0, 0, 0))
+
+parser = argparse.ArgumentParser(description='Localization benchmark', epilog='Compares the particle filters on the same sequence of motions and measures.')
+parser.add_argument('-e', '--engines', nargs='+', default=['mcl', 'amcl', 'srmcl', 'numpy-mcl', 'numpy-amcl', 'numpy-srmcl'], choices=sorted(engines), help='engines to compare')
+parser.add_argument('-n', '--particles', type=int, default=1000, help='particles of each filter (default 1000)')
+parser.add_argument('--workers', type=int, default=None, help='worker processes of sharded-mcl (default one per core)')
+parser.add_argument('--ekf', type=float, default=0, help='hands the pose to the EKF of Tracking.Hybrid under this std in cm')
+parser.add_argument('--min-particles', type=int, default=None, help='enables KLD-sampling down to this quantity')
+parser.add_argument('-s', '--steps', type=int, default=300, help='steps of the synthetic sequence (default 300)')
+parser.add_argument('--seed', type=int, default=1, help='seed of the sequence and of the filters (default 1)')
+parser.add_argument('--dt', type=float, default=0.1, help='seconds between steps (default 0.1)')
+parser.add_argument('--imu-noise', type=float, default=5, help='standard deviation of the IMU angle in degrees (default 5)')
+parser.add_argument('--imu-bias', type=float, default=0, help='constant error of the IMU angle in degrees (default 0)')
+parser.add_argument('--points', type=int, default=0, help='points of the field lines and goalposts seen on each step (default 0)')
+parser.add_argument('--field', action='store_true', help='weighs the NumPy engines also by the field points')
+parser.add_argument('--converged', type=float, default=50, help='error in cm under which the filter counts as converged (default 50)')
+parser.add_argument('--load', help='reads the sequence from this file instead of creating one')
+parser.add_argument('--save', help='writes the sequence to this file')
+
+#--------------------------------------------------------------------------------------------------
+#   Landmark measures of the robot at the pose, the model of Simulator/vision_loc.VISION.RetLM
+#--------------------------------------------------------------------------------------------------
+try:
+    sys.path.append('../../../Simulator/')
+    from vision_loc import VISION
+
+    class _Robot(object):
+        bkb = None
+        Mem = None
+
+    _robot = _Robot()
+    _vision = VISION(_robot)
+
+    def RetLM(x, y, rotation):
+        # The simulator draws the field 70 pixels away from the border of the window
+        _robot.x = x + 70
+        _robot.y = y + 70
+        _robot.rotate = rotation
+        return _vision.RetLM()
+
+    measures = 'Simulator/vision_loc.py'
+except ImportError:
+    # Same model without pygame: 180 degrees of view, seen a quarter of the time, 5 degrees of error
+    def RetLM(x, y, rotation):
+        z = []
+        for lx, ly in ((0, 0), (900, 0), (0, 600), (900, 600)):
+            ang = -degrees(atan2(ly - y, lx - x)) - rotation
+            if cos(radians(ang)) > 0 and 0.25 > rnd.random():
+                z.append(rnd.gauss(ang, 5.0))
+            else:
+                z.append(-999)
+        return z
+
+    measures = 'built-in landmark model (pygame missing for Simulator/vision_loc.py)'
+
+#--------------------------------------------------------------------------------------------------
+#   Creates a walk over the field: list of (u, z, truth)
+#--------------------------------------------------------------------------------------------------
+def Sequence(steps, dt, seed, imu_noise=5, imu_bias=0, points=0):
+    rnd.seed(seed)
+    robot = Particle(rnd.randint(100, 800), rnd.randint(100, 500), rnd.randint(-180, 180))
+    sequence = []
+    command = commands[0]
+    field = FieldPoints() if points else []
+    for step in range(steps):
+        # Changes the command now and then, and turns back towards the center near the border
+        if step % 20 == 0:
+            command = rnd.choice(commands)
+        if not (50 < robot.x < 850 and 50 < robot.y < 550):
+            command = (0, 0, 20, 1)
+            if abs((degrees(atan2(robot.y - 300, 450 - robot.x)) - robot.rotation + 180) % 360 - 180) < 20:
+                command = (20, 0, 0, 1)
+        u = tuple(command) + (dt,)
+
+        # The robot moves with the same error model of the particles
+        robot.Motion(*u)
+        z = RetLM(robot.x, robot.y, robot.rotation) + [rnd.gauss(robot.rotation + imu_bias, imu_noise)]
+        if points:
+            # Some of the points in front of the robot and closer than 3 m, with errors of 5% and 2 degrees
+            seen = []
+            for x, y, kind in field:
+                ang = -degrees(atan2(y - robot.y, x - robot.x)) - robot.rotation
+                dist = hypot(x - robot.x, y - robot.y)
+                if cos(radians(ang)) > 0 and dist < 300:
+                    seen.append((dist, ang, kind))
+            z.append([[rnd.gauss(dist, 0.05 * dist), rnd.gauss(ang, 2.0), kind] for dist, ang, kind in rnd.sample(seen, min(points, len(seen)))])
+        sequence.append((u, z, (robot.x, robot.y, robot.rotation)))
+    return sequence
+
+#--------------------------------------------------------------------------------------------------
+#   Runs one engine over the sequence, in a child process, and sends back its metrics
+#--------------------------------------------------------------------------------------------------
+def Run(name, sequence, args, connection):
+    module, extra = engines[name]
+    MonteCarlo = __import__(module).MonteCarlo
+    if args.min_particles:
+        extra = dict(extra, min_qtd=args.min_particles)
+    if args.field:
+        extra = dict(extra, field=True)
+    if module == 'ShardedMCL':
+        extra = dict(extra, workers=args.workers, seed=args.seed)
+
+    rnd.seed(args.seed)
+    np.random.seed(args.seed)
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, 'w') # Some engines print on every step
+
+    start = time.time()
+    PF = MonteCarlo(args.particles, **extra)
+    if args.ekf > 0:
+        PF = Hybrid(PF, args.ekf)
+    setup = time.time() - start
+
+    latency = []
+    errors = []
+    heading = []
+    particles = []
+    for u, z, truth in sequence:
+        start = time.time()
+        pos, std = PF.main(u, z)
+        latency.append(time.time() - start)
+        errors.append(hypot(pos[0] - truth[0], pos[1] - truth[1]))
+        heading.append((pos[2] - truth[2] + 180) % 360 - 180)
+        particles.append(0 if getattr(PF, 'tracking', False) else PF.qtd) # Particles updated on the step
+
+    if hasattr(PF, 'Close'):
+        PF.Close()
+    sys.stdout = stdout
+    connection.send((setup, latency, errors, heading, particles, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss))
+
+#--------------------------------------------------------------------------------------------------
+#   Metrics of one engine
+#--------------------------------------------------------------------------------------------------
+def Metrics(result, dt, converged):
+    setup, latency, errors, heading, particles, rss = result
+    latency = 1000 * np.array(latency)
+    errors = np.array(errors)
+
+    # Converged at the first step from which the error stays under the threshold
+    above = np.nonzero(errors >= converged)[0]
+    first = 0 if len(above) == 0 else above[-1] + 1
+    return {
+        'p50': np.percentile(latency, 50), 'p90': np.percentile(latency, 90),
+        'p99': np.percentile(latency, 99), 'max': latency.max(),
+        'setup': 1000 * setup, 'rss': rss / 1024.0, 'particles': np.mean(particles),
+        'converged': first * dt if first < len(errors) else None,
+        'rmse': sqrt(np.mean(errors**2)), 'tracking': sqrt(np.mean(errors[first:]**2)) if first < len(errors) else None,
+        'heading': sqrt(np.mean(np.array(heading)**2)),
+    }
+
+def main():
+    args = parser.parse_args()
+    if args.field:
+        unable = [name for name in args.engines if engines[name][0] not in ('NumpyMCL', 'ShardedMCL', 'HeadingMCL')]
+        if unable:
+            parser.error('--field needs the NumPy engines, %s do not weigh the field points' % ', '.join(unable))
+
+    if args.load:
+        with open(args.load) as log:
+            sequence = [json.loads(line) for line in log]
+        source = args.load
+    else:
+        sequence = Sequence(args.steps, args.dt, args.seed, args.imu_noise, args.imu_bias, args.points)
+        source = '%d synthetic steps, seed %d, IMU error %g +- %g degrees, %d field points, measures of the %s' % (
+            len(sequence), args.seed, args.imu_bias, args.imu_noise, args.points, measures)
+    if args.save:
+        with open(args.save, 'w') as log:
+            for step in sequence:
+                log.write(json.dumps(step) + '\n')
+    dt = np.mean([u[4] for u, z, truth in sequence])
+
+    print()
+    print('Sequence:', source)
+    print('%-12s %8s %8s %8s %8s %8s %8s %9s %10s %8s %9s %8s' % ('engine', 'p50 ms', 'p90 ms', 'p99 ms', 'max ms', 'setup ms', 'MB', 'particles',
+                                                                     'converged', 'RMSE cm', 'tracking', 'theta'))
+    for name in args.engines:
+        connection, child = multiprocessing.Pipe()
+        process = multiprocessing.Process(target=Run, args=(name, sequence, args, child))
+        process.start()
+        result = connection.recv()
+        process.join()
+        m = Metrics(result, dt, args.converged)
+        print('%-12s %8.2f %8.2f %8.2f %8.2f %8.1f %8.1f %9.0f %10s %8.1f %9s %8.1f' % (
+            name, m['p50'], m['p90'], m['p99'], m['max'], m['setup'], m['rss'], m['particles'],
+            '-' if m['converged'] is None else '%.1f s' % m['converged'], m['rmse'],
+            '-' if m['tracking'] is None else '%.1f' % m['tracking'], m['heading']))
+    print()
+
+#Call the main function, start up the benchmark
+if __name__ == "__main__":
+    main()
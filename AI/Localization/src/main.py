@@ -2,15 +2,25 @@ __author__ = "RoboFEI-HT"
 __authors__ = "Aislan C. Almeida"
 __license__ = "GNU General Public License v3.0"
 
+import sys
 from Viewer import *
-from particle import *
-from multiprocessing import Pool 
+import NumpyMCL
+import ShardedMCL
 
 def main():
 
-    pool = Pool()
+    # Particles start together and spread with the motion errors. Given a quantity of workers
+    # (python main.py 4) the prediction of every slice of them runs on its own process
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else 1
+    if workers > 1:
+        PF = ShardedMCL.MonteCarlo(10000, workers=workers)
+    else:
+        PF = NumpyMCL.MonteCarlo(10000)
+    PF.x[:] = 450
+    PF.y[:] = 300
+    PF.rotation[:] = 0
 
-    screen = Screen()
+    screen = Screen(True)
 
     simul = Simulation(screen)
 
@@ -18,33 +28,20 @@ def main():
 
     simul.field = field
 
-    parts = []
-
-    for i in range(10000):
-        parts.append(Particle(450, 300, 0))
-        # parts[i].a = (0.005, 5, 0.00005, 0.05, 0.00005, 0.05)
-
-    simul.particles = parts
-
     #Main loop
     while True:
 
         #Process events
         simul.perform_events()
 
-        for i in range(10000/4):
-            pool.map(parts[i*4].Motion(), (100, 90, 1.0/60))
-            pool.map(parts[i*4+1].Motion(), (100, 90, 1.0/60))
-            pool.map(parts[i*4+2].Motion(), (100, 90, 1.0/60))
-            pool.map(parts[i*4+3].Motion(), (100, 90, 1.0/60))
-        # for part in parts:
-        #     part.Motion(100, 90, 1.0/60)
+        # Walks forward turning at 90 degrees per second
+        PF.Prediction((100, 0, 90, 1, 1.0/60))
 
          #update soccer field
         field.draw_soccer_field()
 
         #Draw robots, ball and update the current frame
-        simul.display_update()
+        simul.display_update(PF)
 
         #Pause for the next frame
         screen.clock.tick(60)
@@ -5,6 +5,9 @@ __license__ = "GNU General Public License v3.0"
 from math import *
 import random as rnd
 
+# Landmarks positions, in sequence blue, red, yellow, purple
+LANDMARKS = ((0, 0), (900, 0), (0, 600), (900, 600))
+
 #--------------------------------------------------------------------------------------------------
 #   Class implementing a particle used on Particle Filter Localization
 #--------------------------------------------------------------------------------------------------
@@ -162,19 +165,12 @@ class Particle(object):
     #   Likelihood computation
     #----------------------------------------------------------------------------------------------
     def Sensor(self, Measures=None, weight=1):
-        # Compute the angles the particle should be perceiving the landmark
-        Blue = -degrees(atan2(-self.y, -self.x)) - self.rotation
-        Red = -degrees(atan2(-self.y, 900-self.x)) - self.rotation
-        Yellow = -degrees(atan2(600-self.y, -self.x)) - self.rotation
-        Purple = -degrees(atan2(600-self.y, 900-self.x)) - self.rotation
-        
-        # Generate a vector with the measures
-        M = [Blue, Red, Yellow, Purple]
-
         # Computes the cumulative likelihood of all particles.
         for i in range(4):
             if Measures[i] != -999:
-                weight *= ComputeAngLikelihoodDeg(Measures[i], M[i], self.std[0])
+                # Compute the angle the particle should be perceiving the landmark
+                M = -degrees(atan2(LANDMARKS[i][1]-self.y, LANDMARKS[i][0]-self.x)) - self.rotation
+                weight *= ComputeAngLikelihoodDeg(Measures[i], M, self.std[0])
         # Computes the likelihood given the IMU angle
         weight *= ComputeAngLikelihoodDeg(Measures[4], self.rotation, self.std[1])
 
@@ -195,19 +191,140 @@ def ComputeAngLikelihoodDeg(ang, base, std_deviation=0):
         else:
             return 0
     else:
-        # else computes the cartesian points based on the angles,
-        xa = cos(radians(ang))
-        ya = sin(radians(ang))
-        xb = cos(radians(base))
-        yb = sin(radians(base))
+        # else computes the distance between the points of the unit circle at both angles,
+        d = sqrt(max(2 - 2*cos(radians(ang-base)), 0))
+
+        # gets the constants of the standard deviation,
+        k, norm = AngConstants(std_deviation)
+
+        # returns the likelihood between the given angles.
+        return exp(-k*d)*norm
 
-        # computes the distance between these points,
-        d = hypot(xa-xb, ya-yb)
+#--------------------------------------------------------------------------------------------------
+#   Constants of the angle likelihood for a standard deviation in degrees, computed once each
+#--------------------------------------------------------------------------------------------------
+_ang_constants = {}
 
-        # converts the standard deviation into aa distance measure,
+def AngConstants(std_deviation):
+    try:
+        return _ang_constants[std_deviation]
+    except KeyError:
+        # converts the standard deviation into a distance measure,
         sa = cos(radians(std_deviation))
         sb = sin(radians(std_deviation))
         s = hypot(sa-1, sb)
+        # keeps the exponent factor and the normalisation.
+        constants = _ang_constants[std_deviation] = (1/(2*s**2), 1/sqrt(2*pi*s**2))
+        return constants
 
-        # returns the likelihood between the given angles.
-        return exp(-(d)/(2*s**2))/sqrt(2*pi*s**2)
+#--------------------------------------------------------------------------------------------------
+#   Resampling is skipped while the effective sample size is above this fraction of the particles
+#--------------------------------------------------------------------------------------------------
+ESS_THRESHOLD = 0.5
+
+#--------------------------------------------------------------------------------------------------
+#   Low variance sampling: indices of the qtd ancestors chosen among the weights
+#--------------------------------------------------------------------------------------------------
+def LowVarianceIndices(weights, total, qtd):
+    indices = []
+    step = float(total) / qtd # Computes the step size
+    s = step/2 # the first step is given by half the total.
+    for i, w in enumerate(weights): # For each particle,
+        while s < w and len(indices) < qtd: # while the particles weight is grater than the step,
+            s += step # rises the step size,
+            indices.append(i) # selects the particle.
+        s -= w # Removes the used steps.
+    return indices
+
+#--------------------------------------------------------------------------------------------------
+#   KLD-sampling: the bin size, in cm, cm and degrees, the error bound and the upper 0.99 quantile
+#--------------------------------------------------------------------------------------------------
+KLD_BIN = (20, 20, 20)
+KLD_EPSILON = 0.05
+KLD_Z = 2.326
+
+#--------------------------------------------------------------------------------------------------
+#   Particles needed so the error of a belief spread over k bins stays under epsilon (Fox, 2003)
+#--------------------------------------------------------------------------------------------------
+def KLDSize(k, epsilon=KLD_EPSILON, z=KLD_Z):
+    if k < 2:
+        return 1
+    a = 2.0 / (9 * (k - 1))
+    return int(ceil((k - 1) / (2 * epsilon) * (1 - a + sqrt(a) * z)**3))
+
+#--------------------------------------------------------------------------------------------------
+#   Thins the indices drawn for max_qtd particles to the KLD-sampling quantity, within the bounds
+#--------------------------------------------------------------------------------------------------
+def KLDIndices(particles, indices, min_qtd, max_qtd):
+    # The set shrinks at most to half on each resampling, so one sharp measure does not deplete it
+    min_qtd = max(min_qtd, len(particles) // 2)
+
+    bins = set() # Bins of the field holding any of the chosen ancestors
+    for i in set(indices):
+        p = particles[i]
+        bins.add((int(p.x // KLD_BIN[0]), int(p.y // KLD_BIN[1]), int(p.rotation % 360 // KLD_BIN[2])))
+    qtd = max(min_qtd, min(max_qtd, KLDSize(len(bins))))
+
+    # Keeps evenly spaced samples, which is the low variance sampling of qtd particles
+    step = float(len(indices)) / qtd
+    return [indices[int((j + 0.5) * step)] for j in range(min(qtd, len(indices)))]
+
+#--------------------------------------------------------------------------------------------------
+#   Copies the state of the ancestors over the particles, reusing the objects
+#--------------------------------------------------------------------------------------------------
+def ResampleInPlace(particles, indices):
+    # The states are read before any particle is overwritten. The motion coefficients go along
+    # with the position, the list a is shared with the ancestor as no one changes it.
+    states = [(particles[i].x, particles[i].y, particles[i].rotation, particles[i].a) for i in indices]
+    del particles[len(states):]
+    while len(particles) < len(states):
+        particles.append(Particle(0, 0, 0, a=states[0][3]))
+    for p, state in zip(particles, states):
+        p.x, p.y, p.rotation, p.a = state
+        p.weight = 1
+
+#--------------------------------------------------------------------------------------------------
+#   Effective sample size, how many particles are really holding the estimate
+#--------------------------------------------------------------------------------------------------
+def EffectiveSampleSize(particles):
+    total = 0
+    square = 0
+    for p in particles:
+        total += p.weight
+        square += p.weight**2
+    if square == 0:
+        return 0
+    return total**2 / square
+
+#--------------------------------------------------------------------------------------------------
+#   Scales the weights kept for the next iteration to a mean of 1, so they do not underflow
+#--------------------------------------------------------------------------------------------------
+def NormalizeWeights(particles, total):
+    for p in particles:
+        if total > 0:
+            p.weight *= float(len(particles)) / total
+        else:
+            p.weight = 1
+
+#--------------------------------------------------------------------------------------------------
+#   Weighted mean position [x, y, rotation] and standard deviation of the particles
+#--------------------------------------------------------------------------------------------------
+def WeightedMean(particles):
+    m_w = 0 # Sum of weights
+    m_x = 0 # Sum of x
+    m_y = 0 # Sum of y
+    m_s = 0 # Sum of sin of rotation
+    m_c = 0 # Sum of cos of rotation
+    for p in particles:
+        m_w += p.weight
+        m_x += p.weight * p.x
+        m_y += p.weight * p.y
+        m_s += p.weight * sin(radians(p.rotation))
+        m_c += p.weight * cos(radians(p.rotation))
+    # computes mean rotation by finding the arctan of the sum of sins over cossins
+    mean = [m_x / m_w, m_y / m_w, degrees(atan2(m_s, m_c))]
+
+    sum_std = 0
+    for p in particles:
+        sum_std += p.weight * ((p.x - mean[0])**2 + (p.y - mean[1])**2)
+    return mean, sqrt(sum_std / m_w)
@@ -3,7 +3,7 @@ from threading import Thread
 import cv2
 
 class WebcamVideoStream:
-	def __init__(self, src=0):
+	def __init__(self, src=0, store=None):
 		# initialize the video camera stream and read the first frame
 		# from the stream
 		self.stream = cv2.VideoCapture(src)
@@ -11,6 +11,10 @@ class WebcamVideoStream:
 		self.stream.set(4,720)
 		(self.grabbed, self.frame) = self.stream.read()
 
+		# optional FrameStore where every frame is published to
+		# the other processes (viewers, loggers, other detectors)
+		self.store = store
+
 		# initialize the variable used to indicate if the thread should
 		# be stopped
 		self.stopped = False
@@ -31,6 +35,19 @@ class WebcamVideoStream:
 
 			# otherwise, read the next frame from the stream
 			(self.grabbed, self.frame) = self.stream.read()
+			if self.store is not None and self.grabbed:
+				self.publish(self.frame)
+
+	def publish(self, frame):
+		# a failing store must never stop the capture, vision still
+		# gets the frames through read
+		try:
+			if self.store.write(frame) is None and self.store.skipped == 1:
+				print("FrameStore: frames of shape %s not published, the store holds %s"
+					% (frame.shape, self.store.images.shape[1:]))
+		except Exception as error:
+			print("FrameStore: publishing stopped, %s" % error)
+			self.store = None
 
 	def read(self):
 		# return the frame most recently read
@@ -23,6 +23,7 @@ import sys
 sys.path.append('../../Blackboard/src/')
 """Import the library Shared memory """
 from SharedMemory import SharedMemory 
+from FrameStore import FrameStore
 """ Treatment exception: Try to import configparser from python. Write and Read from config.ini file"""
 try:
     """There are differences in versions of the config parser
@@ -63,32 +64,41 @@ class ballStatus():
 	def BallStatus(self, x,y,status):
 
 		if status  == 1:
+			pan = None
 			#Bola a esquerda
 			if (x <= self.config.x_left):
-				bkb.write_float(Mem,'VISION_PAN_DEG', 60) # Posição da bola
+				pan = 60 # Posição da bola
 				print ("Bola a Esquerda")
 
 			#Bola ao centro esquerda
 			if (x > self.config.x_left and x < self.config.x_center):
-				bkb.write_float(Mem,'VISION_PAN_DEG', 30) # Variavel da telemetria
+				pan = 30
 				print ("Bola ao Centro Esquerda")
 
 			#Bola centro direita
 			if (x < self.config.x_right and x > self.config.x_center):
-				bkb.write_float(Mem,'VISION_PAN_DEG', -30) # Variavel da telemetria
+				pan = -30
 				print ("Bola ao Centro Direita")
 
 			#Bola a direita
 			if (x >= self.config.x_right):
-				bkb.write_float(Mem,'VISION_PAN_DEG', -60) # Variavel da telemetria
+				pan = -60
 				print ("Bola a Direita")
 
+			if pan is not None:
+				bkb.write_float(Mem,'VISION_PAN_DEG', pan) # Variavel da telemetria
+				# Publica distancia e angulo desta deteccao de uma vez (registro VISION_BALL).
+				# Esta visao nao mede a distancia, que fica em 0 como no VISION_BALL_DIST
+				bkb.write_record(Mem, 'VISION_BALL', (0, pan))
+
 		else: 
 			if (status ==2):
 				bkb.write_float(Mem,'VISION_PAN_DEG', 60) # Posição da bola
+				bkb.write_record(Mem, 'VISION_BALL', (0, 60)) # Telemetria le o registro
 				print ("Bola a Esquerda")
 			else:
 				bkb.write_float(Mem,'VISION_PAN_DEG', -60) # Variavel da telemetria
+				bkb.write_record(Mem, 'VISION_BALL', (0, -60))
 				print ("Bola a Direita")
 
 
@@ -155,7 +165,14 @@ if __name__ == '__main__':
 	ballS = ballStatus(config)
 	detectBall = objectDetect(args2.withoutservo, config, bkb, Mem)
 #	detectBall.servo.writeWord(config.SERVO_TILT_ID,34, 70)#olha para o centro
-	vcap = WebcamVideoStream(src=0).start() #Abrindo camera
+	vcap = WebcamVideoStream(src=0) #Abrindo camera
+	if vcap.grabbed:
+		# Frames publicados em mem_key+10, com a forma que a camera realmente entrega
+		try:
+			vcap.store = FrameStore(mem_key, vcap.frame.shape)
+		except (ValueError, OSError) as error:
+			print "Frames nao publicados:", error
+	vcap.start()
 #        cap.set(3,1280) #720 1280 1920
 #        cap.set(4,720) #480 720 1080
 	os.system("v4l2-ctl -d /dev/video0 -c focus_auto=0 && v4l2-ctl -d /dev/video0 -c focus_absolute=0")
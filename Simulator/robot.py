@@ -14,7 +14,10 @@ from random import gauss
 
 import sys
 sys.path.append('../AI/Blackboard/src/')
-from SharedMemory import SharedMemory
+from BlackboardPool import BlackboardPool
+
+# Blackboards of every robot of the simulation, attached once each
+blackboards = BlackboardPool()
 
 
 class Robot(pygame.sprite.Sprite,Vision):
@@ -50,9 +53,7 @@ class Robot(pygame.sprite.Sprite,Vision):
 
         self.view_rot = theta
 
-        self.bkb = SharedMemory()
-
-        self.Mem = self.bkb.shd_constructor(KEY)
+        self.bkb, self.Mem = blackboards.attach(KEY)
         print 'Shared Memory successfully created as ',KEY
         #TODO remover a linha vision_search_ball.... como nao estou utilizando decisao ainda, estou forcando a busca..
         self.bkb.write_int(self.Mem,'DECISION_SEARCH_ON',1)
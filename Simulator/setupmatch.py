@@ -61,8 +61,8 @@ def setup_match(screen):
 
     # Do not alter from here on!!!
 
+    blackboards.write_all('DECISION_ACTION_A', 0)
     for rob in robots:
-        rob.bkb.write_int(rob.Mem, 'DECISION_ACTION_A', 0)
         rob.ball = ball
 
     return robots, ball, LeftTeam, RightTeam
\ No newline at end of file
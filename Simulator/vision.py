@@ -133,6 +133,8 @@ class Vision():
                 #print 'dist,pan', dist, ball_orient_wrt_robot
                 bkb.write_float(mem, 'VISION_BALL_DIST', dist)
                 bkb.write_float(mem, 'VISION_PAN_DEG', ball_orient_wrt_robot)
+                bkb.write_record(mem, 'VISION_BALL', (dist, ball_orient_wrt_robot))
+                bkb.push(mem, 'BALL', (dist, ball_orient_wrt_robot))
                 return view_rot_aux
             else:
                 if (view_rot - rotate) > 180:
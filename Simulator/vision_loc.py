@@ -5,6 +5,9 @@ import pygame
 from math import *
 import random as rnd
 from screen import *
+import sys
+sys.path.append('../AI/Localization/src/')
+from SensorTable import FieldPoints
 
 class VISION():
     #----------------------------------------------------------------------------------------------------------------------------------
@@ -16,6 +19,10 @@ class VISION():
 
         self.fov = 180 # Total field of view in degrees
 
+        self.points = 20 # Points of the field lines and goalposts seen on each frame
+        self.range = 300 # Farthest point of the lines seen, in cm
+        self.field_points = FieldPoints() # Points every 10 cm over the lines, without the 70 of margin
+
     def Draw(self, where):
         nx = self.robot.x + 1000 * cos(radians(self.fov/2.0 - self.robot.rotate))
         ny = self.robot.y + 1000 * sin(radians(self.fov/2.0 - self.robot.rotate))
@@ -61,6 +68,17 @@ class VISION():
                 y.append(-999) # Return this if not seen the ball
         return y
 
+    def RetPoints(self):
+        # Some of the points in the field of view, as (dist, angle, kind), with errors of 5% and 2 degrees
+        seen = []
+        for x, y, kind in self.field_points:
+            dist = hypot(x + 70 - self.robot.x, y + 70 - self.robot.y)
+            ang = -degrees(atan2(y + 70 - self.robot.y, x + 70 - self.robot.x)) - self.robot.rotate
+            if dist < self.range and CompAng(ang, 0, self.fov/2.0):
+                seen.append((dist, ang, kind))
+        return [(rnd.gauss(dist, 0.05 * dist), rnd.gauss(ang, 2.0), kind)
+                for dist, ang, kind in rnd.sample(seen, min(self.points, len(seen)))]
+
     def GetBall(self):
         dist = hypot(self.robot.x-self.robot.ball.x, self.robot.y-self.robot.ball.y)
         ang = -degrees(atan2(self.robot.ball.y-self.robot.y, self.robot.ball.x-self.robot.x))-self.robot.rotate
@@ -78,6 +96,7 @@ class VISION():
 
             self.bkb.write_float(self.Mem, 'VISION_TILT_DEG', dist) # Writes to the Black Board
             self.bkb.write_float(self.Mem, 'VISION_PAN_DEG', ang) # Writes to the Black Board
+            self.bkb.write_record(self.Mem, 'VISION_BALL', (dist, ang)) # Same pair, read by the telemetry
         elif control == 1:
             y = self.RetLM() # Gets the landmarks angles
 
@@ -86,6 +105,9 @@ class VISION():
             self.bkb.write_float(self.Mem,'VISION_RED_LANDMARK_DEG', y[1])
             self.bkb.write_float(self.Mem,'VISION_YELLOW_LANDMARK_DEG', y[2])
             self.bkb.write_float(self.Mem,'VISION_PURPLE_LANDMARK_DEG', y[3])
+            self.bkb.push(self.Mem, 'LANDMARKS', y) # Every observation reaches the localization
+            for point in self.RetPoints(): # Field lines and goalposts, for Localization --field
+                self.bkb.push(self.Mem, 'FIELD_POINTS', point)
 
     def test(self):
         y = []